@@ -0,0 +1,287 @@
+"""
+Кэш готовых аудиофайлов по Spotify ID трека.
+
+Раньше каждый запрос трека заново проходил всю цепочку провайдеров, даже
+если этот трек отправлялся минуту назад: файл удалялся сразу после
+отправки. Теперь готовый файл (уже в том виде, в каком уходит в Telegram)
+остается на диске:
+    - ключ — Spotify ID трека и вариант выхода (output_policy.output_variant:
+      формат и битрейт), поэтому смена AUDIO_OUTPUT не отдаст файл другого формата;
+    - файл хранится под хэшем содержимого objects/<ab>/<sha256>.<ext>:
+      одинаковые файлы (тот же трек в сингле и в альбоме) лежат в одном экземпляре;
+    - индекс "ключ -> объект" хранится в index.json и переживает перезапуски.
+
+Объект появляется атомарно (временный файл + os.replace), поэтому
+одновременное сохранение одного содержимого ничего не портит, а
+недописанный файл никогда не попадет в выдачу.
+
+Размер кэша ограничен max_bytes: лишние файлы вытесняются по политике
+'lru' (давно не отправлялись) или 'lfu' (реже всего отправлялись, при
+равенстве — давнее). Файл, который сейчас отправляется (pin), не
+вытесняется. Сначала из индекса удаляется запись и индекс сохраняется,
+потом удаляется файл: после сбоя индекс не ссылается на удаленные файлы,
+а лишние файлы и временные .tmp убирает sweep (его вызывает janitor.py).
+
+Индекс пишется под блокировкой кэша через utils.atomic_write_json
+(уникальный временный файл + os.replace), поэтому одновременные сохранения
+из event loop, IO-пула и janitor не публикуют обрезанный индекс. Попадания
+меняют лишь счетчики, их сохраняет flush не чаще раза в FLUSH_INTERVAL секунд.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Optional, Set, Tuple
+
+from executors import run_io
+from output_policy import output_variant
+from utils import atomic_write_json
+
+logger = logging.getLogger(__name__)
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+EVICTION_POLICIES = ('lru', 'lfu')
+
+# Как часто сохранять индекс после попаданий (секунды)
+FLUSH_INTERVAL = float(os.getenv('AUDIO_CACHE_FLUSH_INTERVAL', '30'))
+
+
+def file_digest(path: str) -> str:
+    """sha256 содержимого файла"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class AudioCache:
+    """Готовые аудиофайлы на диске по ключу (Spotify ID, вариант выхода)"""
+
+    def __init__(self, root: str, max_bytes: int = 0, policy: str = 'lru', flush_interval: float = FLUSH_INTERVAL):
+        if policy not in EVICTION_POLICIES:
+            raise ValueError(f"Unknown eviction policy: {policy}")
+        self.root = root
+        self.index_path = os.path.join(root, 'index.json')
+        # 0 — без ограничения размера
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._saved_at = time.monotonic()
+        self.entries: Dict[str, Dict] = {}
+        # Объекты, которые сейчас отправляются (путь -> число отправок) или записываются
+        self._pinned: Dict[str, int] = {}
+        self._storing: Set[str] = set()
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self.load()
+
+    @staticmethod
+    def _key(track_id: str, variant: str) -> str:
+        return f"{track_id}:{variant}"
+
+    def object_path(self, digest: str, ext: str) -> str:
+        return os.path.join(self.root, 'objects', digest[:2], f"{digest}{ext}")
+
+    def get(self, track_id: str, variant: Optional[str] = None, pin: bool = False) -> Optional[str]:
+        """Путь к готовому файлу трека или None.
+
+        С pin=True файл закрепляется под той же блокировкой, что и поиск, и не
+        вытесняется до unpin: между get и отправкой его не удалит evict.
+        """
+        key = self._key(track_id, variant or output_variant())
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                path = self.object_path(entry['hash'], entry['ext'])
+                if os.path.exists(path):
+                    entry['hits'] = entry.get('hits', 0) + 1
+                    entry['used'] = time.time()
+                    self.hits += 1
+                    self._dirty = True
+                    if pin:
+                        self._pinned[path] = self._pinned.get(path, 0) + 1
+                    return path
+                # Файл удален с диска — запись больше не нужна
+                del self.entries[key]
+                self._dirty = True
+            self.misses += 1
+            return None
+
+    @contextmanager
+    def pin(self, path: str):
+        """Пока файл отправляется, он не вытесняется (для путей вне кэша ничего не делает)"""
+        with self._lock:
+            self._pinned[path] = self._pinned.get(path, 0) + 1
+        try:
+            yield path
+        finally:
+            self.unpin(path)
+
+    def unpin(self, path: str):
+        """Снимает одно закрепление файла (pin или get(pin=True))"""
+        with self._lock:
+            count = self._pinned.pop(path, 1) - 1
+            if count > 0:
+                self._pinned[path] = count
+
+    async def put(self, track_id: str, path: str, variant: Optional[str] = None) -> str:
+        """Переносит готовый файл в кэш и возвращает путь объекта (исходного файла больше нет)"""
+        return await run_io(self._store, track_id, path, variant or output_variant())
+
+    def _store(self, track_id: str, path: str, variant: str) -> str:
+        digest = file_digest(path)
+        ext = os.path.splitext(path)[1].lower()
+        target = self.object_path(digest, ext)
+        with self._lock:
+            self._storing.add(target)
+        try:
+            if os.path.exists(target):
+                # Такое содержимое уже есть (другой ID того же трека)
+                os.remove(path)
+            else:
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                tmp_path = f"{target}.{uuid.uuid4().hex}.tmp"
+                # move, а не rename: рабочая папка и кэш могут быть на разных дисках
+                shutil.move(path, tmp_path)
+                os.replace(tmp_path, target)
+            now = time.time()
+            with self._lock:
+                self.entries[self._key(track_id, variant)] = {
+                    'hash': digest, 'ext': ext, 'size': os.path.getsize(target),
+                    'created': now, 'used': now, 'hits': 0,
+                }
+                self._dirty = True
+            self.save()
+            # Только что сохраненный файл сейчас будет отправлен — он не вытесняется
+            self.evict()
+        finally:
+            with self._lock:
+                self._storing.discard(target)
+        return target
+
+    def _objects(self) -> Dict[Tuple[str, str], Dict]:
+        """Объекты кэша: размер, последнее использование и число отправок по всем ключам"""
+        objects: Dict[Tuple[str, str], Dict] = {}
+        for key, entry in self.entries.items():
+            info = objects.setdefault((entry['hash'], entry['ext']), {'size': entry.get('size', 0), 'used': 0, 'hits': 0, 'keys': []})
+            info['used'] = max(info['used'], entry.get('used', 0))
+            info['hits'] += entry.get('hits', 0)
+            info['keys'].append(key)
+        return objects
+
+    def evict(self) -> int:
+        """Вытесняет объекты, пока кэш не уложится в max_bytes; возвращает число удаленных файлов"""
+        if not self.max_bytes:
+            return 0
+        with self._lock:
+            objects = self._objects()
+            total = sum(info['size'] for info in objects.values())
+            if total <= self.max_bytes:
+                return 0
+            if self.policy == 'lfu':
+                order = sorted(objects.items(), key=lambda item: (item[1]['hits'], item[1]['used']))
+            else:
+                order = sorted(objects.items(), key=lambda item: item[1]['used'])
+            victims = []
+            for (digest, ext), info in order:
+                if total <= self.max_bytes:
+                    break
+                path = self.object_path(digest, ext)
+                if path in self._pinned or path in self._storing:
+                    continue
+                for key in info['keys']:
+                    del self.entries[key]
+                victims.append(path)
+                total -= info['size']
+            if not victims:
+                return 0
+            self._dirty = True
+        # Сначала индекс без этих записей, потом файлы
+        self.save()
+        for path in victims:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Could not evict {path}: {e}")
+        self.evicted += len(victims)
+        logger.info(f"Audio cache: evicted {len(victims)} files, {total / (1024 * 1024):.0f} MB left")
+        return len(victims)
+
+    def sweep(self, max_age: float) -> int:
+        """Удаляет временные файлы недописанных объектов и файлы, которых нет в индексе,
+        если они старше max_age секунд; возвращает число удаленных файлов"""
+        objects_dir = os.path.join(self.root, 'objects')
+        if not os.path.isdir(objects_dir):
+            return 0
+        with self._lock:
+            known = {self.object_path(entry['hash'], entry['ext']) for entry in self.entries.values()}
+        removed = 0
+        now = time.time()
+        for shard in os.scandir(objects_dir):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.path in known or not entry.is_file():
+                    continue
+                with self._lock:
+                    busy = entry.path in self._storing or entry.path in self._pinned
+                # mtime перенесенного файла — время скачивания, поэтому свежесть проверяем и по ctime
+                stat = entry.stat()
+                if busy or now - max(stat.st_mtime, stat.st_ctime) < max_age:
+                    continue
+                try:
+                    os.remove(entry.path)
+                    removed += 1
+                except OSError as e:
+                    logger.warning(f"Could not remove orphaned cache file {entry.path}: {e}")
+        return removed
+
+    def load(self):
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.error(f"Could not load audio cache index {self.index_path}: {e}")
+            return
+        if isinstance(data, dict) and isinstance(data.get('entries'), dict):
+            self.entries = data['entries']
+
+    def save(self):
+        """Атомарно сохраняет индекс, если он изменился"""
+        with self._lock:
+            if not self._dirty:
+                return
+            try:
+                atomic_write_json(self.index_path, {'entries': self.entries})
+                self._dirty = False
+            except OSError as e:
+                logger.error(f"Could not save audio cache index {self.index_path}: {e}")
+            self._saved_at = time.monotonic()
+
+    def flush(self):
+        """Сохраняет индекс, если он изменился и с прошлого сохранения прошло flush_interval секунд"""
+        if self._dirty and time.monotonic() - self._saved_at >= self.flush_interval:
+            self.save()
+
+    def summary(self) -> str:
+        with self._lock:
+            objects = {(entry['hash'], entry['ext']): entry.get('size', 0) for entry in self.entries.values()}
+        size_mb = sum(objects.values()) / (1024 * 1024)
+        limit = f" из {self.max_bytes / (1024 * 1024):.0f} МБ, {self.policy}" if self.max_bytes else ""
+        return (f"треков: {len(self.entries)}, файлов: {len(objects)} ({size_mb:.0f} МБ{limit}), "
+                f"попаданий: {self.hits}, промахов: {self.misses}, вытеснено: {self.evicted}")
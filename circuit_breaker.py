@@ -0,0 +1,129 @@
+"""
+Автоматические выключатели (circuit breaker) для провайдеров.
+
+closed    - провайдер работает как обычно, считаем подряд идущие неудачи;
+open      - после FAILURE_THRESHOLD неудач подряд провайдер пропускается;
+half_open - по истечении паузы пропускается одна пробная попытка:
+            успех закрывает выключатель, неудача снова открывает его
+            с удвоенной паузой (не больше MAX_COOLDOWN).
+
+Неудачей считаются исключение, таймаут и негодный файл. Чистый ответ
+"трека нет" (pipeline.NO_RESULTS) — штатная работа провайдера: он сбрасывает
+счетчик неудач. Попытка, вернувшая None без ошибки, вердикта не дает.
+"""
+
+import logging
+import time
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+FAILURE_THRESHOLD = 5
+COOLDOWN = 300.0
+MAX_COOLDOWN = 3600.0
+
+
+class CircuitBreaker:
+    """Выключатель одного провайдера"""
+
+    def __init__(self, name: str, failure_threshold: int = FAILURE_THRESHOLD, cooldown: float = COOLDOWN,
+                 max_cooldown: float = MAX_COOLDOWN, clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.clock = clock
+        self.state = CLOSED
+        self.failures = 0
+        self.cooldown = cooldown
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+
+    def allow(self) -> bool:
+        """Можно ли запускать провайдера сейчас (в half_open — только одну пробу)"""
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN:
+            if self.clock() - self.opened_at < self.cooldown:
+                return False
+            self._set_state(HALF_OPEN)
+        if self.probe_in_flight:
+            return False
+        self.probe_in_flight = True
+        return True
+
+    def record_success(self):
+        self.failures = 0
+        self.probe_in_flight = False
+        self.cooldown = self.base_cooldown
+        if self.state != CLOSED:
+            self._set_state(CLOSED)
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == HALF_OPEN:
+            # Проба не удалась — открываем снова на удвоенную паузу
+            self.probe_in_flight = False
+            self.cooldown = min(self.cooldown * 2, self.max_cooldown)
+            self._open()
+        elif self.state == CLOSED and self.failures >= self.failure_threshold:
+            self._open()
+
+    def release(self):
+        """Попытка закончилась без вердикта (проиграла гонку или вернула None без ошибки)"""
+        self.probe_in_flight = False
+
+    def remaining(self) -> float:
+        """Сколько секунд осталось до пробной попытки"""
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self.cooldown - (self.clock() - self.opened_at))
+
+    def _open(self):
+        self.opened_at = self.clock()
+        self._set_state(OPEN)
+
+    def _set_state(self, state: str):
+        if state != self.state:
+            logger.warning(f"Circuit breaker {self.name}: {self.state} -> {state} (failures: {self.failures})")
+        self.state = state
+
+
+class CircuitBreakers:
+    """Набор выключателей по имени провайдера"""
+
+    def __init__(self, failure_threshold: int = FAILURE_THRESHOLD, cooldown: float = COOLDOWN,
+                 max_cooldown: float = MAX_COOLDOWN, clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.clock = clock
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    def get(self, name: str) -> CircuitBreaker:
+        breaker = self._breakers.get(name)
+        if breaker is None:
+            breaker = CircuitBreaker(name, self.failure_threshold, self.cooldown, self.max_cooldown, self.clock)
+            self._breakers[name] = breaker
+        return breaker
+
+    def state(self, name: str) -> Optional[str]:
+        breaker = self._breakers.get(name)
+        return breaker.state if breaker else None
+
+    def not_closed(self) -> List[CircuitBreaker]:
+        return [b for b in self._breakers.values() if b.state != CLOSED]
+
+    def summary(self) -> List[str]:
+        """Состояние незакрытых выключателей для /status и админки"""
+        lines = []
+        for breaker in sorted(self.not_closed(), key=lambda b: b.name):
+            if breaker.state == OPEN:
+                lines.append(f"{breaker.name}: open, проба через {breaker.remaining():.0f}s")
+            else:
+                lines.append(f"{breaker.name}: half-open, идет проба")
+        return lines
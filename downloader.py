@@ -0,0 +1,220 @@
+"""
+Асинхронное скачивание аудио по прямой ссылке.
+
+Если сервер отдает файл частями (HTTP Range, ответ 206 с размером в
+Content-Range), файл делится на DOWNLOAD_SEGMENTS отрезков, которые
+качаются параллельно и пишутся в заранее выделенный файл (запись идет в
+IO-пуле, event loop не блокируется). На CDN с большой задержкой это в
+разы быстрее одного потока. Если Range не поддерживается, файл меньше
+двух отрезков или какой-то отрезок не скачался — один поток, как раньше.
+
+Первый запрос сразу идет с Range: bytes=0-, поэтому проверка поддержки
+не стоит лишнего запроса: его ответ становится первым отрезком (или всем
+файлом, если сервер Range не поддерживает).
+
+Переопределение:
+    DOWNLOAD_SEGMENTS - сколько отрезков качать одновременно (1 - без Range)
+"""
+
+import asyncio
+import logging
+import os
+import re
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+import aiohttp
+
+from executors import run_io
+
+logger = logging.getLogger(__name__)
+
+SEGMENTS = int(os.getenv('DOWNLOAD_SEGMENTS', '4'))
+
+# Меньше двух таких отрезков — качаем одним потоком
+MIN_SEGMENT_SIZE = 1024 * 1024
+CHUNK_SIZE = 256 * 1024
+
+_CONTENT_RANGE = re.compile(r'bytes\s+(\d+)-(\d+)/(\d+)')
+
+
+class SegmentError(Exception):
+    """Отрезок не скачался целиком (сервер вернул не тот диапазон или оборвал поток)"""
+
+
+class ResponseError(Exception):
+    """Сервер ответил ошибкой (403, 404, 5xx): повтор тем же запросом не поможет"""
+
+
+def _pwrite_all(fd: int, data: bytes, offset: int):
+    view = memoryview(data)
+    while view:
+        written = os.pwrite(fd, view, offset)
+        view = view[written:]
+        offset += written
+
+
+class _FileWriter:
+    """Запись в файл по позициям из IO-пула.
+
+    Отмена задачи не останавливает уже начатую запись в потоке, поэтому
+    close() сначала дожидается всех начатых записей и только потом
+    закрывает дескриптор (иначе запись могла бы попасть в чужой файл).
+    """
+
+    def __init__(self, path: str):
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        self._pending = set()
+
+    async def write(self, data: bytes, offset: int):
+        task = asyncio.ensure_future(run_io(_pwrite_all, self.fd, data, offset))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+        await asyncio.shield(task)
+
+    async def drain(self):
+        """Дожидается начатых записей (в том числе от отмененных задач)"""
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+
+    async def truncate(self, size: int):
+        await self.drain()
+        await run_io(os.ftruncate, self.fd, size)
+
+    async def close(self):
+        await self.drain()
+        os.close(self.fd)
+
+
+def parse_content_range(value: Optional[str]) -> Optional[Tuple[int, int, int]]:
+    """'bytes 0-99/1000' -> (0, 99, 1000); None, если размер неизвестен"""
+    match = _CONTENT_RANGE.match(value or '')
+    if not match:
+        return None
+    return int(match.group(1)), int(match.group(2)), int(match.group(3))
+
+
+def split_ranges(size: int, segments: int) -> List[Tuple[int, int]]:
+    """Делит [0, size) на отрезки (start, end) включительно, не мельче MIN_SEGMENT_SIZE"""
+    count = max(1, min(segments, size // MIN_SEGMENT_SIZE))
+    step = -(-size // count)
+    return [(start, min(size, start + step) - 1) for start in range(0, size, step)]
+
+
+async def _write_stream(resp: aiohttp.ClientResponse, writer: _FileWriter, start: int, length: Optional[int]) -> int:
+    """Пишет тело ответа с позиции start (не больше length байт); возвращает число байт"""
+    written = 0
+    while length is None or written < length:
+        size = CHUNK_SIZE if length is None else min(CHUNK_SIZE, length - written)
+        chunk = await resp.content.read(size)
+        if not chunk:
+            break
+        await writer.write(chunk, start + written)
+        written += len(chunk)
+    return written
+
+
+async def _fetch_segment(session: aiohttp.ClientSession, url: str, headers: Dict[str, str],
+                         writer: _FileWriter, start: int, end: int, timeout: aiohttp.ClientTimeout):
+    request_headers = dict(headers, Range=f"bytes={start}-{end}")
+    async with session.get(url, headers=request_headers, timeout=timeout) as resp:
+        content_range = parse_content_range(resp.headers.get('Content-Range'))
+        if resp.status != 206 or not content_range or content_range[0] != start:
+            raise SegmentError(f"unexpected response {resp.status} for bytes {start}-{end}")
+        written = await _write_stream(resp, writer, start, end - start + 1)
+    if written != end - start + 1:
+        raise SegmentError(f"short segment {start}-{end}: {written} bytes")
+
+
+async def _ranged(session: aiohttp.ClientSession, url: str, headers: Dict[str, str], writer: _FileWriter,
+                  timeout: aiohttp.ClientTimeout, segments: int) -> Optional[int]:
+    """Параллельная загрузка отрезками; возвращает размер файла или None, если
+    Range не удался и стоит повторить одним потоком (416, 206 без размера).
+
+    Если сервер проигнорировал Range (200) или файл мал, тот же ответ
+    дочитывается одним потоком — без повторного запроса. Ответ с ошибкой
+    (ResponseError) повторять не нужно.
+    """
+    async with session.get(url, headers=dict(headers, Range='bytes=0-'), timeout=timeout) as resp:
+        if resp.status == 200:
+            return await _write_stream(resp, writer, 0, None)
+        if resp.status not in (206, 416):
+            raise ResponseError(f"HTTP {resp.status}")
+        content_range = parse_content_range(resp.headers.get('Content-Range'))
+        if resp.status != 206 or not content_range or content_range[0] != 0:
+            return None
+        size = content_range[2]
+        ranges = split_ranges(size, segments)
+        if len(ranges) < 2:
+            written = await _write_stream(resp, writer, 0, None)
+            if written != size:
+                raise SegmentError(f"short download: {written} of {size} bytes")
+            return size
+        # Выделяем место под весь файл: отрезки пишутся в свои позиции
+        await writer.truncate(size)
+        first_start, first_end = ranges[0]
+        rest = [asyncio.ensure_future(_fetch_segment(session, url, headers, writer, start, end, timeout))
+                for start, end in ranges[1:]]
+        try:
+            # Ответ на пробный запрос дочитываем как первый отрезок
+            written = await _write_stream(resp, writer, first_start, first_end - first_start + 1)
+            if written != first_end - first_start + 1:
+                raise SegmentError(f"short segment 0-{first_end}: {written} bytes")
+            await asyncio.gather(*rest)
+        finally:
+            for task in rest:
+                task.cancel()
+            await asyncio.gather(*rest, return_exceptions=True)
+    return size
+
+
+async def _single(session: aiohttp.ClientSession, url: str, headers: Dict[str, str], writer: _FileWriter,
+                  timeout: aiohttp.ClientTimeout) -> Optional[int]:
+    """Загрузка одним потоком"""
+    async with session.get(url, headers=headers, timeout=timeout) as resp:
+        if resp.status != 200:
+            return None
+        await writer.truncate(0)
+        return await _write_stream(resp, writer, 0, None)
+
+
+async def download_url(session: aiohttp.ClientSession, url: str, dest_path: str,
+                       timeout: Optional[aiohttp.ClientTimeout] = None,
+                       headers: Optional[Dict[str, str]] = None,
+                       segments: int = SEGMENTS) -> Optional[str]:
+    """Скачивает url в dest_path (отрезками, если сервер умеет Range); None — не удалось.
+
+    Файл пишется во временный и атомарно переименовывается, поэтому
+    параллельные загрузки в один путь не портят друг друга, а недокачанный
+    файл (ошибка или отмена задачи) не остается в downloads.
+    """
+    headers = dict(headers or {})
+    tmp_path = f"{dest_path}.{uuid.uuid4().hex}.part"
+    directory = os.path.dirname(dest_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    writer = _FileWriter(tmp_path)
+    closed = False
+    try:
+        size = None
+        if segments > 1:
+            try:
+                size = await _ranged(session, url, headers, writer, timeout, segments)
+            except ResponseError as e:
+                logger.warning(f"Download failed ({url}): {e}")
+                return None
+            except (SegmentError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.warning(f"Ranged download failed, retrying as a single stream ({url}): {e}")
+        if size is None:
+            size = await _single(session, url, headers, writer, timeout)
+        if size is None:
+            return None
+        closed = True
+        await writer.close()
+        os.replace(tmp_path, dest_path)
+        return dest_path
+    finally:
+        if not closed:
+            await writer.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
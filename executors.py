@@ -0,0 +1,81 @@
+"""
+Исполнители для блокирующих вызовов, чтобы они не останавливали event loop.
+
+IO  - сетевые библиотеки без async API: yt-dlp, spotipy, ytmusicapi.
+      Потоки в основном ждут сеть, поэтому пул шире (IO_WORKERS).
+CPU_WORKERS - сколько процессов ffmpeg работает одновременно (по умолчанию
+      число ядер). Они запускаются асинхронно в ffmpeg_service и потоков
+      не занимают.
+
+Пока блокирующий вызов выполняется в пуле, aiogram продолжает опрос,
+/health отвечает, а прогресс других пользователей обновляется.
+"""
+
+import asyncio
+import contextvars
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+IO_WORKERS = int(os.getenv('IO_WORKERS', '16'))
+CPU_WORKERS = int(os.getenv('CPU_WORKERS', str(os.cpu_count() or 2)))
+
+
+class BoundedExecutor:
+    """Пул потоков с учетом занятых и ожидающих задач (для /status)"""
+
+    def __init__(self, name: str, max_workers: int):
+        self.name = name
+        self.max_workers = max(1, max_workers)
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self.running = 0
+        self.queued = 0
+
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        """Выполняет func(*args, **kwargs) в пуле; contextvars (токен отмены, бюджет) передаются в поток"""
+        context = contextvars.copy_context()
+        state = {'dequeued': False}
+
+        def dequeue():
+            # Вызывается и при старте задачи, и при отмене до старта — считаем один раз
+            with self._lock:
+                if not state['dequeued']:
+                    state['dequeued'] = True
+                    self.queued -= 1
+
+        def call() -> Any:
+            dequeue()
+            with self._lock:
+                self.running += 1
+            try:
+                return context.run(func, *args, **kwargs)
+            finally:
+                with self._lock:
+                    self.running -= 1
+
+        with self._lock:
+            self.queued += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._pool, call)
+        finally:
+            dequeue()
+
+    def stats(self) -> Dict[str, int]:
+        return {'running': self.running, 'queued': self.queued, 'workers': self.max_workers}
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+IO_EXECUTOR = BoundedExecutor('io', IO_WORKERS)
+
+
+async def run_io(func: Callable, *args, **kwargs) -> Any:
+    """Блокирующий сетевой вызов (yt-dlp, spotipy, ytmusicapi)"""
+    return await IO_EXECUTOR.run(func, *args, **kwargs)
+
@@ -0,0 +1,193 @@
+"""
+Асинхронный сервис ffmpeg.
+
+Конвертации запускаются через asyncio.create_subprocess_exec: event loop
+не блокируется, а поток из пула не простаивает в ожидании процесса.
+    - одновременно работает не больше CPU_WORKERS процессов ffmpeg
+      (по умолчанию число ядер), остальные задания ждут в очереди;
+    - формат входа определяется ffprobe, а не угадывается (раньше был
+      жестко задан -f aac, и webm/ogg сначала падали);
+    - таймаут и отмена задачи убивают процесс ffmpeg;
+    - stats() отдает очередь, число заданий и время кодирования для /status;
+      в задания входят и таймауты, и потоковое кодирование (streaming.py
+      учитывает свои процессы через record и kill).
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
+
+from executors import CPU_WORKERS
+
+logger = logging.getLogger(__name__)
+
+FFMPEG_BINARY = 'ffmpeg'
+FFPROBE_BINARY = 'ffprobe'
+
+# Лимит одной конвертации (секунды)
+FFMPEG_TIMEOUT = 60
+
+# Сколько последних символов stderr ffmpeg оставлять в ошибке
+STDERR_TAIL = 2000
+
+# Параметры MP3, как у FFmpegExtractAudio в пресетах yt-dlp
+MP3_ENCODE_ARGS = [
+    '-vn', '-acodec', 'libmp3lame', '-ab', '192k', '-ar', '44100', '-ac', '2',
+    '-avoid_negative_ts', 'make_zero', '-fflags', '+genpts',
+]
+
+
+class FFmpegError(Exception):
+    """ffmpeg завершился ошибкой, не уложился во время или выдал пустой файл"""
+
+
+class FFmpegResult:
+    def __init__(self, returncode: int, stderr: str, elapsed: float):
+        self.returncode = returncode
+        self.stderr = stderr
+        self.elapsed = elapsed
+
+
+class FFmpegService:
+    """Ограниченный пул процессов ffmpeg с метриками"""
+
+    def __init__(self, workers: int = CPU_WORKERS, ffmpeg: str = FFMPEG_BINARY, ffprobe: str = FFPROBE_BINARY):
+        self.workers = max(1, workers)
+        self.ffmpeg = ffmpeg
+        self.ffprobe = ffprobe
+        self._loop = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.running = 0
+        self.queued = 0
+        self.jobs = 0
+        self.failed = 0
+        self.killed = 0
+        self.encode_time = 0.0
+
+    def _bind_loop(self):
+        # Семафор привязан к event loop; при новом loop (тесты) создаем заново
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._slots = asyncio.Semaphore(self.workers)
+
+    @asynccontextmanager
+    async def slot(self):
+        """Место для одного процесса ffmpeg (в том числе для потокового кодирования)"""
+        self._bind_loop()
+        self.queued += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.queued -= 1
+        self.running += 1
+        try:
+            yield
+        finally:
+            self.running -= 1
+            self._slots.release()
+
+    def record(self, elapsed: float, success: bool):
+        """Учитывает завершенное задание ffmpeg: время кодирования и неудачу"""
+        self.jobs += 1
+        self.encode_time += elapsed
+        if not success:
+            self.failed += 1
+
+    async def kill(self, process):
+        """Убивает незавершившийся процесс ffmpeg (таймаут, отмена, ошибка входа)"""
+        self.killed += 1
+        try:
+            process.kill()
+        except ProcessLookupError:
+            pass
+        await process.wait()
+
+    async def run(self, args: List[str], timeout: float = FFMPEG_TIMEOUT) -> FFmpegResult:
+        """Запускает ffmpeg с аргументами args в свободном слоте"""
+        async with self.slot():
+            started = time.monotonic()
+            try:
+                process = await asyncio.create_subprocess_exec(
+                    self.ffmpeg, '-hide_banner', '-loglevel', 'error', *args,
+                    stdin=asyncio.subprocess.DEVNULL,
+                    stdout=asyncio.subprocess.DEVNULL,
+                    stderr=asyncio.subprocess.PIPE,
+                )
+            except OSError as e:
+                # Нет бинарника или нет прав на запуск — для вызывающего это та же ошибка ffmpeg
+                self.record(time.monotonic() - started, False)
+                raise FFmpegError(f"could not start {self.ffmpeg}: {e}") from e
+            try:
+                _, stderr = await asyncio.wait_for(process.communicate(), timeout)
+            except asyncio.TimeoutError:
+                raise FFmpegError(f"ffmpeg timed out after {timeout:.0f}s")
+            finally:
+                if process.returncode is None:
+                    # Таймаут или отмена задачи: процесс не должен продолжать жечь процессор
+                    await self.kill(process)
+                # Убитый процесс — тоже задание, и оно неудачное
+                elapsed = time.monotonic() - started
+                self.record(elapsed, process.returncode == 0)
+            return FFmpegResult(process.returncode, stderr.decode('utf-8', 'replace')[-STDERR_TAIL:], elapsed)
+
+    async def probe(self, path: str) -> Dict[str, Optional[str]]:
+        """ffprobe: {'format': демультиплексор для -f, 'codec': кодек аудиодорожки}; пусто при ошибке"""
+        try:
+            process = await asyncio.create_subprocess_exec(
+                self.ffprobe, '-v', 'error', '-show_entries', 'format=format_name:stream=codec_type,codec_name',
+                '-of', 'json', path,
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL,
+            )
+            try:
+                stdout, _ = await asyncio.wait_for(process.communicate(), 15)
+            finally:
+                if process.returncode is None:
+                    process.kill()
+                    await process.wait()
+            data = json.loads(stdout or b'{}')
+        except (OSError, asyncio.TimeoutError, ValueError) as e:
+            logger.warning(f"ffprobe failed for {path}: {e}")
+            return {}
+        format_name = (data.get('format') or {}).get('format_name') or ''
+        audio = [s for s in data.get('streams') or [] if s.get('codec_type') == 'audio']
+        return {
+            # "mov,mp4,m4a,3gp,3g2,mj2" -> "mov": первое имя годится для -f
+            'format': format_name.split(',')[0] or None,
+            'codec': audio[0].get('codec_name') if audio else None,
+        }
+
+    async def _convert(self, src: str, dst: str, args: List[str], timeout: float) -> str:
+        result = await self.run(args, timeout)
+        if result.returncode != 0:
+            raise FFmpegError(f"ffmpeg exited with {result.returncode}: {result.stderr.strip()}")
+        if not os.path.exists(dst) or os.path.getsize(dst) <= 1000:
+            raise FFmpegError(f"ffmpeg produced no usable output for {src}")
+        return dst
+
+    async def transcode_mp3(self, src: str, dst: str, timeout: float = FFMPEG_TIMEOUT) -> str:
+        """Конвертирует src в MP3 192k; формат входа определяется ffprobe"""
+        input_format = (await self.probe(src)).get('format')
+        args = (['-f', input_format] if input_format else []) + ['-i', src] + MP3_ENCODE_ARGS + ['-f', 'mp3', '-y', dst]
+        return await self._convert(src, dst, args, timeout)
+
+    async def remux(self, src: str, dst: str, timeout: float = FFMPEG_TIMEOUT) -> str:
+        """Перепаковывает аудиодорожку в контейнер по расширению dst без перекодирования"""
+        args = ['-i', src, '-vn', '-map', '0:a:0', '-c:a', 'copy', '-y', dst]
+        return await self._convert(src, dst, args, timeout)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            'workers': self.workers, 'running': self.running, 'queued': self.queued,
+            'jobs': self.jobs, 'failed': self.failed, 'killed': self.killed,
+            'avg_time': self.encode_time / self.jobs if self.jobs else 0.0,
+        }
+
+
+FFMPEG = FFmpegService()
@@ -0,0 +1,121 @@
+"""
+Кэш file_id файлов, уже загруженных в Telegram.
+
+После успешной отправки Telegram возвращает file_id документа. Повторная
+отправка по file_id — один вызов Bot API без загрузки файла (до 50 МБ) и
+без поиска, скачивания и конвертации. Ключ — Spotify ID трека и вариант
+выхода (output_policy.output_variant), вместе с file_id хранится подпись.
+
+file_id действителен только для того бота, который загрузил файл: если
+Telegram его не принимает (сменился токен), запись удаляется и трек
+отправляется обычным путем.
+
+Записи сохраняются в JSON-файл и переживают перезапуски бота. Файл пишет
+flush не чаще раза в FLUSH_INTERVAL секунд (вызывать через executors.run_io),
+а число записей ограничено MAX_ENTRIES: сверх него забываются самые старые —
+при подключенном хранилище (storage.py) их file_id остаются в базе.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+from output_policy import output_variant
+from utils import atomic_write_json
+
+logger = logging.getLogger(__name__)
+
+# Сколько file_id держать в файле (0 — без ограничения)
+MAX_ENTRIES = int(os.getenv('FILE_ID_CACHE_MAX_ENTRIES', '50000'))
+
+# Как часто сохранять файл после изменений (секунды)
+FLUSH_INTERVAL = float(os.getenv('FILE_ID_CACHE_FLUSH_INTERVAL', '30'))
+
+
+class FileIdCache:
+    """(Spotify ID, вариант выхода) -> {'file_id', 'caption'}"""
+
+    def __init__(self, path: Optional[str] = None, max_entries: int = MAX_ENTRIES,
+                 flush_interval: float = FLUSH_INTERVAL):
+        self.path = path
+        self.max_entries = max_entries
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._saved_at = time.monotonic()
+        self.entries: Dict[str, Dict] = {}
+        self.hits = 0
+        if path:
+            self.load()
+
+    @staticmethod
+    def _key(track_id: str, variant: str) -> str:
+        return f"{track_id}:{variant}"
+
+    def get(self, track_id: str, variant: Optional[str] = None) -> Optional[Dict]:
+        with self._lock:
+            entry = self.entries.get(self._key(track_id, variant or output_variant()))
+            if entry is not None:
+                self.hits += 1
+            return entry
+
+    def set(self, track_id: str, file_id: str, caption: str, variant: Optional[str] = None):
+        """Запоминает file_id после успешной отправки"""
+        with self._lock:
+            self.entries[self._key(track_id, variant or output_variant())] = {
+                'file_id': file_id, 'caption': caption, 'created': time.time(),
+            }
+            self._trim()
+            self._dirty = True
+
+    def discard(self, track_id: str, variant: Optional[str] = None):
+        """Удаляет запись, которую Telegram не принял"""
+        with self._lock:
+            if self.entries.pop(self._key(track_id, variant or output_variant()), None) is not None:
+                self._dirty = True
+
+    def _trim(self):
+        """Забывает самые старые записи сверх max_entries (вызывается под блокировкой)"""
+        if not self.max_entries or len(self.entries) <= self.max_entries:
+            return
+        oldest = sorted(self.entries, key=lambda key: self.entries[key].get('created', 0))
+        for key in oldest[:len(self.entries) - self.max_entries]:
+            del self.entries[key]
+
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.error(f"Could not load file_id cache {self.path}: {e}")
+            return
+        if isinstance(data, dict):
+            self.entries = {key: entry for key, entry in data.items() if isinstance(entry, dict) and entry.get('file_id')}
+            self._trim()
+
+    def save(self):
+        """Атомарно сохраняет записи в файл, если они изменились"""
+        if not self.path:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            try:
+                atomic_write_json(self.path, self.entries, ensure_ascii=False)
+                self._dirty = False
+            except OSError as e:
+                logger.error(f"Could not save file_id cache {self.path}: {e}")
+            self._saved_at = time.monotonic()
+
+    def flush(self):
+        """Сохраняет записи, если они изменились и с прошлого сохранения прошло flush_interval секунд"""
+        if self._dirty and time.monotonic() - self._saved_at >= self.flush_interval:
+            self.save()
+
+    def summary(self) -> str:
+        return f"file_id: {len(self.entries)}, повторных отправок: {self.hits}"
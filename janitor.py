@@ -0,0 +1,96 @@
+"""
+Периодическая уборка диска.
+
+Рабочие папки заданий удаляются при выходе из utils.job_workdir, но после
+аварийного завершения потока, зависшего процесса yt-dlp или ошибки вне
+задания в downloads/ могут остаться папки и файлы (.part, .webm, .tmp).
+Janitor раз в interval секунд:
+    - удаляет рабочие папки старше max_age (выполняющиеся задания не трогает);
+    - удаляет файлы старше max_age прямо в downloads/ (туда пишут только
+      вызовы вне задания);
+    - убирает из аудиокэша недописанные .tmp и файлы без записи в индексе
+      и вытесняет лишнее сверх лимита размера (audio_cache.AudioCache).
+
+Все операции с диском выполняются в IO-пуле (executors.run_io).
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Optional
+
+from executors import run_io
+from utils import remove_stale_workdirs
+from ydl_presets import DOWNLOAD_DIR
+
+logger = logging.getLogger(__name__)
+
+
+def remove_stale_files(root: str, max_age: float) -> int:
+    """Удаляет файлы (не папки) в root старше max_age секунд"""
+    if not os.path.isdir(root):
+        return 0
+    removed = 0
+    now = time.time()
+    for entry in os.scandir(root):
+        if not entry.is_file() or now - entry.stat().st_mtime < max_age:
+            continue
+        try:
+            os.remove(entry.path)
+            removed += 1
+        except OSError as e:
+            logger.warning(f"Could not remove stale file {entry.path}: {e}")
+    return removed
+
+
+class Janitor:
+    """Фоновая уборка папки загрузок и аудиокэша"""
+
+    def __init__(self, interval: float, max_age: float, download_dir: str = DOWNLOAD_DIR, audio_cache=None):
+        self.interval = interval
+        self.max_age = max_age
+        self.download_dir = download_dir
+        self.audio_cache = audio_cache
+        self.runs = 0
+        self.removed = 0
+        self._task: Optional[asyncio.Task] = None
+
+    async def run_once(self) -> int:
+        """Один проход уборки; возвращает число удаленных папок и файлов"""
+        removed = await run_io(remove_stale_workdirs, self.download_dir, self.max_age)
+        removed += await run_io(remove_stale_files, self.download_dir, self.max_age)
+        if self.audio_cache is not None:
+            removed += await run_io(self.audio_cache.sweep, self.max_age)
+            removed += await run_io(self.audio_cache.evict)
+            # Заодно сохраняем счетчики попаданий, отложенные flush
+            await run_io(self.audio_cache.save)
+        self.runs += 1
+        self.removed += removed
+        if removed:
+            logger.info(f"Janitor removed {removed} stale entries")
+        return removed
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"Janitor run failed: {e}")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def summary(self) -> str:
+        return f"проходов: {self.runs}, удалено: {self.removed}"
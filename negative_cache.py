@@ -0,0 +1,173 @@
+"""
+Кэш промахов провайдеров: "у провайдера X нет трека Y" на время TTL.
+
+Промахи хранятся в паре фильтров Блума — текущее и предыдущее поколение.
+Новая запись попадает в текущее поколение; раз в TTL/2 поколения сдвигаются,
+а самое старое выбрасывается, поэтому промах помнится примерно от TTL/2 до TTL секунд.
+Ложное срабатывание (с вероятностью ERROR_RATE) стоит лишь пропуска одного
+провайдера для одного трека.
+
+Фильтры сохраняются в JSON-файл и переживают перезапуски бота; после
+запросов их сохраняет flush не чаще раза в FLUSH_INTERVAL секунд.
+"""
+
+import base64
+import hashlib
+import json
+import logging
+import math
+import os
+import threading
+import time
+from typing import Callable, Optional
+
+from utils import atomic_write_json
+
+logger = logging.getLogger(__name__)
+
+# Сколько промахов помнит одно поколение при заданной доле ложных срабатываний
+CAPACITY = 20000
+ERROR_RATE = 0.001
+
+# Время жизни промаха по умолчанию (секунды)
+TTL = 6 * 3600
+
+# Как часто сохранять фильтры в файл (секунды)
+FLUSH_INTERVAL = float(os.getenv('NEGATIVE_CACHE_FLUSH_INTERVAL', '60'))
+
+
+class BloomFilter:
+    """Фильтр Блума на bytearray с двойным хешированием blake2b"""
+
+    def __init__(self, capacity: int = CAPACITY, error_rate: float = ERROR_RATE):
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, key: str):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+class NegativeCache:
+    """Промахи провайдеров с временем жизни, по ключу (провайдер, трек)"""
+
+    def __init__(self, path: Optional[str] = None, ttl: float = TTL, capacity: int = CAPACITY,
+                 error_rate: float = ERROR_RATE, clock: Callable[[], float] = time.time,
+                 flush_interval: float = FLUSH_INTERVAL):
+        self.path = path
+        self.ttl = ttl
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.flush_interval = flush_interval
+        self._saved_at = time.monotonic()
+        # Время переживает перезапуск, поэтому по умолчанию time.time, а не monotonic
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._dirty = False
+        self.current = BloomFilter(capacity, error_rate)
+        self.previous = BloomFilter(capacity, error_rate)
+        self.started_at = clock()
+        if path:
+            self.load()
+
+    @staticmethod
+    def _key(provider: str, track_key: str) -> str:
+        return f"{provider.casefold()}\0{track_key}"
+
+    def _rotate(self):
+        """Сдвигает поколения раз в TTL/2 (или раньше, если текущее переполнено)"""
+        elapsed = self.clock() - self.started_at
+        if elapsed >= self.ttl:
+            self.previous = BloomFilter(self.capacity, self.error_rate)
+        elif elapsed >= self.ttl / 2 or self.current.count >= self.capacity:
+            self.previous = self.current
+        else:
+            return
+        self.current = BloomFilter(self.capacity, self.error_rate)
+        self.started_at = self.clock()
+        self._dirty = True
+
+    def has(self, provider: str, track_key: str) -> bool:
+        """Был ли у провайдера недавний промах по этому треку"""
+        key = self._key(provider, track_key)
+        with self._lock:
+            self._rotate()
+            return key in self.current or key in self.previous
+
+    def add(self, provider: str, track_key: str):
+        """Запоминает, что провайдер ничего не нашел для трека"""
+        key = self._key(provider, track_key)
+        with self._lock:
+            self._rotate()
+            if key not in self.current:
+                self.current.add(key)
+                self._dirty = True
+
+    def load(self):
+        """Загружает фильтры из файла; файл с другими параметрами игнорируется"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.error(f"Could not load negative cache {self.path}: {e}")
+            return
+        try:
+            if data.get('capacity') != self.capacity or data.get('error_rate') != self.error_rate:
+                logger.info("Negative cache parameters changed, starting empty")
+                return
+            filters = []
+            for name in ('current', 'previous'):
+                bloom = BloomFilter(self.capacity, self.error_rate)
+                bits = base64.b64decode(data[name]['bits'])
+                if len(bits) != len(bloom.bits):
+                    return
+                bloom.bits = bytearray(bits)
+                bloom.count = int(data[name]['count'])
+                filters.append(bloom)
+            self.current, self.previous = filters
+            self.started_at = float(data['started_at'])
+        except (KeyError, TypeError, ValueError) as e:
+            logger.error(f"Invalid negative cache {self.path}: {e}")
+
+    def save(self):
+        """Атомарно сохраняет фильтры в файл, если они изменились"""
+        if not self.path:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {
+                'capacity': self.capacity,
+                'error_rate': self.error_rate,
+                'started_at': self.started_at,
+                'current': {'count': self.current.count, 'bits': base64.b64encode(self.current.bits).decode('ascii')},
+                'previous': {'count': self.previous.count, 'bits': base64.b64encode(self.previous.bits).decode('ascii')},
+            }
+            try:
+                atomic_write_json(self.path, data)
+                self._dirty = False
+            except OSError as e:
+                logger.error(f"Could not save negative cache {self.path}: {e}")
+            self._saved_at = time.monotonic()
+
+    def flush(self):
+        """Сохраняет фильтры, если они изменились и с прошлого сохранения прошло flush_interval секунд"""
+        if self._dirty and time.monotonic() - self._saved_at >= self.flush_interval:
+            self.save()
+
+    def summary(self) -> str:
+        return f"промахов в кэше: ~{self.current.count + self.previous.count}, TTL {self.ttl / 3600:.1f}ч"
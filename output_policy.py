@@ -0,0 +1,94 @@
+"""
+Политика выходного формата аудио.
+
+AUDIO_OUTPUT=mp3 (по умолчанию) — как раньше: всё перекодируется в MP3 192k.
+AUDIO_OUTPUT=passthrough — исходный кодек сохраняется, если Telegram его
+принимает, а файл не больше лимита:
+    - yt-dlp только извлекает аудиодорожку без перекодирования
+      (FFmpegExtractAudio с preferredcodec='best': AAC -> .m4a, Opus -> .opus);
+    - process_track отправляет .mp3/.m4a/.ogg/.opus как есть, .webm и .aac
+      перепаковывает (-c:a copy) в .ogg/.m4a, а перекодирует в MP3 только
+      остальное (wav, flac, ...).
+
+Декодирование и кодирование MP3 — основная нагрузка на процессор; при
+passthrough она остается только для форматов, которые иначе не отправить.
+"""
+
+import os
+from typing import Dict, Optional, Tuple
+
+# 'mp3' или 'passthrough'
+OUTPUT_POLICY = os.getenv('AUDIO_OUTPUT', 'mp3').strip().lower()
+
+# Лимит Telegram Bot API на отправку файла
+TELEGRAM_MAX_FILE_SIZE = 50 * 1024 * 1024
+
+# Все расширения, которые process_track умеет отправить, перепаковать или
+# сконвертировать (остальные файлы провайдеров считаются негодными)
+AUDIO_EXTENSIONS = ('.mp3', '.m4a', '.aac', '.ogg', '.opus', '.wav', '.webm')
+
+# Отправляются без изменений
+SENDABLE_EXTENSIONS = ('.mp3', '.m4a', '.ogg', '.opus')
+
+# Кодеки, которые отправляются без перекодирования (по данным ffprobe)
+SENDABLE_CODECS = ('mp3', 'aac', 'opus', 'vorbis')
+
+# Перепаковка без перекодирования: контейнер Telegram не понравится, кодек подходит
+REMUX_TARGETS = {
+    '.webm': '.ogg',   # Opus/Vorbis
+    '.aac': '.m4a',    # ADTS AAC
+}
+
+SEND = 'send'
+REMUX = 'remux'
+TRANSCODE = 'transcode'
+
+
+def passthrough_enabled(policy: Optional[str] = None) -> bool:
+    return (policy or OUTPUT_POLICY) == 'passthrough'
+
+
+def output_variant(policy: Optional[str] = None) -> str:
+    """Формат и битрейт готового файла — часть ключа кэша аудио"""
+    return 'passthrough' if passthrough_enabled(policy) else 'mp3-192k'
+
+
+def plan_output(path: str, size: int, policy: Optional[str] = None,
+                codec: Optional[str] = None) -> Tuple[str, str]:
+    """Что сделать с файлом перед отправкой: (SEND|REMUX|TRANSCODE, итоговое расширение).
+
+    codec — кодек аудиодорожки от ffprobe; без него решение принимается по расширению.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if not passthrough_enabled(policy):
+        return (SEND, ext) if ext == '.mp3' else (TRANSCODE, '.mp3')
+    if size > TELEGRAM_MAX_FILE_SIZE:
+        # Слишком большой файл: MP3 192k обычно компактнее исходника без потерь
+        return (SEND, ext) if ext == '.mp3' else (TRANSCODE, '.mp3')
+    if codec and codec not in SENDABLE_CODECS:
+        # Например, ALAC в .m4a или FLAC в .ogg
+        return TRANSCODE, '.mp3'
+    if ext in SENDABLE_EXTENSIONS:
+        return SEND, ext
+    if ext in REMUX_TARGETS:
+        return REMUX, REMUX_TARGETS[ext]
+    return TRANSCODE, '.mp3'
+
+
+def apply_to_ydl_opts(opts: Dict, policy: Optional[str] = None) -> Dict:
+    """Настройки yt-dlp под политику: при passthrough извлечение аудио без перекодирования в MP3"""
+    if not passthrough_enabled(policy):
+        return opts
+    postprocessors = opts.get('postprocessors')
+    if not postprocessors:
+        return opts
+    result = dict(opts)
+    result['postprocessors'] = [
+        dict(pp, preferredcodec='best') if pp.get('key') == 'FFmpegExtractAudio' else pp
+        for pp in postprocessors
+    ]
+    # Аргументы FFmpeg из пресетов принудительно кодируют в MP3 (-acodec mp3)
+    pp_args = result.get('postprocessor_args')
+    if isinstance(pp_args, dict) and 'FFmpegExtractAudio' in pp_args:
+        result['postprocessor_args'] = {k: v for k, v in pp_args.items() if k != 'FFmpegExtractAudio'}
+    return result
@@ -0,0 +1,362 @@
+"""
+Движок запуска провайдеров: последовательный проход и "гонка" внутри тира.
+
+Провайдеры одного тира запускаются одновременно, побеждает первый, вернувший
+валидный аудиофайл; остальные попытки отменяются (задача asyncio отменяется,
+а загрузка yt-dlp прерывается через токен отмены в utils.cancel_token_var).
+
+Провайдер, который штатно отработал и ничего не нашел, возвращает NO_RESULTS;
+только такой исход записывается в кэш промахов. None означает "не получилось"
+(скачивание не удалось, ответ непонятен), ошибки сети и сайта пробрасываются —
+ни то, ни другое промахом не считается.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from output_policy import AUDIO_EXTENSIONS
+from utils import budget_remaining, cancel_token_var
+
+logger = logging.getLogger(__name__)
+
+# Файлы меньше 10KB считаем битыми (тот же порог, что в process_track)
+MIN_AUDIO_SIZE = 10000
+
+
+
+class NoResults:
+    """Ответ провайдера "поиск прошел, ничего не найдено" (ложен, как пустой список)"""
+
+    def __bool__(self):
+        return False
+
+    def __len__(self):
+        return 0
+
+    def __iter__(self):
+        return iter(())
+
+    def __repr__(self):
+        return 'NO_RESULTS'
+
+
+NO_RESULTS = NoResults()
+
+# Попытка провайдера: (имя, фабрика корутины, возвращающей путь к файлу или None)
+ProviderAttempt = Tuple[str, Callable[[], Awaitable[Optional[str]]]]
+
+# Двухфазный режим: лимит на поиск кандидатов у одного провайдера и
+# сколько лучших кандидатов пробуем скачать, прежде чем перейти к обычной цепочке
+SEARCH_TIMEOUT = 30  # поиск может перебрать несколько вариантов запроса
+MAX_FETCH_CANDIDATES = 3
+
+
+def is_valid_audio_file(path: Optional[str]) -> bool:
+    """Проверяет, что провайдер вернул существующий аудиофайл разумного размера"""
+    if not path or not os.path.isfile(path):
+        return False
+    if not path.lower().endswith(AUDIO_EXTENSIONS):
+        return False
+    return os.path.getsize(path) >= MIN_AUDIO_SIZE
+
+
+def _discard_file(path: Optional[str], keep: Optional[str] = None):
+    """Удаляет файл проигравшего провайдера (если это не файл победителя)"""
+    if not path or path == keep:
+        return
+    try:
+        if os.path.isfile(path):
+            os.remove(path)
+            logger.info(f"Race: removed loser file {path}")
+    except OSError as e:
+        logger.warning(f"Race: could not remove loser file {path}: {e}")
+
+
+async def race_providers(attempts: Sequence[ProviderAttempt], timeout: Optional[float] = None) -> Optional[Tuple[str, str]]:
+    """Запускает попытки одновременно и возвращает (имя, путь) первой успешной.
+
+    Остальные попытки отменяются. Если за timeout секунд никто не победил,
+    отменяются все и возвращается None.
+    """
+    if not attempts:
+        return None
+
+    tokens: Dict[asyncio.Task, threading.Event] = {}
+    names: Dict[asyncio.Task, str] = {}
+
+    async def _run(token: threading.Event, factory: Callable[[], Awaitable[Optional[str]]]) -> Optional[str]:
+        # Задача получает собственную копию контекста, поэтому токен виден
+        # только этой попытке (и потокам yt-dlp, запущенным из неё)
+        cancel_token_var.set(token)
+        return await factory()
+
+    for name, factory in attempts:
+        token = threading.Event()
+        task = asyncio.create_task(_run(token, factory))
+        tokens[task] = token
+        names[task] = name
+
+    winner: Optional[Tuple[str, str]] = None
+    pending = set(tokens)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout if timeout else None
+    try:
+        while pending and winner is None:
+            remaining = None if deadline is None else max(0.0, deadline - loop.time())
+            done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                logger.warning(f"Race: no winner within {timeout}s among {[names[t] for t in pending]}")
+                break
+            for task in done:
+                name = names[task]
+                if task.cancelled():
+                    continue
+                exc = task.exception()
+                if exc is not None:
+                    logger.error(f"{name} error: {exc}")
+                    continue
+                path = task.result()
+                if winner is None and is_valid_audio_file(path):
+                    winner = (name, path)
+                elif path:
+                    if winner is None:
+                        logger.warning(f"{name} returned invalid file: {path}")
+                    _discard_file(path, keep=winner[1] if winner else None)
+    finally:
+        if pending:
+            for task in pending:
+                tokens[task].set()
+                task.cancel()
+            logger.info(f"Race: cancelling {[names[t] for t in pending]}")
+            results = await asyncio.gather(*pending, return_exceptions=True)
+            for result in results:
+                if isinstance(result, str):
+                    _discard_file(result, keep=winner[1] if winner else None)
+
+    return winner
+
+
+async def run_tiers(tiers: Sequence[Sequence[ProviderAttempt]], tier_timeout: Optional[float] = None) -> Optional[Tuple[str, str]]:
+    """Проходит тиры по порядку; внутри тира провайдеры соревнуются.
+
+    Тир из одного провайдера — обычный последовательный вызов. Если у запроса
+    есть бюджет времени (utils.request_budget), тиры не запускаются после его
+    исчерпания, а таймаут тира урезается до остатка.
+    """
+    for index, tier in enumerate(tiers, 1):
+        if not tier:
+            continue
+        remaining = budget_remaining()
+        if remaining is not None and remaining <= 0:
+            logger.warning(f"Request budget exhausted, skipping {len(tiers) - index + 1} remaining tier(s)")
+            return None
+        if len(tier) > 1:
+            logger.info(f"Race tier {index}: {[name for name, _ in tier]}")
+        winner = await race_providers(tier, timeout=_cap_to_budget(tier_timeout))
+        if winner:
+            return winner
+    return None
+
+
+def _cap_to_budget(timeout: Optional[float]) -> Optional[float]:
+    """Урезает таймаут до оставшегося бюджета запроса"""
+    remaining = budget_remaining()
+    if remaining is None:
+        return timeout
+    remaining = max(remaining, 0.01)
+    return min(timeout, remaining) if timeout else remaining
+
+
+def _attempt_interrupted() -> bool:
+    """Попытку прервали (таймаут, отмена, исчерпан бюджет) — пустой результат не значит, что трека нет"""
+    token = cancel_token_var.get()
+    if token is not None and token.is_set():
+        return True
+    remaining = budget_remaining()
+    return remaining is not None and remaining <= 0
+
+
+def spec_attempt(spec, ctx, stats=None, breakers=None, misses=None) -> ProviderAttempt:
+    """Превращает ProviderSpec из реестра в попытку с таймаутом провайдера.
+
+    Если передан stats (provider_stats.ProviderStats), исход попытки и ее
+    длительность записываются в статистику; если breakers
+    (circuit_breaker.CircuitBreakers) — провайдер с открытым выключателем
+    пропускается, а исход попытки переключает выключатель. Отмена
+    проигравшего в гонке провалом провайдера не считается. Если передан
+    misses (negative_cache.NegativeCache), провайдер с недавним промахом по
+    ctx.track_key пропускается, а провайдер, вернувший NO_RESULTS,
+    записывается как промах.
+    """
+    async def run_with_timeout() -> Optional[str]:
+        timeout = _cap_to_budget(spec.timeout)
+        if not timeout:
+            return await spec.run(ctx)
+        try:
+            return await asyncio.wait_for(spec.run(ctx), timeout=timeout)
+        except asyncio.TimeoutError:
+            # Поток yt-dlp сам не остановится — прерываем его через токен отмены
+            token = cancel_token_var.get()
+            if token is not None:
+                token.set()
+            logger.warning(f"{spec.name} timed out after {timeout:.1f}s")
+            raise
+
+    def record(success: bool, elapsed: float):
+        if stats is not None:
+            stats.record(spec.name, success, elapsed)
+        if breaker is not None:
+            if success:
+                breaker.record_success()
+            else:
+                breaker.record_failure()
+
+    breaker = breakers.get(spec.name) if breakers is not None else None
+
+    async def attempt() -> Optional[str]:
+        remaining = budget_remaining()
+        if remaining is not None and remaining <= 0:
+            return None
+        if misses is not None and misses.has(spec.name, ctx.track_key):
+            logger.info(f"Provider: {spec.name} skipped (recent miss)")
+            return None
+        if breaker is not None and not breaker.allow():
+            logger.info(f"Provider: {spec.name} skipped (circuit {breaker.state})")
+            return None
+        logger.info(f"Provider: {spec.name}")
+        started = time.monotonic()
+        try:
+            path = await run_with_timeout()
+        except asyncio.CancelledError:
+            if breaker is not None:
+                breaker.release()
+            raise
+        except asyncio.TimeoutError:
+            record(False, time.monotonic() - started)
+            return None
+        except Exception:
+            record(False, time.monotonic() - started)
+            raise
+        if path is NO_RESULTS or path is None:
+            if path is NO_RESULTS and misses is not None and not _attempt_interrupted():
+                misses.add(spec.name, ctx.track_key)
+            # Провайдер отработал без ошибок, просто трека не дал: для статистики
+            # это неуспех, но выключатель размыкают только сбои
+            if stats is not None:
+                stats.record(spec.name, False, time.monotonic() - started)
+            if breaker is not None:
+                if path is NO_RESULTS:
+                    breaker.record_success()
+                else:
+                    breaker.release()
+            return None
+        record(is_valid_audio_file(path), time.monotonic() - started)
+        return path
+    return spec.name, attempt
+
+
+def group_tiers(specs: Sequence) -> List[List]:
+    """Группирует провайдеров по тирам (по возрастанию), внутри тира — по order"""
+    tiers: Dict[int, List] = {}
+    for spec in sorted(specs, key=lambda s: (s.tier, s.order)):
+        tiers.setdefault(spec.tier, []).append(spec)
+    return list(tiers.values())
+
+
+async def run_pipeline(specs: Sequence, ctx, racing: bool = False,
+                       tier_timeout: Optional[float] = None, stats=None,
+                       breakers=None, misses=None) -> Optional[Tuple[str, str]]:
+    """Запускает провайдеров из реестра (providers.ProviderSpec) для одного запроса.
+
+    Без racing провайдеры вызываются строго по очереди в порядке order,
+    с racing — тир за тиром, внутри тира одновременно. Исходы попыток
+    пишутся в stats, breakers и misses, если они переданы.
+    """
+    if racing:
+        tiers = [[spec_attempt(spec, ctx, stats, breakers, misses) for spec in tier] for tier in group_tiers(specs)]
+        return await run_tiers(tiers, tier_timeout=tier_timeout)
+    ordered = sorted(specs, key=lambda s: s.order)
+    return await run_tiers([[spec_attempt(spec, ctx, stats, breakers, misses)] for spec in ordered])
+
+
+async def gather_candidates(specs: Sequence, ctx, breakers=None, misses=None) -> List[Dict]:
+    """Фаза 1: параллельно собирает кандидатов у всех провайдеров с search.
+
+    Ничего не скачивается; каждому кандидату проставляется 'provider'.
+    Исключение или таймаут поиска считается неудачей для выключателя,
+    кандидаты или NO_RESULTS — успехом; NO_RESULTS еще и промахом (misses).
+    """
+    async def search_one(spec) -> List[Dict]:
+        if misses is not None and misses.has(spec.name, ctx.track_key):
+            logger.info(f"Search: {spec.name} skipped (recent miss)")
+            return []
+        breaker = breakers.get(spec.name) if breakers is not None else None
+        if breaker is not None and not breaker.allow():
+            logger.info(f"Search: {spec.name} skipped (circuit {breaker.state})")
+            return []
+        timeout = _cap_to_budget(min(spec.timeout or SEARCH_TIMEOUT, SEARCH_TIMEOUT))
+        try:
+            found = await asyncio.wait_for(spec.search(ctx), timeout=timeout)
+        except asyncio.CancelledError:
+            if breaker is not None:
+                breaker.release()
+            raise
+        except Exception as e:
+            logger.warning(f"Search: {spec.name} failed: {e!r}")
+            if breaker is not None:
+                breaker.record_failure()
+            return []
+        if breaker is not None:
+            if found or found is NO_RESULTS:
+                breaker.record_success()
+            else:
+                breaker.release()
+        if found is NO_RESULTS and misses is not None and not _attempt_interrupted():
+            misses.add(spec.name, ctx.track_key)
+        found = [dict(candidate, provider=spec.name) for candidate in (found or []) if candidate.get('url') or candidate.get('id')]
+        logger.info(f"Search: {spec.name} returned {len(found)} candidates")
+        return found
+
+    results = await asyncio.gather(*(search_one(spec) for spec in specs))
+    return [candidate for found in results for candidate in found]
+
+
+async def run_two_phase(specs: Sequence, ctx, rank: Callable[[List[Dict]], List[Dict]],
+                        racing: bool = False, tier_timeout: Optional[float] = None,
+                        stats=None, breakers=None, misses=None) -> Optional[Tuple[str, str]]:
+    """Поиск, затем скачивание: сначала кандидаты всех провайдеров с search
+    ранжируются в одном месте (rank), и скачивается только лучший. Если лучшие
+    MAX_FETCH_CANDIDATES кандидатов не скачались, запускается обычная цепочка
+    из провайдеров, которые кандидатов не дали (или не умеют искать).
+    Провайдеры, поиск которых вернул NO_RESULTS, записываются в misses и в
+    обычной цепочке пропускаются.
+    """
+    searchable = [spec for spec in specs if spec.two_phase]
+    by_name = {spec.name: spec for spec in searchable}
+    candidates = await gather_candidates(searchable, ctx, breakers, misses)
+    ranked = rank(candidates) if candidates else []
+    logger.info(f"Two-phase: {len(candidates)} candidates, {len(ranked)} after ranking")
+
+    for candidate in ranked[:MAX_FETCH_CANDIDATES]:
+        spec = by_name[candidate['provider']]
+        logger.info(f"Two-phase: fetching '{candidate.get('title')}' from {spec.name}")
+
+        async def fetch(run_ctx, spec=spec, candidate=candidate):
+            return await spec.fetch(run_ctx, candidate)
+
+        # Неудачное скачивание найденного кандидата — не промах провайдера
+        winner = await run_tiers([[spec_attempt(spec.copy(run=fetch), ctx, stats, breakers)]])
+        if winner:
+            if ctx is not None:
+                ctx.selected = candidate
+            return winner
+
+    # Провайдеры, чьих кандидатов уже оценили, повторно не запускаем
+    searched = {candidate['provider'] for candidate in candidates}
+    rest = [spec for spec in specs if spec.name not in searched]
+    return await run_pipeline(rest, ctx, racing=racing, tier_timeout=tier_timeout, stats=stats, breakers=breakers,
+                              misses=misses)
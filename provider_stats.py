@@ -0,0 +1,186 @@
+"""
+Статистика провайдеров и адаптивный порядок их запуска.
+
+Для каждого провайдера копится (с затуханием) число попыток, число успехов
+и среднее время попытки. Ожидаемое время до успеха = среднее время попытки
+/ вероятность успеха. Порядок выбирается сэмплированием Томпсона: вероятность
+успеха берется из Beta-распределения, поэтому редко работающие провайдеры
+время от времени все равно пробуются раньше (исследование).
+
+Статистика хранится в JSON-файле и переживает перезапуски бота; при
+подключенном хранилище (storage.py) она еще и общая для всех экземпляров:
+попытки, записанные после последней выгрузки, забираются drain_pending,
+применяются в базе как приращения, а общая статистика возвращается через merge.
+"""
+
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+from utils import atomic_write_json
+
+logger = logging.getLogger(__name__)
+
+# Вес старых наблюдений: каждая новая попытка умножает накопленные счетчики на DECAY,
+# чтобы статистика следовала за изменениями сайтов
+DECAY = 0.98
+
+# Сглаживание среднего времени попытки
+LATENCY_ALPHA = 0.2
+
+# Пока у провайдера меньше попыток, он остается на объявленной в реестре позиции
+MIN_SAMPLES = 3
+
+# Сколько невыгруженных попыток помнить для общего хранилища (старые отбрасываются)
+PENDING_LIMIT = 1000
+
+# Как часто сохранять статистику в файл (секунды)
+FLUSH_INTERVAL = float(os.getenv('PROVIDER_STATS_FLUSH_INTERVAL', '30'))
+
+# Попытка для хранилища: (провайдер, успех, длительность, время окончания)
+Attempt = Tuple[str, bool, float, float]
+
+
+class ProviderStats:
+    """Накопленная статистика успехов и времени провайдеров"""
+
+    def __init__(self, path: Optional[str] = None, min_samples: int = MIN_SAMPLES, rng: Optional[random.Random] = None,
+                 flush_interval: float = FLUSH_INTERVAL):
+        self.path = path
+        self.min_samples = min_samples
+        self.rng = rng or random.Random()
+        self.flush_interval = flush_interval
+        self._data: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._saved_at = time.monotonic()
+        self._pending = deque(maxlen=PENDING_LIMIT)
+        if path:
+            self.load()
+
+    def load(self):
+        """Загружает статистику из файла (если он есть)"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.error(f"Could not load provider stats {self.path}: {e}")
+            return
+        if isinstance(data, dict):
+            self._data = {
+                name: {key: float(entry.get(key, 0)) for key in ('attempts', 'successes', 'avg_time', 'last_success')}
+                for name, entry in data.items() if isinstance(entry, dict)
+            }
+
+    def save(self):
+        """Атомарно сохраняет статистику в файл, если она изменилась"""
+        if not self.path:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            try:
+                atomic_write_json(self.path, self._data, ensure_ascii=False, indent=1, sort_keys=True)
+                self._dirty = False
+            except OSError as e:
+                logger.error(f"Could not save provider stats {self.path}: {e}")
+            self._saved_at = time.monotonic()
+
+    def flush(self):
+        """Сохраняет статистику, если она изменилась и с прошлого сохранения прошло flush_interval секунд"""
+        if self._dirty and time.monotonic() - self._saved_at >= self.flush_interval:
+            self.save()
+
+    def record(self, name: str, success: bool, elapsed: float):
+        """Учитывает завершенную попытку провайдера"""
+        with self._lock:
+            entry = self._data.setdefault(name, {'attempts': 0.0, 'successes': 0.0, 'avg_time': 0.0, 'last_success': 0.0})
+            entry['attempts'] = entry['attempts'] * DECAY + 1
+            entry['successes'] = entry['successes'] * DECAY + (1 if success else 0)
+            if entry['avg_time']:
+                entry['avg_time'] += LATENCY_ALPHA * (elapsed - entry['avg_time'])
+            else:
+                entry['avg_time'] = elapsed
+            now = time.time()
+            if success:
+                entry['last_success'] = now
+            self._pending.append((name, success, elapsed, now))
+            self._dirty = True
+
+    def drain_pending(self) -> List[Attempt]:
+        """Забирает попытки, еще не выгруженные в общее хранилище"""
+        with self._lock:
+            attempts = list(self._pending)
+            self._pending.clear()
+            return attempts
+
+    def requeue(self, attempts: List[Attempt]):
+        """Возвращает попытки, которые не удалось выгрузить (выгрузятся в следующий раз)"""
+        with self._lock:
+            self._pending.extendleft(reversed(attempts))
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """Копия статистики для сохранения во внешнее хранилище (storage.py)"""
+        with self._lock:
+            return {name: dict(entry) for name, entry in self._data.items()}
+
+    def merge(self, data: Dict[str, Dict[str, float]]):
+        """Подменяет записи провайдеров данными из общего хранилища (в них уже учтены
+        выгруженные попытки этого и остальных экземпляров)"""
+        with self._lock:
+            for name, entry in data.items():
+                self._data[name] = {key: float(entry.get(key, 0)) for key in ('attempts', 'successes', 'avg_time', 'last_success')}
+            self._dirty = True
+
+    def get(self, name: str) -> Optional[Dict[str, float]]:
+        entry = self._data.get(name)
+        return dict(entry) if entry else None
+
+    def success_rate(self, name: str) -> Optional[float]:
+        entry = self._data.get(name)
+        if not entry or not entry['attempts']:
+            return None
+        return entry['successes'] / entry['attempts']
+
+    def expected_time(self, name: str, sample: bool = True) -> Optional[float]:
+        """Ожидаемое время до успеха; None — данных пока недостаточно"""
+        entry = self._data.get(name)
+        if not entry or entry['attempts'] < self.min_samples:
+            return None
+        alpha = 1 + entry['successes']
+        beta = 1 + max(0.0, entry['attempts'] - entry['successes'])
+        p = self.rng.betavariate(alpha, beta) if sample else alpha / (alpha + beta)
+        return max(entry['avg_time'], 0.1) / max(p, 1e-6)
+
+    def order(self, specs: List) -> List:
+        """Переставляет провайдеров по ожидаемому времени до успеха.
+
+        Провайдеры без достаточной статистики остаются на своих местах, а
+        места провайдеров со статистикой заполняются ими же, от лучшего к худшему.
+        Возвращает копии ProviderSpec с новым order (исходный order не меняется).
+        """
+        specs = sorted(specs, key=lambda spec: spec.order)
+        scores = {spec.name: self.expected_time(spec.name) for spec in specs}
+        known = sorted((spec for spec in specs if scores[spec.name] is not None), key=lambda spec: scores[spec.name])
+        known_iter = iter(known)
+        ordered = [next(known_iter) if scores[spec.name] is not None else spec for spec in specs]
+        return [spec.copy(order=(index + 1) * 10) for index, spec in enumerate(ordered)]
+
+    def summary(self, limit: int = 10) -> List[str]:
+        """Короткая сводка лучших провайдеров для логов и админки"""
+        rows = []
+        for name, entry in self._data.items():
+            rate = self.success_rate(name) or 0.0
+            rows.append((rate, name, entry))
+        rows.sort(key=lambda row: row[0], reverse=True)
+        return [
+            f"{name}: {rate:.0%} success, ~{entry['avg_time']:.1f}s"
+            for rate, name, entry in rows[:limit]
+        ]
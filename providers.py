@@ -0,0 +1,712 @@
+"""
+Реестр провайдеров поиска/скачивания музыки.
+
+Каждый провайдер описан декларативно (ProviderSpec): имя, порядок, тир,
+таймаут и флаг включения. Все провайдеры имеют общий интерфейс —
+корутину run(ctx), возвращающую путь к файлу, None или pipeline.NO_RESULTS
+(поиск прошел, трека нет — такой исход попадает в кэш промахов). Ошибки
+сайта и сети не прячутся за пустым ответом, а пробрасываются. Запускает
+провайдеров pipeline.run_pipeline (по очереди или гонкой внутри тира).
+
+Провайдеры тиров 6-8 (скраперы, каталоги, перебор вариантов) в прежней
+цепочке не вызывались никогда и зарегистрированы выключенными: их можно
+включить через PROVIDERS_CONFIG, например {"RedMp3": {"enabled": true}}.
+
+Порядок, тир, таймаут и включение можно переопределить без правки кода:
+    PROVIDERS_CONFIG   - путь к JSON-файлу вида
+                         {"PleerNet": {"enabled": false}, "Deezer": {"tier": 3, "timeout": 60}}
+    PROVIDERS_DISABLED - имена через запятую (например "Tidal,Pandora")
+"""
+
+import asyncio
+import json
+import logging
+import os
+import random
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Union
+from urllib.parse import quote
+
+import aiohttp
+
+from executors import run_io
+from pipeline import NO_RESULTS
+from utils import (
+    ydl_extract_info, budget_timeout, throttled_session, ImprovedSearchEngine, TTLCache,
+    extract_candidates_info, flat_search_candidates, find_downloaded_file, CANDIDATE_INFO_ENOUGH,
+    JioSaavnProvider, SoundCloudProvider, EnhancedSoundCloudProvider, YTMusicProvider,
+    AlternativeMusicProvider, BandcampProvider, ArchiveOrgProvider, FreeMusicArchiveProvider,
+    JamendoProvider, MixcloudProvider, AlternativeYouTubeProvider, VKMusicProvider,
+    YandexMusicProvider, DeezerProvider, AudiomackProvider, MusopenProvider, PleerNetProvider,
+    MP3JuicesProvider, ZaycevProvider, MyzukaProvider, RuTrackProvider, RedMp3Provider,
+    Mp3SkullsProvider, Music7sProvider, Mp3DownloadProvider, Beemp3sProvider, VkMusicFunProvider,
+)
+from streaming import STREAM_PIPELINE, stream_ydl_download
+from ydl_presets import YOUTUBE_USER_AGENTS, YdlOpts, ydl_preset, with_user_agent
+
+logger = logging.getLogger(__name__)
+
+# Таймауты по умолчанию (секунды): прямые MP3-скраперы, провайдеры через yt-dlp, циклы по вариантам
+SCRAPER_TIMEOUT = 60
+YTDLP_TIMEOUT = 120
+LOOP_TIMEOUT = 240
+
+BROWSER_UA = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+
+
+class ProviderContext:
+    """Данные одного запроса, общие для всех провайдеров"""
+
+    def __init__(self, query: str, track_info: Optional[dict] = None):
+        self.query = query
+        self.track_info = track_info
+        # Единый ранжированный список вариантов для всех провайдеров
+        self.variants = ImprovedSearchEngine.build_query_variants(query, track_info)
+        # Результаты, общие для провайдеров в пределах запроса (см. memoize)
+        self.memo: Dict[Hashable, Any] = {}
+        self._memo_locks: Dict[Hashable, asyncio.Lock] = {}
+        # Кандидат, который скачался в двухфазном режиме (для storage.py)
+        self.selected: Optional[Dict] = None
+
+    @property
+    def search_query(self) -> str:
+        """Лучший вариант запроса — для провайдеров, которые ищут один раз"""
+        return self.variants[0] if self.variants else self.query
+
+    @property
+    def track_key(self) -> str:
+        """Ключ трека для кэшей между запросами: Spotify ID или нормализованный запрос"""
+        if self.track_info and self.track_info.get('id'):
+            return f"spotify:{self.track_info['id']}"
+        return ImprovedSearchEngine.normalize_query(self.query).casefold()
+
+    async def memoize(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """Выполняет factory один раз на ключ за запрос; параллельные вызовы ждут первый.
+
+        Исключение запоминается как None (и пробрасывается первому вызову);
+        отмена ничего не запоминает — следующий вызов попробует снова.
+        """
+        lock = self._memo_locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            if key in self.memo:
+                return self.memo[key]
+            try:
+                result = await factory()
+            except Exception:
+                self.memo[key] = None
+                raise
+            self.memo[key] = result
+            return result
+
+
+ProviderRun = Callable[[ProviderContext], Awaitable[Optional[str]]]
+
+# Двухфазный режим: search возвращает легкие кандидаты без скачивания
+# ({'url', 'title', 'artist', 'duration', 'view_count', ...}), fetch скачивает выбранного
+ProviderSearch = Callable[[ProviderContext], Awaitable[List[Dict]]]
+ProviderFetch = Callable[[ProviderContext, Dict], Awaitable[Optional[str]]]
+
+
+class ProviderSpec:
+    """Описание провайдера в реестре"""
+
+    def __init__(self, name: str, run: ProviderRun, order: int, tier: int,
+                 timeout: Optional[float] = None, enabled: bool = True,
+                 search: Optional[ProviderSearch] = None, fetch: Optional[ProviderFetch] = None):
+        self.name = name
+        self.run = run
+        self.order = order
+        self.tier = tier
+        self.timeout = timeout
+        self.enabled = enabled
+        self.search = search
+        self.fetch = fetch
+
+    @property
+    def two_phase(self) -> bool:
+        """Провайдер умеет отдельно искать кандидатов и скачивать выбранного"""
+        return self.search is not None and self.fetch is not None
+
+    def copy(self, **overrides) -> 'ProviderSpec':
+        fields = dict(name=self.name, run=self.run, order=self.order, tier=self.tier,
+                      timeout=self.timeout, enabled=self.enabled, search=self.search, fetch=self.fetch)
+        fields.update(overrides)
+        return ProviderSpec(**fields)
+
+    def __repr__(self):
+        return (f"ProviderSpec({self.name!r}, order={self.order}, tier={self.tier}, "
+                f"timeout={self.timeout}, enabled={self.enabled})")
+
+
+# Реестр в порядке регистрации (он же порядок последовательного прохода)
+REGISTRY: List[ProviderSpec] = []
+
+
+def register(name: str, run: ProviderRun, tier: int, timeout: Optional[float] = None, enabled: bool = True,
+             search: Optional[ProviderSearch] = None, fetch: Optional[ProviderFetch] = None) -> ProviderSpec:
+    """Добавляет провайдера в реестр; порядок — по очереди регистрации"""
+    spec = ProviderSpec(name, run, order=(len(REGISTRY) + 1) * 10, tier=tier, timeout=timeout, enabled=enabled,
+                        search=search, fetch=fetch)
+    REGISTRY.append(spec)
+    return spec
+
+
+def provider(name: str, tier: int, timeout: Optional[float] = None, enabled: bool = True,
+             search: Optional[ProviderSearch] = None, fetch: Optional[ProviderFetch] = None):
+    """Декоратор для регистрации корутины-провайдера"""
+    def decorator(func: ProviderRun) -> ProviderRun:
+        register(name, func, tier=tier, timeout=timeout, enabled=enabled, search=search, fetch=fetch)
+        return func
+    return decorator
+
+
+def load_provider_config() -> Dict[str, Dict]:
+    """Читает переопределения из PROVIDERS_CONFIG (JSON) и PROVIDERS_DISABLED"""
+    config: Dict[str, Dict] = {}
+    path = os.getenv('PROVIDERS_CONFIG')
+    if path:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if isinstance(data, dict):
+                config.update({name: dict(value) for name, value in data.items() if isinstance(value, dict)})
+            else:
+                logger.warning(f"Providers config {path} must be a JSON object")
+        except (OSError, ValueError) as e:
+            logger.error(f"Could not load providers config {path}: {e}")
+    for name in os.getenv('PROVIDERS_DISABLED', '').split(','):
+        name = name.strip()
+        if name:
+            config.setdefault(name, {})['enabled'] = False
+    return config
+
+
+def configured_providers(config: Optional[Dict[str, Dict]] = None) -> List[ProviderSpec]:
+    """Возвращает включенных провайдеров с примененными переопределениями, отсортированных по order.
+
+    Имена в конфиге сравниваются без учета регистра; неизвестные имена пропускаются с предупреждением.
+    """
+    if config is None:
+        config = load_provider_config()
+    by_lower = {spec.name.lower(): spec for spec in REGISTRY}
+    overrides: Dict[str, Dict] = {}
+    for raw_name, values in config.items():
+        spec = by_lower.get(raw_name.strip().lower())
+        if spec is None:
+            logger.warning(f"Unknown provider in config: '{raw_name}'")
+            continue
+        allowed = {key: values[key] for key in ('order', 'tier', 'timeout', 'enabled') if key in values}
+        overrides.setdefault(spec.name, {}).update(allowed)
+
+    specs = [spec.copy(**overrides.get(spec.name, {})) for spec in REGISTRY]
+    return sorted((spec for spec in specs if spec.enabled), key=lambda spec: spec.order)
+
+
+# ---------------------------------------------------------------------------
+# Общие помощники для yt-dlp
+# ---------------------------------------------------------------------------
+
+async def ydl_download(opts: YdlOpts, url: str) -> Optional[str]:
+    """Скачивает url через yt-dlp и возвращает путь к файлу.
+
+    При STREAM_PIPELINE байты идут сразу в ffmpeg (streaming.py); если формат
+    для этого не подходит или потоковая загрузка не удалась — обычная загрузка.
+    """
+    if STREAM_PIPELINE:
+        try:
+            path = await stream_ydl_download(opts, url)
+            if path:
+                return path
+        except Exception as e:
+            logger.warning(f"Streaming download failed, falling back to yt-dlp ({url}): {e}")
+    return find_downloaded_file(await ydl_extract_info(opts, url, download=True))
+
+
+def _first_entry(result: Optional[Dict]) -> Optional[Dict]:
+    entries = [e for e in ((result or {}).get('entries') or []) if e]
+    return entries[0] if entries else None
+
+
+async def download_first_hit(search: str, opts: YdlOpts = 'download-mp3') -> Optional[str]:
+    """Ищет через yt-dlp (например "ytsearch1:...") и скачивает первый результат"""
+    entry = _first_entry(await ydl_extract_info(opts, search, download=False))
+    if not entry:
+        return None
+    url = entry.get('webpage_url') or entry.get('url')
+    if not url:
+        return None
+    return await ydl_download(opts, url)
+
+
+def ydl_fetch(opts: Union[YdlOpts, Callable[[], Dict]]) -> ProviderFetch:
+    """fetch для двухфазного режима: скачивает candidate['url'] через yt-dlp
+    (opts — пресет, словарь или функция, собирающая опции на каждый вызов)"""
+    async def fetch(ctx: ProviderContext, candidate: Dict) -> Optional[str]:
+        call_opts = opts() if callable(opts) else opts
+        return await ydl_download(call_opts, candidate['url'])
+    return fetch
+
+
+async def search_until_confident(ctx: ProviderContext,
+                                 search_variant: Callable[[str], Awaitable[List[Dict]]]) -> List[Dict]:
+    """Перебирает ctx.variants, пока не найдется уверенное совпадение.
+
+    Кандидаты всех просмотренных вариантов накапливаются; следующий вариант
+    пробуется, только если среди найденного нет уверенного совпадения.
+    Если все варианты искались без ошибок и ничего не дали — NO_RESULTS;
+    если упали все — пробрасывается последняя ошибка.
+    """
+    candidates: List[Dict] = []
+    failed = 0
+    last_error: Optional[Exception] = None
+    for variant in ctx.variants:
+        try:
+            batch = await search_variant(variant) or []
+        except Exception as e:
+            logger.warning(f"Search failed for '{variant}': {e}")
+            failed += 1
+            last_error = e
+            continue
+        candidates += batch
+        if any(ImprovedSearchEngine.is_confident_match(c, ctx.track_info) for c in batch):
+            break
+    if candidates or not ctx.variants:
+        return candidates
+    if failed == len(ctx.variants):
+        raise last_error
+    return [] if failed else NO_RESULTS
+
+
+# ---------------------------------------------------------------------------
+# Тир 1-2: JioSaavn и SoundCloud
+# ---------------------------------------------------------------------------
+
+async def _jiosaavn_search(ctx: ProviderContext) -> List[Dict]:
+    async with JioSaavnProvider() as saavn:
+        return await search_until_confident(ctx, lambda variant: saavn.search(variant, limit=5))
+
+
+async def _jiosaavn_fetch(ctx: ProviderContext, candidate: Dict) -> Optional[str]:
+    async with JioSaavnProvider() as saavn:
+        return await saavn.download_song(candidate)
+
+
+@provider("JioSaavn", tier=1, timeout=SCRAPER_TIMEOUT, search=_jiosaavn_search, fetch=_jiosaavn_fetch)
+async def _jiosaavn(ctx: ProviderContext) -> Optional[str]:
+    async with JioSaavnProvider() as saavn:
+        return await saavn.download_best(ctx.search_query, ctx.track_info)
+
+
+async def _soundcloud_search(ctx: ProviderContext) -> List[Dict]:
+    async def search_variant(variant: str) -> List[Dict]:
+        async with EnhancedSoundCloudProvider() as sc:
+            return await sc.search_candidates(variant, limit=10)
+
+    return await search_until_confident(ctx, search_variant)
+
+
+# Свой тир (исторически: _download_candidate очищал downloads/, теперь у задания своя папка).
+# В двухфазном режиме скачивание идет через общий ydl_fetch.
+@provider("Enhanced SoundCloud", tier=2, timeout=LOOP_TIMEOUT,
+          search=_soundcloud_search, fetch=ydl_fetch('download-mp3-fixed'))
+async def _enhanced_soundcloud(ctx: ProviderContext) -> Optional[str]:
+    for variant in ctx.variants:
+        try:
+            logger.info(f"Enhanced SoundCloud variant: '{variant}'")
+            async with EnhancedSoundCloudProvider() as sc:
+                path = await sc.search_and_download_best(variant, ctx.track_info)
+            if path and os.path.exists(path):
+                return path
+            logger.warning(f"Enhanced SoundCloud returned no file for '{variant}'")
+        except Exception as e:
+            logger.error(f"Enhanced SoundCloud error: {e}")
+    return None
+
+
+@provider("SoundCloud Fallback", tier=3, timeout=LOOP_TIMEOUT)
+async def _soundcloud_fallback(ctx: ProviderContext) -> Optional[str]:
+    download_opts = 'download-mp3-fixed'
+    for variant in ctx.variants:
+        try:
+            async with SoundCloudProvider() as sc:
+                sc_urls = await sc.search_urls(variant, limit=5)
+            logger.info(f"SoundCloud candidates for '{variant}': {len(sc_urls)}")
+
+            # Сначала анализируем кандидатов для фильтрации (параллельно)
+            candidate_info = [{
+                'url': url,
+                'title': info.get('title', ''),
+                'duration': info.get('duration', 0),
+                'view_count': info.get('view_count', 0)
+            } for url, info in await extract_candidates_info(sc_urls, enough=CANDIDATE_INFO_ENOUGH)]
+            if not candidate_info:
+                continue
+
+            filtered = ImprovedSearchEngine.filter_original_versions(candidate_info, ctx.track_info)
+            if not filtered:
+                logger.info("SoundCloud Fallback: No good candidates after filtering")
+                # Якщо немає хороших кандидатів, пробуємо перший без фільтрації
+                filtered = candidate_info[:1]
+
+            best = filtered[0]
+            logger.info(f"SoundCloud Fallback: Best candidate '{best['title']}' {best['url']}")
+            path = await ydl_download(download_opts, best['url'])
+            if path:
+                return path
+        except Exception as e:
+            logger.error(f"SoundCloud Fallback error for '{variant}': {e}")
+    return None
+
+
+# ---------------------------------------------------------------------------
+# Тир 3-4, 6: провайдеры из utils с интерфейсом search_and_download(query)
+# ---------------------------------------------------------------------------
+
+def _chain(provider_cls) -> ProviderRun:
+    async def run(ctx: ProviderContext) -> Optional[str]:
+        async with provider_cls() as p:
+            return await p.search_and_download(ctx.search_query)
+    return run
+
+
+# Тир 3 — прямые MP3-скраперы, тир 4 — страница + yt-dlp
+for _name, _cls, _tier, _timeout in [
+    ("AlternativeMusic", AlternativeMusicProvider, 4, YTDLP_TIMEOUT),
+    ("PleerNet", PleerNetProvider, 3, SCRAPER_TIMEOUT),
+    ("MP3Juices", MP3JuicesProvider, 3, SCRAPER_TIMEOUT),
+    ("Zaycev.net", ZaycevProvider, 3, SCRAPER_TIMEOUT),
+    ("Myzuka.fm", MyzukaProvider, 3, SCRAPER_TIMEOUT),
+    ("RuTracker", RuTrackProvider, 4, SCRAPER_TIMEOUT),
+]:
+    register(_name, _chain(_cls), tier=_tier, timeout=_timeout)
+
+
+async def _bandcamp_search(ctx: ProviderContext) -> List[Dict]:
+    async with BandcampProvider() as bandcamp:
+        return await search_until_confident(ctx, bandcamp.search_candidates)
+
+
+# Bandcamp отдает кандидатов с названием и артистом: ранжируются, как у остальных провайдеров с поиском
+@provider("Bandcamp", tier=4, timeout=YTDLP_TIMEOUT, search=_bandcamp_search, fetch=ydl_fetch('bandcamp'))
+async def _bandcamp(ctx: ProviderContext) -> Optional[str]:
+    async with BandcampProvider() as bandcamp:
+        return await bandcamp.search_and_download(ctx.search_query, ctx.track_info)
+
+
+for _name, _cls, _tier, _timeout in [
+    ("Archive.org", ArchiveOrgProvider, 3, SCRAPER_TIMEOUT),
+    ("Free Music Archive", FreeMusicArchiveProvider, 3, SCRAPER_TIMEOUT),
+    ("Jamendo", JamendoProvider, 3, SCRAPER_TIMEOUT),
+    ("Mixcloud", MixcloudProvider, 4, YTDLP_TIMEOUT),
+    ("VK Music", VKMusicProvider, 4, YTDLP_TIMEOUT),
+    ("Yandex Music", YandexMusicProvider, 4, YTDLP_TIMEOUT),
+    ("Deezer", DeezerProvider, 4, YTDLP_TIMEOUT),
+    ("Audiomack", AudiomackProvider, 4, YTDLP_TIMEOUT),
+    ("Musopen", MusopenProvider, 3, SCRAPER_TIMEOUT),
+    ("AlternativeYouTube", AlternativeYouTubeProvider, 5, YTDLP_TIMEOUT),
+]:
+    register(_name, _chain(_cls), tier=_tier, timeout=_timeout)
+
+
+# ---------------------------------------------------------------------------
+# Тир 5: YouTube Music и YouTube
+# ---------------------------------------------------------------------------
+
+async def _youtube_music_search(ctx: ProviderContext) -> List[Dict]:
+    ytm = await run_io(YTMusicProvider)
+    candidates = await search_until_confident(ctx, lambda variant: run_io(ytm.search, variant, 7))
+    if not candidates:
+        return candidates
+    return list({c['url']: c for c in candidates}.values())
+
+
+@provider("YouTube Music", tier=5, timeout=YTDLP_TIMEOUT, search=_youtube_music_search, fetch=ydl_fetch('download-mp3'))
+async def _youtube_music(ctx: ProviderContext) -> Optional[str]:
+    candidates = await _youtube_music_search(ctx)
+    if candidates is NO_RESULTS:
+        return NO_RESULTS
+    track_info = ctx.track_info
+    # сортируем по близости длительности, если известна
+    target_dur = track_info.get('duration') if track_info else None
+    if target_dur:
+        candidates.sort(key=lambda c: abs((c.get('duration') or 0) - target_dur))
+
+    opts = 'download-mp3'
+    for cand in candidates[:5]:
+        url = cand.get('url')
+        if not url:
+            continue
+        try:
+            path = await ydl_download(opts, url)
+            if path:
+                return path
+        except Exception as e:
+            logger.warning(f"YouTube Music candidate failed {url}: {e}")
+    return None
+
+
+def _youtube_search_opts() -> Dict:
+    """Настройки yt-dlp с максимальным обходом блокировок YouTube (пресет youtube с ротацией User-Agent)"""
+    return with_user_agent(ydl_preset('youtube'), random.choice(YOUTUBE_USER_AGENTS))
+
+
+async def _youtube_best_by_duration(ctx: ProviderContext) -> Optional[str]:
+    """Ищет до 5 видео и скачивает наиболее близкое по длительности"""
+    opts = _youtube_search_opts()
+    search_results = await ydl_extract_info(opts, f"ytsearch5:{ctx.search_query}", download=False)
+    entries = [e for e in ((search_results or {}).get('entries') or []) if e]
+    if not entries:
+        logger.info("YouTube returned no entries")
+        return None
+
+    # Подбор по длительности (если известна)
+    target_duration = None
+    if ctx.track_info and isinstance(ctx.track_info.get('duration'), int) and ctx.track_info['duration'] > 0:
+        target_duration = ctx.track_info['duration']
+
+    def duration_score(e):
+        if target_duration is None:
+            return 0
+        return abs((e.get('duration') or 0) - target_duration)
+
+    # Сортируем: сначала по длительности, затем по просмотрам (если есть)
+    entries.sort(key=lambda e: (duration_score(e), -(e.get('view_count') or 0)))
+    video_url = entries[0].get('webpage_url') or entries[0].get('url')
+    if not video_url:
+        logger.info("Best YouTube entry has no URL")
+        return None
+    logger.info(f"YouTube downloading: {video_url}")
+    return await ydl_download(opts, video_url)
+
+
+async def _youtube_search(ctx: ProviderContext) -> List[Dict]:
+    # Плоский поиск: название, длительность и просмотры без разбора каждого видео
+    opts = _youtube_search_opts()
+
+    async def search_variant(variant: str) -> List[Dict]:
+        return await flat_search_candidates(opts, f"ytsearch5:{variant}")
+
+    return await search_until_confident(ctx, search_variant)
+
+
+@provider("YouTube", tier=5, timeout=LOOP_TIMEOUT, search=_youtube_search, fetch=ydl_fetch(_youtube_search_opts))
+async def _youtube(ctx: ProviderContext) -> Optional[str]:
+    try:
+        path = await _youtube_best_by_duration(ctx)
+        if path:
+            return path
+    except Exception as e:
+        logger.error(f"YouTube search failed: {e}")
+
+    # Альтернативный подход с более простыми настройками
+    try:
+        logger.info("YouTube fallback")
+        simple_opts = 'download-mp3-fixed'
+        path = await download_first_hit(f"ytsearch3:{ctx.search_query}", simple_opts)
+        if path:
+            return path
+    except Exception as e:
+        logger.error(f"YouTube fallback also failed: {e}")
+
+    # Последняя попытка - максимально простые настройки (без конвертации)
+    try:
+        logger.info("YouTube ultra-simple")
+        ultra_simple_opts = 'download-passthrough'
+        result = await ydl_extract_info(ultra_simple_opts, f"ytsearch1:{ctx.search_query}", download=True)
+        # Путь приходит в info верхнего уровня (post hook), а не в записи результата поиска
+        return find_downloaded_file(result)
+    except Exception as e:
+        logger.error(f"YouTube ultra-simple also failed: {e}")
+    return None
+
+
+# ---------------------------------------------------------------------------
+# Тир 6: скраперы прямых MP3, которые раньше не вызывались (выключены по умолчанию)
+# ---------------------------------------------------------------------------
+
+for _name, _cls in [
+    ("RedMp3", RedMp3Provider),
+    ("Mp3Skulls", Mp3SkullsProvider),
+    ("Music7s", Music7sProvider),
+    ("Mp3Download.to", Mp3DownloadProvider),
+    ("Beemp3s.net", Beemp3sProvider),
+    ("VkMusic.fun", VkMusicFunProvider),
+]:
+    register(_name, _chain(_cls), tier=6, timeout=SCRAPER_TIMEOUT, enabled=False)
+
+
+# ---------------------------------------------------------------------------
+# Тир 7: музыкальные каталоги -> уточненный запрос -> YouTube (выключены по умолчанию)
+# ---------------------------------------------------------------------------
+
+# Лимит на запрос к каталогу (урезается до оставшегося бюджета запроса)
+METADATA_TIMEOUT = 15
+
+# Каталоги почти всегда возвращают одну и ту же строку "артист название".
+# Результат поиска YouTube по ней кэшируется между запросами на YOUTUBE_LOOKUP_TTL
+# секунд, а скачивание — в пределах запроса (ProviderContext.memoize)
+YOUTUBE_LOOKUP_TTL = float(os.getenv('YOUTUBE_LOOKUP_TTL', '600'))
+YOUTUBE_LOOKUP_CACHE = TTLCache(YOUTUBE_LOOKUP_TTL)
+
+
+async def youtube_lookup(query: str) -> Optional[str]:
+    """URL первого видео YouTube по запросу (с кэшем на YOUTUBE_LOOKUP_TTL)"""
+    key = ImprovedSearchEngine.normalize_query(query).casefold()
+    url = YOUTUBE_LOOKUP_CACHE.get(key)
+    if url is not TTLCache.MISSING:
+        logger.info(f"YouTube lookup cache hit: '{query}'")
+        return url
+    result = await ydl_extract_info('download-mp3', f"ytsearch1:{query}", download=False)
+    if result is None:
+        # Отмена или исчерпанный бюджет — это не ответ поиска, не кэшируем
+        return None
+    entry = _first_entry(result)
+    url = (entry.get('webpage_url') or entry.get('url')) if entry else None
+    YOUTUBE_LOOKUP_CACHE.set(key, url)
+    return url
+
+
+async def _download_youtube_query(query: str) -> Optional[str]:
+    url = await youtube_lookup(query)
+    if not url:
+        return None
+    return await ydl_download('download-mp3', url)
+
+
+def _metadata_provider(lookup: Callable[[aiohttp.ClientSession, str], Awaitable[Optional[str]]]) -> ProviderRun:
+    """Каталог возвращает запрос "артист название", по которому скачиваем первое видео YouTube"""
+    async def run(ctx: ProviderContext) -> Optional[str]:
+        async with throttled_session(timeout=budget_timeout(METADATA_TIMEOUT)) as session:
+            youtube_query = await lookup(session, ctx.search_query)
+        if not youtube_query or not youtube_query.strip():
+            return NO_RESULTS
+        key = ('youtube', ImprovedSearchEngine.normalize_query(youtube_query).casefold())
+        path = await ctx.memoize(key, lambda: _download_youtube_query(youtube_query))
+        return path if path and os.path.exists(path) else None
+    return run
+
+
+async def _get_json(session: aiohttp.ClientSession, url: str, headers: Optional[Dict] = None) -> Optional[Dict]:
+    """JSON ответа каталога; ошибка HTTP — исключение, а не пустой ответ"""
+    async with session.get(url, headers=headers) as response:
+        response.raise_for_status()
+        return await response.json(content_type=None)
+
+
+async def _lastfm_lookup(session: aiohttp.ClientSession, query: str) -> Optional[str]:
+    api_key = os.getenv('LASTFM_API_KEY', 'demo')
+    url = f"http://ws.audioscrobbler.com/2.0/?method=track.search&track={quote(query)}&api_key={api_key}&format=json"
+    data = await _get_json(session, url)
+    tracks = ((data or {}).get('results') or {}).get('trackmatches', {}).get('track', [])
+    if not tracks:
+        return None
+    return f"{tracks[0].get('artist', '')} {tracks[0].get('name', '')}"
+
+
+async def _genius_lookup(session: aiohttp.ClientSession, query: str) -> Optional[str]:
+    headers = {'Authorization': f"Bearer {os.getenv('GENIUS_ACCESS_TOKEN', 'demo')}"}
+    data = await _get_json(session, f"https://api.genius.com/search?q={quote(query)}", headers)
+    hits = ((data or {}).get('response') or {}).get('hits', [])
+    if not hits:
+        return None
+    result = hits[0].get('result', {})
+    return f"{result.get('primary_artist', {}).get('name', '')} {result.get('title', '')}"
+
+
+async def _musicbrainz_lookup(session: aiohttp.ClientSession, query: str) -> Optional[str]:
+    headers = {'User-Agent': 'SpotifyBot/1.0 (https://example.com)'}
+    data = await _get_json(session, f"https://musicbrainz.org/ws/2/recording?query={quote(query)}&fmt=json", headers)
+    recordings = (data or {}).get('recordings', [])
+    if not recordings:
+        return None
+    recording = recordings[0]
+    artist = (recording.get('artist-credit') or [{}])[0].get('name', '')
+    return f"{artist} {recording.get('title', '')}"
+
+
+async def _discogs_lookup(session: aiohttp.ClientSession, query: str) -> Optional[str]:
+    headers = {'Authorization': f"Discogs token={os.getenv('DISCOGS_TOKEN', 'demo')}"}
+    data = await _get_json(session, f"https://api.discogs.com/database/search?q={quote(query)}&type=release", headers)
+    results = (data or {}).get('results', [])
+    if not results:
+        return None
+    # Discogs отдает название релиза в виде "Артист - Название"
+    title = results[0].get('title', '')
+    return title.replace(' - ', ' ')
+
+
+async def _spotify_web_lookup(session: aiohttp.ClientSession, query: str) -> Optional[str]:
+    headers = {'Accept': 'application/json'}
+    data = await _get_json(session, f"https://api.spotify.com/v1/search?q={quote(query)}&type=track&limit=1", headers)
+    items = ((data or {}).get('tracks') or {}).get('items') or []
+    if not items:
+        return None
+    track = items[0]
+    return f"{(track.get('artists') or [{}])[0].get('name', '')} {track.get('name', '')}"
+
+
+async def _apple_music_lookup(session: aiohttp.ClientSession, query: str) -> Optional[str]:
+    data = await _get_json(session, f"https://itunes.apple.com/search?term={quote(query)}&media=music&limit=1")
+    results = (data or {}).get('results') or []
+    if not results:
+        return None
+    return f"{results[0].get('artistName', '')} {results[0].get('trackName', '')}"
+
+
+async def _tidal_lookup(session: aiohttp.ClientSession, query: str) -> Optional[str]:
+    headers = {'User-Agent': BROWSER_UA}
+    data = await _get_json(session, f"https://api.tidal.com/v1/search?query={quote(query)}&limit=1&types=TRACKS", headers)
+    tracks = (data or {}).get('tracks') or []
+    if not tracks:
+        return None
+    return f"{tracks[0].get('artist', {}).get('name', '')} {tracks[0].get('title', '')}"
+
+
+for _name, _lookup in [
+    ("Last.fm", _lastfm_lookup),
+    ("Genius", _genius_lookup),
+    ("MusicBrainz", _musicbrainz_lookup),
+    ("Discogs", _discogs_lookup),
+    ("Spotify Web", _spotify_web_lookup),
+    ("Apple Music", _apple_music_lookup),
+    ("Tidal", _tidal_lookup),
+]:
+    register(_name, _metadata_provider(_lookup), tier=7, timeout=YTDLP_TIMEOUT, enabled=False)
+
+
+# ---------------------------------------------------------------------------
+# Тир 8: перебор вариантов запроса на площадках с поиском в yt-dlp (выключены по умолчанию)
+# ---------------------------------------------------------------------------
+
+# Сколько лучших кандидатов пробуем скачать, если первый не скачался
+VARIANT_FETCH_ATTEMPTS = 3
+
+
+def _variants_provider(name: str, search_prefix: str, opts: YdlOpts = 'download-mp3') -> ProviderRun:
+    """Плоский поиск по ctx.variants до уверенного совпадения, затем скачивание лучшего кандидата"""
+    async def run(ctx: ProviderContext) -> Optional[str]:
+        async def search_variant(variant: str) -> List[Dict]:
+            return await flat_search_candidates(opts, f"{search_prefix}3:{variant}")
+
+        candidates = await search_until_confident(ctx, search_variant)
+        if candidates is NO_RESULTS:
+            return NO_RESULTS
+        ranked = ImprovedSearchEngine.filter_original_versions(candidates, ctx.track_info)
+        for candidate in list({c['url']: c for c in ranked}.values())[:VARIANT_FETCH_ATTEMPTS]:
+            try:
+                path = await ydl_download(opts, candidate['url'])
+                if path:
+                    return path
+            except Exception as e:
+                logger.warning(f"{name} download failed for {candidate['url']}: {e}")
+        return None
+    return run
+
+
+for _name, _prefix, _opts in [
+    ("YouTube Variants", "ytsearch", 'youtube-variants'),
+    ("SoundCloud Variants", "scsearch", 'download-mp3'),
+    ("Bandcamp Variants", "bandcampsearch", 'download-mp3'),
+    ("Mixcloud Variants", "mixcloudsearch", 'download-mp3'),
+    ("Archive.org Variants", "archiveorgsearch", 'download-mp3'),
+]:
+    register(_name, _variants_provider(_name, _prefix, _opts), tier=8, timeout=LOOP_TIMEOUT, enabled=False)
@@ -0,0 +1,162 @@
+"""
+Ограничение частоты запросов по хостам.
+
+Вместо пауз asyncio.sleep между провайдерами каждый запрос к сайту берет
+слот у лимитера своего хоста (asyncio-throttle, скользящее окно). Запросы
+к разным сайтам идут без искусственных пауз, а к одному сайту — не чаще
+заданного лимита.
+
+Лимиты задаются по домену и действуют на все его поддомены
+(правило "youtube.com" покрывает music.youtube.com). Переопределение:
+    RATE_LIMITS        - "youtube.com=2/1,musicbrainz.org=1/1" (запросов / секунд)
+    RATE_LIMIT_DEFAULT - лимит для остальных хостов, например "5/1"
+
+Окна по ключам (например, "telegram:{chat_id}") создаются на лету; окна без
+запросов за последний период состояния не хранят и удаляются, когда их
+становится больше RATE_LIMIT_MAX_WINDOWS.
+"""
+
+import logging
+import os
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import aiohttp
+from asyncio_throttle import Throttler
+
+logger = logging.getLogger(__name__)
+
+# (запросов, период в секундах)
+RateLimit = Tuple[int, float]
+
+DEFAULT_RATE_LIMIT: RateLimit = (5, 1.0)
+
+# Сколько окон держать, прежде чем выбрасывать простаивающие
+MAX_WINDOWS = int(os.getenv('RATE_LIMIT_MAX_WINDOWS', '256'))
+
+# Сайты, которые банят за частые запросы или публикуют свои лимиты
+DEFAULT_RATE_LIMITS: Dict[str, RateLimit] = {
+    'youtube.com': (3, 1.0),
+    'soundcloud.com': (3, 1.0),
+    'bandcamp.com': (2, 1.0),
+    'mixcloud.com': (2, 1.0),
+    'archive.org': (2, 1.0),
+    'musicbrainz.org': (1, 1.0),   # официальное правило MusicBrainz API
+    'discogs.com': (1, 1.0),
+    'audioscrobbler.com': (4, 1.0),
+    'vk.com': (2, 1.0),
+    'api.telegram.org': (1, 1.0),  # сообщения в один чат
+}
+
+# Поисковые префиксы yt-dlp ("ytsearch5:...") -> хост, к которому уйдет запрос
+SEARCH_PREFIX_HOSTS = {
+    'ytsearch': 'youtube.com',
+    'scsearch': 'soundcloud.com',
+    'bandcampsearch': 'bandcamp.com',
+    'mixcloudsearch': 'mixcloud.com',
+    'archiveorgsearch': 'archive.org',
+}
+
+
+def parse_rate(value: str) -> RateLimit:
+    """Разбирает лимит: "3/1" -> (3, 1.0), "3" -> (3, 1.0)"""
+    count, _, period = value.strip().partition('/')
+    rate = (int(count), float(period or 1))
+    if rate[0] <= 0 or rate[1] <= 0:
+        raise ValueError(f"rate must be positive: {value!r}")
+    return rate
+
+
+def load_rate_limits() -> Tuple[Dict[str, RateLimit], RateLimit]:
+    """Лимиты по умолчанию с переопределениями из RATE_LIMITS и RATE_LIMIT_DEFAULT"""
+    limits = dict(DEFAULT_RATE_LIMITS)
+    default = DEFAULT_RATE_LIMIT
+    for item in os.getenv('RATE_LIMITS', '').split(','):
+        host, _, rate = item.partition('=')
+        if not host.strip():
+            continue
+        try:
+            limits[host.strip().lower()] = parse_rate(rate)
+        except ValueError as e:
+            logger.warning(f"Invalid rate limit '{item}': {e}")
+    if os.getenv('RATE_LIMIT_DEFAULT'):
+        try:
+            default = parse_rate(os.getenv('RATE_LIMIT_DEFAULT'))
+        except ValueError as e:
+            logger.warning(f"Invalid RATE_LIMIT_DEFAULT: {e}")
+    return limits, default
+
+
+def host_of(target: str) -> Optional[str]:
+    """Хост URL или поискового запроса yt-dlp; None — определить не удалось"""
+    prefix, sep, _ = target.partition(':')
+    if sep:
+        prefix = prefix.rstrip('0123456789').lower()
+        if prefix in SEARCH_PREFIX_HOSTS:
+            return SEARCH_PREFIX_HOSTS[prefix]
+    host = urlsplit(target).hostname
+    return host.lower() if host else None
+
+
+class HostRateLimiter:
+    """Набор скользящих окон по хостам"""
+
+    def __init__(self, limits: Optional[Dict[str, RateLimit]] = None, default: RateLimit = DEFAULT_RATE_LIMIT,
+                 max_windows: int = MAX_WINDOWS):
+        self.limits = dict(DEFAULT_RATE_LIMITS if limits is None else limits)
+        self.default = default
+        self.max_windows = max_windows
+        self._throttlers: Dict[str, Throttler] = {}
+
+    def rule_for(self, host: str) -> Tuple[str, RateLimit]:
+        """Правило для хоста: (домен правила, лимит). Ищем от полного хоста к родительским доменам"""
+        host = host.lower()
+        if host.startswith('www.'):
+            host = host[4:]
+        parts = host.split('.')
+        for i in range(len(parts) - 1):
+            domain = '.'.join(parts[i:])
+            if domain in self.limits:
+                return domain, self.limits[domain]
+        return host, self.default
+
+    def throttler(self, host: str, key: Optional[str] = None) -> Throttler:
+        """Окно для хоста; key — отдельное окно с лимитом хоста (например, на каждый чат)"""
+        domain, (rate, period) = self.rule_for(host)
+        key = key or domain
+        throttler = self._throttlers.get(key)
+        if throttler is None:
+            if len(self._throttlers) >= self.max_windows:
+                self.evict_idle()
+            throttler = Throttler(rate_limit=rate, period=period)
+            self._throttlers[key] = throttler
+        return throttler
+
+    def evict_idle(self) -> int:
+        """Удаляет окна без запросов за последний период; возвращает их число"""
+        idle = []
+        for key, throttler in self._throttlers.items():
+            throttler.flush()
+            if not throttler._task_logs:
+                idle.append(key)
+        for key in idle:
+            del self._throttlers[key]
+        return len(idle)
+
+    async def acquire(self, target: str, key: Optional[str] = None):
+        """Ждет слот для URL, поискового запроса yt-dlp или хоста"""
+        host = host_of(target) or target
+        await self.throttler(host, key).acquire()
+
+    def trace_config(self) -> aiohttp.TraceConfig:
+        """TraceConfig для aiohttp: каждый запрос сессии ждет слот своего хоста"""
+        async def on_request_start(session, context, params):
+            if params.url.host:
+                await self.throttler(params.url.host).acquire()
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_start.append(on_request_start)
+        return trace_config
+
+
+RATE_LIMITER = HostRateLimiter(*load_rate_limits())
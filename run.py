@@ -11,7 +11,7 @@ from pathlib import Path
 
 def check_requirements():
     """Перевіряє наявність необхідних файлів та залежностей"""
-    required_files = ['main.py', 'utils.py', 'requirements.txt']
+    required_files = ['main.py', 'utils.py', 'providers.py', 'pipeline.py', 'requirements.txt']
     
     for file in required_files:
         if not Path(file).exists():
@@ -0,0 +1,329 @@
+"""
+Постоянное хранилище состояния бота: PostgreSQL (asyncpg) или SQLite.
+
+Раньше все состояние жило в памяти процесса и в JSON-файлах рядом с ботом
+и пропадало при каждом редеплое на Railway. Здесь хранятся:
+    - resolutions — чем закончился поиск трека: провайдер, исходная ссылка,
+      file_id в Telegram с подписью, длительность и оценка совпадения, по
+      ключу (Spotify ID, вариант выхода);
+    - provider_stats — статистика провайдеров (provider_stats.ProviderStats).
+      Экземпляры бота пишут не снимки, а свои попытки: каждая применяется
+      к строке провайдера одним запросом (attempts * DECAY + 1, ...), поэтому
+      одновременные записи не затирают друг друга;
+    - jobs — история заданий: трек, чат, результат, провайдер, время.
+
+Кэш промахов провайдеров (negative_cache.py, TTL несколько часов) и индекс
+аудиокэша (audio_cache.py, описывает файлы на локальном диске) остаются
+локальными: после редеплоя первый теряет немного времени, а второй без
+самих файлов бесполезен.
+
+PostgresStorage держит пул соединений asyncpg, и базу могут делить
+несколько экземпляров бота. SqliteStorage — для разработки и тестов:
+стандартный sqlite3, запросы выполняются в IO-пуле (executors.run_io),
+event loop не блокируется.
+
+Запросы пишутся один раз с плейсхолдерами "?"; для PostgreSQL они
+переводятся в $1, $2, ... Вставка с обновлением — ON CONFLICT ... DO UPDATE,
+ее понимают обе базы.
+"""
+
+import abc
+import logging
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple, Union
+
+from executors import run_io
+from provider_stats import DECAY, LATENCY_ALPHA
+
+try:
+    import asyncpg
+except ImportError:  # asyncpg нужен только для PostgreSQL
+    asyncpg = None
+
+logger = logging.getLogger(__name__)
+
+# Размер пула соединений PostgreSQL
+POOL_MIN_SIZE = 1
+POOL_MAX_SIZE = 5
+
+# Сколько ждать подключения к PostgreSQL, прежде чем перейти на SQLite (секунды)
+CONNECT_TIMEOUT = 10
+
+_RESOLUTIONS = '''
+CREATE TABLE IF NOT EXISTS resolutions (
+    track_id TEXT NOT NULL,
+    variant TEXT NOT NULL,
+    provider TEXT,
+    source_url TEXT,
+    file_id TEXT,
+    caption TEXT,
+    duration DOUBLE PRECISION,
+    score DOUBLE PRECISION,
+    updated_at DOUBLE PRECISION NOT NULL,
+    PRIMARY KEY (track_id, variant)
+)'''
+
+_PROVIDER_STATS = '''
+CREATE TABLE IF NOT EXISTS provider_stats (
+    name TEXT PRIMARY KEY,
+    attempts DOUBLE PRECISION NOT NULL,
+    successes DOUBLE PRECISION NOT NULL,
+    avg_time DOUBLE PRECISION NOT NULL,
+    last_success DOUBLE PRECISION NOT NULL
+)'''
+
+_JOBS = '''
+CREATE TABLE IF NOT EXISTS jobs (
+    id {id_column},
+    track_id TEXT,
+    kind TEXT NOT NULL,
+    chat_id BIGINT,
+    status TEXT NOT NULL,
+    provider TEXT,
+    elapsed DOUBLE PRECISION,
+    created_at DOUBLE PRECISION NOT NULL
+)'''
+
+_JOBS_INDEX = 'CREATE INDEX IF NOT EXISTS jobs_created_at ON jobs (created_at)'
+
+# Новые значения не затирают известные: file_id пишется позже, чем провайдер
+_SAVE_RESOLUTION = '''
+INSERT INTO resolutions (track_id, variant, provider, source_url, file_id, caption, duration, score, updated_at)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (track_id, variant) DO UPDATE SET
+    provider = COALESCE(excluded.provider, resolutions.provider),
+    source_url = COALESCE(excluded.source_url, resolutions.source_url),
+    file_id = COALESCE(excluded.file_id, resolutions.file_id),
+    caption = COALESCE(excluded.caption, resolutions.caption),
+    duration = COALESCE(excluded.duration, resolutions.duration),
+    score = COALESCE(excluded.score, resolutions.score),
+    updated_at = excluded.updated_at'''
+
+# Одна попытка провайдера — то же обновление, что ProviderStats.record, но в базе
+_RECORD_PROVIDER_ATTEMPT = '''
+INSERT INTO provider_stats (name, attempts, successes, avg_time, last_success)
+VALUES (?, 1, ?, ?, ?)
+ON CONFLICT (name) DO UPDATE SET
+    attempts = provider_stats.attempts * ? + 1,
+    successes = provider_stats.successes * ? + excluded.successes,
+    avg_time = CASE WHEN provider_stats.avg_time > 0
+        THEN provider_stats.avg_time + ? * (excluded.avg_time - provider_stats.avg_time)
+        ELSE excluded.avg_time END,
+    last_success = CASE WHEN excluded.last_success > provider_stats.last_success
+        THEN excluded.last_success ELSE provider_stats.last_success END'''
+
+# Начальные значения из локального файла; существующие строки не трогаются
+_SEED_PROVIDER_STATS = '''
+INSERT INTO provider_stats (name, attempts, successes, avg_time, last_success)
+VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (name) DO NOTHING'''
+
+RESOLUTION_FIELDS = ('provider', 'source_url', 'file_id', 'caption', 'duration', 'score', 'updated_at')
+STATS_FIELDS = ('attempts', 'successes', 'avg_time', 'last_success')
+JOB_FIELDS = ('id', 'track_id', 'kind', 'chat_id', 'status', 'provider', 'elapsed', 'created_at')
+
+
+class Storage(abc.ABC):
+    """Общая часть хранилищ; подклассы реализуют выполнение запросов"""
+
+    backend = ''
+    jobs_id_column = ''
+
+    @abc.abstractmethod
+    async def execute(self, sql: str, args: Sequence = ()):
+        """Выполняет запрос без результата"""
+
+    @abc.abstractmethod
+    async def execute_many(self, sql: str, rows: List[Sequence]):
+        """Выполняет запрос для каждой строки rows в одной транзакции"""
+
+    @abc.abstractmethod
+    async def fetch(self, sql: str, args: Sequence = ()) -> List[Dict[str, Any]]:
+        """Строки результата запроса в виде словарей"""
+
+    @abc.abstractmethod
+    async def columns(self, table: str) -> Set[str]:
+        """Имена столбцов таблицы"""
+
+    @abc.abstractmethod
+    async def close(self):
+        """Закрывает соединения"""
+
+    async def init_schema(self):
+        for statement in (_RESOLUTIONS, _PROVIDER_STATS, _JOBS.format(id_column=self.jobs_id_column), _JOBS_INDEX):
+            await self.execute(statement)
+        # Базы, созданные до появления подписи к file_id
+        if 'caption' not in await self.columns('resolutions'):
+            await self.execute('ALTER TABLE resolutions ADD COLUMN caption TEXT')
+
+    async def get_resolution(self, track_id: str, variant: str) -> Optional[Dict[str, Any]]:
+        rows = await self.fetch(
+            f"SELECT {', '.join(RESOLUTION_FIELDS)} FROM resolutions WHERE track_id = ? AND variant = ?",
+            (track_id, variant)
+        )
+        return rows[0] if rows else None
+
+    async def save_resolution(self, track_id: str, variant: str, provider: Optional[str] = None,
+                              source_url: Optional[str] = None, file_id: Optional[str] = None,
+                              duration: Optional[float] = None, score: Optional[float] = None,
+                              caption: Optional[str] = None):
+        """Запоминает, чем закончился поиск трека (пустые поля не затирают известные)"""
+        await self.execute(_SAVE_RESOLUTION, (track_id, variant, provider, source_url, file_id, caption,
+                                              duration, score, time.time()))
+
+    async def forget_file_id(self, track_id: str, variant: str):
+        """Стирает file_id, который Telegram больше не принимает"""
+        await self.execute('UPDATE resolutions SET file_id = NULL, caption = NULL WHERE track_id = ? AND variant = ?',
+                           (track_id, variant))
+
+    async def load_provider_stats(self) -> Dict[str, Dict[str, float]]:
+        rows = await self.fetch(f"SELECT name, {', '.join(STATS_FIELDS)} FROM provider_stats")
+        return {row['name']: {key: float(row[key]) for key in STATS_FIELDS} for row in rows}
+
+    async def record_provider_attempts(self, attempts: Sequence[Tuple[str, bool, float, float]],
+                                       decay: float = DECAY, alpha: float = LATENCY_ALPHA):
+        """Применяет попытки (провайдер, успех, длительность, время окончания) к общей статистике.
+
+        Каждая попытка — атомарное обновление строки, поэтому попытки разных
+        экземпляров бота складываются, а не затирают друг друга.
+        """
+        rows = [(name, 1.0 if success else 0.0, float(elapsed), float(finished_at) if success else 0.0,
+                 decay, decay, alpha)
+                for name, success, elapsed, finished_at in attempts]
+        if rows:
+            await self.execute_many(_RECORD_PROVIDER_ATTEMPT, rows)
+
+    async def seed_provider_stats(self, stats: Dict[str, Dict[str, float]]):
+        """Заполняет статистику провайдеров, которых в базе еще нет (например, из локального файла)"""
+        rows = [(name,) + tuple(float(entry.get(key, 0)) for key in STATS_FIELDS) for name, entry in stats.items()]
+        if rows:
+            await self.execute_many(_SEED_PROVIDER_STATS, rows)
+
+    async def record_job(self, kind: str, status: str, track_id: Optional[str] = None,
+                         chat_id: Optional[int] = None, provider: Optional[str] = None,
+                         elapsed: Optional[float] = None):
+        """Добавляет запись в историю заданий"""
+        await self.execute(
+            'INSERT INTO jobs (track_id, kind, chat_id, status, provider, elapsed, created_at) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (track_id, kind, chat_id, status, provider, elapsed, time.time())
+        )
+
+    async def recent_jobs(self, limit: int = 20) -> List[Dict[str, Any]]:
+        return await self.fetch(
+            f"SELECT {', '.join(JOB_FIELDS)} FROM jobs ORDER BY created_at DESC, id DESC LIMIT ?", (limit,)
+        )
+
+
+def _pg_placeholders(sql: str) -> str:
+    """'? , ?' -> '$1, $2' (в запросах этого модуля "?" не встречается внутри строк)"""
+    counter = iter(range(1, 1000))
+    return re.sub(r'\?', lambda _: f"${next(counter)}", sql)
+
+
+class PostgresStorage(Storage):
+    """PostgreSQL через пул соединений asyncpg"""
+
+    backend = 'postgres'
+    jobs_id_column = 'BIGSERIAL PRIMARY KEY'
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    @classmethod
+    async def connect(cls, dsn: Union[str, Dict], min_size: int = POOL_MIN_SIZE,
+                      max_size: int = POOL_MAX_SIZE, timeout: float = CONNECT_TIMEOUT) -> 'PostgresStorage':
+        """dsn — строка подключения (DATABASE_URL) или словарь параметров (user, password, host, ...)"""
+        if asyncpg is None:
+            raise RuntimeError('asyncpg is not installed')
+        params = {'dsn': dsn} if isinstance(dsn, str) else dict(dsn)
+        if 'port' in params:
+            params['port'] = int(params['port'])
+        pool = await asyncpg.create_pool(min_size=min_size, max_size=max_size, timeout=timeout, **params)
+        storage = cls(pool)
+        await storage.init_schema()
+        return storage
+
+    async def execute(self, sql: str, args: Sequence = ()):
+        await self.pool.execute(_pg_placeholders(sql), *args)
+
+    async def execute_many(self, sql: str, rows: List[Sequence]):
+        await self.pool.executemany(_pg_placeholders(sql), rows)
+
+    async def fetch(self, sql: str, args: Sequence = ()) -> List[Dict[str, Any]]:
+        return [dict(row) for row in await self.pool.fetch(_pg_placeholders(sql), *args)]
+
+    async def columns(self, table: str) -> Set[str]:
+        rows = await self.fetch('SELECT column_name FROM information_schema.columns '
+                                'WHERE table_schema = current_schema() AND table_name = ?', (table,))
+        return {row['column_name'] for row in rows}
+
+    async def close(self):
+        await self.pool.close()
+
+
+class SqliteStorage(Storage):
+    """SQLite-файл: одно соединение под блокировкой, запросы в IO-пуле"""
+
+    backend = 'sqlite'
+    jobs_id_column = 'INTEGER PRIMARY KEY AUTOINCREMENT'
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('PRAGMA journal_mode=WAL')
+
+    @classmethod
+    async def connect(cls, path: str) -> 'SqliteStorage':
+        storage = await run_io(cls, path)
+        await storage.init_schema()
+        return storage
+
+    def _execute(self, sql: str, args: Sequence):
+        with self._lock:
+            self._conn.execute(sql, tuple(args))
+
+    def _execute_many(self, sql: str, rows: List[Sequence]):
+        with self._lock:
+            # Одна транзакция на всю пачку
+            with self._conn:
+                self._conn.execute('BEGIN')
+                self._conn.executemany(sql, rows)
+
+    def _fetch(self, sql: str, args: Sequence) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(sql, tuple(args)).fetchall()]
+
+    async def execute(self, sql: str, args: Sequence = ()):
+        await run_io(self._execute, sql, args)
+
+    async def execute_many(self, sql: str, rows: List[Sequence]):
+        await run_io(self._execute_many, sql, rows)
+
+    async def fetch(self, sql: str, args: Sequence = ()) -> List[Dict[str, Any]]:
+        return await run_io(self._fetch, sql, args)
+
+    async def columns(self, table: str) -> Set[str]:
+        return {row['name'] for row in await self.fetch(f"PRAGMA table_info({table})")}
+
+    async def close(self):
+        await run_io(self._conn.close)
+
+
+async def open_storage(dsn: Optional[Union[str, Dict]], sqlite_path: str) -> Storage:
+    """PostgreSQL, если задано подключение и он доступен, иначе SQLite-файл sqlite_path"""
+    if dsn:
+        try:
+            storage = await PostgresStorage.connect(dsn)
+            logger.info("Storage: PostgreSQL connection pool ready")
+            return storage
+        except Exception as e:
+            logger.error(f"PostgreSQL unavailable, falling back to SQLite {sqlite_path}: {e}")
+    storage = await SqliteStorage.connect(sqlite_path)
+    logger.info(f"Storage: SQLite {sqlite_path}")
+    return storage
@@ -0,0 +1,154 @@
+"""
+Потоковый режим: скачивание сразу в ffmpeg.
+
+Обычный путь: yt-dlp скачивает исходник в папку задания, затем ffmpeg читает
+его с диска и пишет второй файл. В потоковом режиме (STREAM_PIPELINE=1)
+yt-dlp только выбирает формат (extract_info без скачивания), а байты из
+HTTP-ответа по мере прихода передаются в stdin ffmpeg; результат
+кодирования сразу пишется в итоговый файл. Время на трек — примерно
+max(скачивание, кодирование) вместо их суммы, исходник на диск не пишется.
+
+При AUDIO_OUTPUT=passthrough кодировать нечего: аудиодорожка скачивается
+напрямую (downloader.download_url, параллельные Range-отрезки).
+
+Форматы, которые так не скачать (HLS/DASH, слияние дорожек), и ошибки
+ffmpeg (например, MP4 с индексом в конце файла не читается из трубы)
+возвращают None — вызывающий код скачивает обычным путем.
+"""
+
+import asyncio
+import logging
+import os
+import time
+import uuid
+from typing import Callable, Dict, List, Optional
+
+import aiohttp
+
+from downloader import CHUNK_SIZE, download_url
+from ffmpeg_service import FFMPEG, FFMPEG_BINARY, MP3_ENCODE_ARGS
+from output_policy import passthrough_enabled
+from utils import DOWNLOAD_TIMEOUT, budget_timeout, clean_filename, job_dir, throttled_session, ydl_extract_info
+from ydl_presets import YdlOpts
+
+logger = logging.getLogger(__name__)
+
+STREAM_PIPELINE = os.getenv('STREAM_PIPELINE', '0').strip().lower() in ('1', 'true', 'yes', 'on')
+
+# Сколько последних байт stderr ffmpeg сохранять для лога
+STDERR_TAIL = 2000
+
+
+class StreamError(Exception):
+    """Потоковое скачивание или кодирование не удалось"""
+
+
+def mp3_encode_command(dest_path: str) -> List[str]:
+    """ffmpeg: stdin -> MP3 192k (те же параметры, что у FFmpegExtractAudio в пресетах)"""
+    return [FFMPEG_BINARY, '-hide_banner', '-loglevel', 'error', '-i', 'pipe:0'] + MP3_ENCODE_ARGS + ['-f', 'mp3', '-y', dest_path]
+
+
+async def _read_tail(stream: asyncio.StreamReader) -> bytes:
+    tail = b''
+    while True:
+        chunk = await stream.read(CHUNK_SIZE)
+        if not chunk:
+            return tail
+        tail = (tail + chunk)[-STDERR_TAIL:]
+
+
+async def stream_transcode(session: aiohttp.ClientSession, url: str, dest_path: str,
+                           headers: Optional[Dict[str, str]] = None,
+                           timeout: Optional[aiohttp.ClientTimeout] = None,
+                           command: Callable[[str], List[str]] = mp3_encode_command) -> Optional[str]:
+    """Скачивает url и по мере прихода байт передает их в ffmpeg; результат — dest_path.
+
+    Слот FFmpegService занимается только после первых байт ответа: пока
+    сервер молчит, ffmpeg запускать незачем, и ожидание сети не отнимает
+    место у остальных кодирований. Выход пишется во временный файл и
+    атомарно переименовывается. Отмена задачи или ошибка убивает ffmpeg и
+    удаляет недописанный файл.
+    """
+    tmp_path = f"{dest_path}.{uuid.uuid4().hex}.part"
+    directory = os.path.dirname(dest_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    process = None
+    stderr_task = None
+    # Для метрик FFmpegService: когда запущен ffmpeg и дал ли он файл
+    encode_started = None
+    success = False
+    try:
+        async with session.get(url, headers=headers or {}, timeout=timeout) as resp:
+            if resp.status != 200:
+                return None
+            first = await resp.content.read(CHUNK_SIZE)
+            if not first:
+                raise StreamError("empty response")
+            # Слот сервиса ffmpeg: потоковое кодирование тоже не должно перегружать процессор
+            async with FFMPEG.slot():
+                encode_started = time.monotonic()
+                process = await asyncio.create_subprocess_exec(
+                    *command(tmp_path),
+                    stdin=asyncio.subprocess.PIPE,
+                    stdout=asyncio.subprocess.DEVNULL,
+                    stderr=asyncio.subprocess.PIPE,
+                )
+                stderr_task = asyncio.ensure_future(_read_tail(process.stderr))
+                try:
+                    process.stdin.write(first)
+                    await process.stdin.drain()
+                    async for chunk in resp.content.iter_chunked(CHUNK_SIZE):
+                        process.stdin.write(chunk)
+                        await process.stdin.drain()
+                except (BrokenPipeError, ConnectionResetError):
+                    # ffmpeg завершился раньше (ошибка формата) — причина будет в stderr
+                    pass
+                process.stdin.close()
+                returncode = await process.wait()
+        stderr = (await stderr_task).decode('utf-8', 'replace')
+        if returncode != 0 or not os.path.exists(tmp_path) or os.path.getsize(tmp_path) == 0:
+            raise StreamError(f"ffmpeg exited with {returncode}: {stderr.strip()}")
+        os.replace(tmp_path, dest_path)
+        success = True
+        return dest_path
+    finally:
+        if process is not None and process.returncode is None:
+            await FFMPEG.kill(process)
+        if encode_started is not None:
+            FFMPEG.record(time.monotonic() - encode_started, success)
+        if stderr_task is not None and not stderr_task.done():
+            stderr_task.cancel()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def streamable_format(info: Optional[Dict], audio_only: bool = False) -> Optional[Dict]:
+    """Выбранный yt-dlp формат, если его можно скачать одним HTTP-запросом"""
+    if not info or info.get('entries') or info.get('requested_formats'):
+        return None
+    if info.get('protocol') not in ('http', 'https') or not info.get('url'):
+        return None
+    if audio_only and info.get('vcodec') not in (None, 'none'):
+        return None
+    return info
+
+
+async def stream_ydl_download(opts: YdlOpts, url: str) -> Optional[str]:
+    """yt-dlp выбирает формат, байты идут в ffmpeg (или напрямую при passthrough).
+
+    None — формат не подходит для потоковой загрузки; тогда нужно скачать обычным путем.
+    """
+    passthrough = passthrough_enabled()
+    info = streamable_format(await ydl_extract_info(opts, url, download=False), audio_only=passthrough)
+    if not info:
+        return None
+    # Уникальное имя на задание, как у job_outtmpl: параллельные загрузки не пишут в один файл
+    base = os.path.join(job_dir(), f"{clean_filename(str(info.get('id') or 'track'))}-{uuid.uuid4().hex[:12]}")
+    headers = info.get('http_headers') or {}
+    async with throttled_session() as session:
+        if passthrough:
+            return await download_url(session, info['url'], f"{base}.{info.get('ext') or 'm4a'}",
+                                      timeout=budget_timeout(DOWNLOAD_TIMEOUT), headers=headers)
+        return await stream_transcode(session, info['url'], f"{base}.mp3",
+                                      headers=headers, timeout=budget_timeout(DOWNLOAD_TIMEOUT))
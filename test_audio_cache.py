@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Тест кэша готовых аудиофайлов (audio_cache.py)
+"""
+
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import threading
+
+# Добавляем текущую директорию в путь
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from audio_cache import AudioCache, file_digest
+
+
+def _file(directory, name, data):
+    path = os.path.join(directory, name)
+    with open(path, 'wb') as f:
+        f.write(data)
+    return path
+
+
+def test_put_and_get():
+    """Файл переносится в кэш под хэшем содержимого, ключ учитывает вариант выхода"""
+    async def run():
+        with tempfile.TemporaryDirectory() as directory:
+            cache = AudioCache(os.path.join(directory, 'cache'))
+            assert cache.get('track1', 'mp3-192k') is None
+
+            source = _file(directory, 'job.mp3', b'audio' * 1000)
+            digest = file_digest(source)
+            path = await cache.put('track1', source, 'mp3-192k')
+            assert not os.path.exists(source)
+            assert path == cache.object_path(digest, '.mp3')
+            assert os.path.basename(os.path.dirname(path)) == digest[:2]
+
+            assert cache.get('track1', 'mp3-192k') == path
+            assert cache.get('track1', 'passthrough') is None
+            assert cache.hits == 1 and cache.misses == 2
+    asyncio.run(run())
+    print("✅ Сохранение и выдача из кэша")
+
+
+def test_duplicates_share_object():
+    """Одинаковое содержимое под разными ID хранится один раз; индекс переживает перезапуск"""
+    async def run():
+        with tempfile.TemporaryDirectory() as directory:
+            root = os.path.join(directory, 'cache')
+            cache = AudioCache(root)
+            first = await cache.put('single', _file(directory, 'a.mp3', b'same' * 1000), 'mp3-192k')
+            second = await cache.put('album', _file(directory, 'b.mp3', b'same' * 1000), 'mp3-192k')
+            assert first == second
+            assert 'файлов: 1' in cache.summary()
+
+            reloaded = AudioCache(root)
+            assert reloaded.get('album', 'mp3-192k') == first
+
+            # Файл удален с диска — запись забывается
+            os.remove(first)
+            assert reloaded.get('single', 'mp3-192k') is None
+            assert len(reloaded.entries) == 1
+    asyncio.run(run())
+    print("✅ Дедупликация по содержимому")
+
+
+def test_eviction_respects_budget_and_pins():
+    """Сверх лимита вытесняются давно не отправлявшиеся (lru) или редко отправлявшиеся (lfu) файлы,
+    но не тот, что сейчас отправляется"""
+    async def run():
+        with tempfile.TemporaryDirectory() as directory:
+            cache = AudioCache(os.path.join(directory, 'lru'), max_bytes=2500)
+            old = await cache.put('old', _file(directory, 'a.mp3', b'a' * 1000), 'mp3-192k')
+            pinned = await cache.put('pinned', _file(directory, 'b.mp3', b'b' * 1000), 'mp3-192k')
+            cache.entries['old:mp3-192k']['used'] -= 100
+            cache.entries['pinned:mp3-192k']['used'] -= 200
+            with cache.pin(pinned):
+                await cache.put('new', _file(directory, 'c.mp3', b'c' * 1000), 'mp3-192k')
+            assert not os.path.exists(old) and os.path.exists(pinned)
+            assert cache.get('old', 'mp3-192k') is None
+            assert cache.get('pinned', 'mp3-192k') == pinned
+            assert cache.evicted == 1
+
+            lfu = AudioCache(os.path.join(directory, 'lfu'), max_bytes=2500, policy='lfu')
+            popular = await lfu.put('popular', _file(directory, 'd.mp3', b'd' * 1000), 'mp3-192k')
+            rare = await lfu.put('rare', _file(directory, 'e.mp3', b'e' * 1000), 'mp3-192k')
+            lfu.get('popular', 'mp3-192k')
+            lfu.get('popular', 'mp3-192k')
+            lfu.get('rare', 'mp3-192k')
+            lfu.entries['rare:mp3-192k']['used'] += 100
+            await lfu.put('newest', _file(directory, 'f.mp3', b'f' * 1000), 'mp3-192k')
+            assert os.path.exists(popular) and not os.path.exists(rare)
+    asyncio.run(run())
+    print("✅ Вытеснение по лимиту размера")
+
+
+def test_get_pins_until_unpin():
+    """Файл, выданный get(pin=True), не вытесняется до unpin"""
+    async def run():
+        with tempfile.TemporaryDirectory() as directory:
+            cache = AudioCache(os.path.join(directory, 'cache'), max_bytes=1500)
+            path = await cache.put('hit', _file(directory, 'a.mp3', b'a' * 1000), 'mp3-192k')
+            assert cache.get('hit', 'mp3-192k', pin=True) == path
+            cache.entries['hit:mp3-192k']['used'] -= 100
+            other = await cache.put('other', _file(directory, 'b.mp3', b'b' * 1000), 'mp3-192k')
+            # Давний, но закрепленный файл остается, вытесняется свежий незакрепленный
+            assert cache.evict() == 1
+            assert os.path.exists(path) and not os.path.exists(other)
+
+            cache.unpin(path)
+            await cache.put('third', _file(directory, 'c.mp3', b'c' * 1000), 'mp3-192k')
+            assert not os.path.exists(path)
+    asyncio.run(run())
+    print("✅ Закрепление файла при выдаче из кэша")
+
+
+def test_sweep_removes_orphans():
+    """sweep удаляет старые .tmp и файлы без записи в индексе, свежие не трогает"""
+    async def run():
+        with tempfile.TemporaryDirectory() as directory:
+            cache = AudioCache(os.path.join(directory, 'cache'))
+            kept = await cache.put('track1', _file(directory, 'a.mp3', b'a' * 1000), 'mp3-192k')
+            shard = os.path.dirname(kept)
+            orphan = _file(shard, 'f' * 64 + '.mp3', b'orphan')
+            partial = _file(shard, 'f' * 64 + '.mp3.0123.tmp', b'partial')
+            assert cache.sweep(max_age=3600) == 0
+            assert cache.sweep(max_age=0) == 2
+            assert os.path.exists(kept)
+            assert not os.path.exists(orphan) and not os.path.exists(partial)
+    asyncio.run(run())
+    print("✅ Уборка сирот в кэше")
+
+
+def test_concurrent_saves_and_flush():
+    """Одновременные сохранения не портят индекс, а flush после попаданий сохраняет с задержкой"""
+    async def run():
+        with tempfile.TemporaryDirectory() as directory:
+            root = os.path.join(directory, 'cache')
+            cache = AudioCache(root, flush_interval=3600)
+            for i in range(20):
+                await cache.put(f"track{i}", _file(directory, f"{i}.mp3", bytes([i]) * 1000), 'mp3-192k')
+
+            def hit_and_save():
+                for i in range(50):
+                    cache.get(f"track{i % 20}", 'mp3-192k')
+                    cache.save()
+
+            threads = [threading.Thread(target=hit_and_save) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            with open(cache.index_path, 'r', encoding='utf-8') as f:
+                assert len(json.load(f)['entries']) == 20
+            assert sorted(os.listdir(root)) == ['index.json', 'objects']
+
+            # Попадание после сохранения: flush откладывает запись, save пишет сразу
+            cache.get('track0', 'mp3-192k')
+            cache.flush()
+            assert AudioCache(root).entries['track0:mp3-192k']['hits'] == 24
+            cache.flush_interval = 0
+            cache.flush()
+            assert AudioCache(root).entries['track0:mp3-192k']['hits'] == 25
+    asyncio.run(run())
+    print("✅ Одновременное сохранение индекса")
+
+
+if __name__ == "__main__":
+    test_put_and_get()
+    test_duplicates_share_object()
+    test_eviction_respects_budget_and_pins()
+    test_get_pins_until_unpin()
+    test_sweep_removes_orphans()
+    test_concurrent_saves_and_flush()
+    print("🎯 Тест завершен!")
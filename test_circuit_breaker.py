@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Тест выключателей провайдеров (circuit_breaker.py)
+"""
+
+import asyncio
+import os
+import sys
+
+# Добавляем текущую директорию в путь
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreakers
+from pipeline import NO_RESULTS, gather_candidates, run_pipeline
+from providers import ProviderSpec
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_breaker_opens_and_probes():
+    """Открывается после N неудач, после паузы пропускает одну пробу"""
+    clock = _Clock()
+    breakers = CircuitBreakers(failure_threshold=3, cooldown=60, clock=clock)
+    breaker = breakers.get('PleerNet')
+    for _ in range(3):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+    clock.now = 61
+    assert breaker.allow()          # проба
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow()      # вторая проба одновременно не пускается
+    breaker.record_failure()
+    assert breaker.state == OPEN and breaker.cooldown == 120
+
+    clock.now = 61 + 121
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED and breaker.cooldown == 60
+    print("✅ Выключатель: open -> half-open -> closed")
+
+
+def test_pipeline_skips_open_provider():
+    """Пайплайн не вызывает провайдера с открытым выключателем"""
+    breakers = CircuitBreakers(failure_threshold=2, cooldown=600)
+    calls = []
+
+    async def dead(ctx):
+        calls.append('dead')
+        raise ConnectionError('service unavailable')
+
+    specs = [ProviderSpec('dead', dead, order=10, tier=1)]
+    for _ in range(4):
+        assert asyncio.run(run_pipeline(specs, None, breakers=breakers)) is None
+    assert calls == ['dead', 'dead']
+    assert breakers.summary()[0].startswith('dead: open')
+    print("✅ Пайплайн пропускает открытый выключатель")
+
+
+def test_misses_keep_breaker_closed():
+    """Провайдер, у которого подряд нет треков, не считается сломанным"""
+    breakers = CircuitBreakers(failure_threshold=2, cooldown=600)
+    calls = []
+
+    async def niche(ctx):
+        calls.append('niche')
+        return NO_RESULTS
+
+    specs = [ProviderSpec('niche', niche, order=10, tier=1)]
+    for _ in range(5):
+        assert asyncio.run(run_pipeline(specs, None, breakers=breakers)) is None
+    assert calls == ['niche'] * 5
+    assert breakers.state('niche') == CLOSED
+    print("✅ Промахи не размыкают выключатель")
+
+
+def test_search_success_resets_failures():
+    """Удачный поиск сбрасывает счетчик неудач и закрывает выключатель после пробы"""
+    clock = _Clock()
+    breakers = CircuitBreakers(failure_threshold=2, cooldown=60, clock=clock)
+    results = []
+
+    async def search(ctx):
+        result = results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    async def fetch(ctx, candidate):
+        return None
+
+    class _Ctx:
+        track_key = 'spotify:abc'
+
+    specs = [ProviderSpec('search', None, order=10, tier=1, search=search, fetch=fetch)]
+    results[:] = [RuntimeError('captcha'), [{'url': 'https://example.com/a'}], RuntimeError('captcha')]
+    for _ in range(3):
+        asyncio.run(gather_candidates(specs, _Ctx(), breakers))
+    assert breakers.state('search') == CLOSED
+
+    results[:] = [RuntimeError('captcha'), NO_RESULTS]
+    asyncio.run(gather_candidates(specs, _Ctx(), breakers))
+    assert breakers.state('search') == OPEN
+    clock.now = 61
+    asyncio.run(gather_candidates(specs, _Ctx(), breakers))
+    assert breakers.state('search') == CLOSED
+    print("✅ Удачный поиск сбрасывает выключатель")
+
+
+if __name__ == "__main__":
+    test_breaker_opens_and_probes()
+    test_pipeline_skips_open_provider()
+    test_misses_keep_breaker_closed()
+    test_search_success_resets_failures()
+    print("🎯 Тест завершен!")
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Тест асинхронного загрузчика с Range-отрезками (downloader.py)
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+
+# Добавляем текущую директорию в путь
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from aiohttp import ClientSession, web
+
+import downloader
+from downloader import download_url, parse_content_range, split_ranges
+
+PAYLOAD = os.urandom(3 * downloader.MIN_SEGMENT_SIZE + 12345)
+
+
+async def _serve(handler):
+    app = web.Application()
+    app.router.add_get('/track.mp3', handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}/track.mp3"
+
+
+def _download(handler, segments=4):
+    async def scenario():
+        runner, url = await _serve(handler)
+        try:
+            with tempfile.TemporaryDirectory() as tmp:
+                dest = os.path.join(tmp, 'track.mp3')
+                async with ClientSession() as session:
+                    path = await download_url(session, url, dest, segments=segments)
+                data = open(path, 'rb').read() if path else None
+                leftovers = [name for name in os.listdir(tmp) if name.endswith('.part')]
+                return path, data, leftovers
+        finally:
+            await runner.cleanup()
+    return asyncio.run(scenario())
+
+
+def test_helpers():
+    """Разбор Content-Range и деление на отрезки"""
+    assert parse_content_range('bytes 0-99/1000') == (0, 99, 1000)
+    assert parse_content_range('bytes */1000') is None
+    size = 3 * downloader.MIN_SEGMENT_SIZE + 5
+    ranges = split_ranges(size, 4)
+    assert len(ranges) == 3
+    assert ranges[0][0] == 0 and ranges[-1][1] == size - 1
+    assert all(a[1] + 1 == b[0] for a, b in zip(ranges, ranges[1:]))
+    assert split_ranges(1000, 4) == [(0, 999)]
+    print("✅ Content-Range и отрезки")
+
+
+def test_parallel_ranges():
+    """Сервер с Range: файл качается несколькими отрезками и собирается без ошибок"""
+    requests = []
+
+    async def handler(request):
+        requests.append(request.headers.get('Range'))
+        start, _, end = request.headers['Range'][len('bytes='):].partition('-')
+        start = int(start)
+        end = int(end) if end else len(PAYLOAD) - 1
+        return web.Response(status=206, body=PAYLOAD[start:end + 1], headers={
+            'Content-Range': f"bytes {start}-{end}/{len(PAYLOAD)}",
+        })
+
+    path, data, leftovers = _download(handler)
+    assert path and data == PAYLOAD
+    assert len(requests) == 3 and requests[0] == 'bytes=0-'
+    assert not leftovers
+    print("✅ Параллельные отрезки")
+
+
+def test_fallback_single_stream():
+    """Сервер без Range отдает 200: тот же ответ дочитывается одним потоком"""
+    requests = []
+
+    async def handler(request):
+        requests.append(request.headers.get('Range'))
+        return web.Response(body=PAYLOAD)
+
+    path, data, _ = _download(handler)
+    assert data == PAYLOAD
+    assert len(requests) == 1
+    print("✅ Один поток без Range")
+
+
+def test_broken_segment_falls_back():
+    """Оборванный отрезок: повтор одним потоком, файл целый"""
+    async def handler(request):
+        range_header = request.headers.get('Range')
+        if range_header and range_header != 'bytes=0-':
+            return web.Response(status=200, body=b'oops')
+        if range_header:
+            return web.Response(status=206, body=PAYLOAD, headers={
+                'Content-Range': f"bytes 0-{len(PAYLOAD) - 1}/{len(PAYLOAD)}",
+            })
+        return web.Response(body=PAYLOAD)
+
+    path, data, leftovers = _download(handler)
+    assert data == PAYLOAD
+    assert not leftovers
+    print("✅ Повтор после ошибки отрезка")
+
+
+def test_error_response_not_retried():
+    """Ответ с ошибкой на пробный запрос не повторяется одним потоком"""
+    requests = []
+
+    async def handler(request):
+        requests.append(request.headers.get('Range'))
+        return web.Response(status=404)
+
+    path, _, leftovers = _download(handler)
+    assert path is None
+    assert requests == ['bytes=0-']
+    assert not leftovers
+    print("✅ Ошибка сервера без повтора")
+
+
+if __name__ == "__main__":
+    test_helpers()
+    test_parallel_ranges()
+    test_fallback_single_stream()
+    test_broken_segment_falls_back()
+    test_error_response_not_retried()
+    print("🎯 Тест завершен!")
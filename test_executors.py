@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Тест исполнителей блокирующих вызовов (executors.py)
+"""
+
+import asyncio
+import contextvars
+import os
+import sys
+import threading
+import time
+
+# Добавляем текущую директорию в путь
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from executors import BoundedExecutor
+
+
+def test_loop_stays_responsive():
+    """Пока блокирующие вызовы идут в пуле, event loop продолжает работать"""
+    executor = BoundedExecutor('test', 2)
+
+    async def scenario():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        tick_task = asyncio.create_task(ticker())
+        started = time.monotonic()
+        await asyncio.gather(*(executor.run(time.sleep, 0.2) for _ in range(2)))
+        elapsed = time.monotonic() - started
+        tick_task.cancel()
+        return ticks, elapsed
+
+    ticks, elapsed = asyncio.run(scenario())
+    assert ticks >= 10
+    assert elapsed < 0.35  # два вызова выполнялись одновременно
+    executor.shutdown()
+    print("✅ Event loop не блокируется")
+
+
+def test_bounded_queue_and_context():
+    """Лишние задачи ждут в очереди, contextvars доступны в потоке"""
+    executor = BoundedExecutor('test', 1)
+    var = contextvars.ContextVar('var', default=None)
+    release = threading.Event()
+
+    async def scenario():
+        var.set('request-1')
+        first = asyncio.create_task(executor.run(release.wait, 1))
+        second = asyncio.create_task(executor.run(var.get))
+        await asyncio.sleep(0.05)
+        snapshot = executor.stats()
+        release.set()
+        await first
+        return snapshot, await second
+
+    snapshot, value = asyncio.run(scenario())
+    assert snapshot == {'running': 1, 'queued': 1, 'workers': 1}
+    assert value == 'request-1'
+    assert executor.stats()['running'] == 0 and executor.stats()['queued'] == 0
+    executor.shutdown()
+    print("✅ Очередь и contextvars")
+
+
+if __name__ == "__main__":
+    test_loop_stays_responsive()
+    test_bounded_queue_and_context()
+    print("🎯 Тест завершен!")
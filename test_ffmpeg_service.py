@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Тест асинхронного сервиса ffmpeg (ffmpeg_service.py)
+"""
+
+import asyncio
+import json
+import os
+import stat
+import sys
+import tempfile
+
+# Добавляем текущую директорию в путь
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from ffmpeg_service import FFmpegError, FFmpegService
+
+# Вместо ffmpeg: записывает аргументы в последний аргумент (выходной файл),
+# при "-i slow" долго спит, при "-i broken" завершается с ошибкой
+FAKE_FFMPEG = """
+import sys, time
+args = sys.argv[1:]
+source = args[args.index('-i') + 1]
+if source.endswith('slow'):
+    time.sleep(float(source.split('/')[-1].split('-')[0]))
+if source.endswith('broken'):
+    sys.stderr.write('Invalid data found when processing input')
+    sys.exit(1)
+with open(args[-1], 'w') as f:
+    f.write(' '.join(args) + ' ' + 'x' * 2000)
+"""
+
+FAKE_FFPROBE = """
+import json, sys
+print(json.dumps({
+    'streams': [{'codec_type': 'video', 'codec_name': 'mjpeg'}, {'codec_type': 'audio', 'codec_name': 'opus'}],
+    'format': {'format_name': 'matroska,webm'},
+}))
+"""
+
+
+def _script(directory, name, body):
+    path = os.path.join(directory, name)
+    with open(path, 'w') as f:
+        f.write(f"#!{sys.executable}\n{body}")
+    os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+    return path
+
+
+def _service(directory, workers=1):
+    return FFmpegService(workers=workers,
+                         ffmpeg=_script(directory, 'ffmpeg', FAKE_FFMPEG),
+                         ffprobe=_script(directory, 'ffprobe', FAKE_FFPROBE))
+
+
+def test_probe_and_transcode():
+    """ffprobe определяет формат и кодек, -f берется из него, а не задан жестко"""
+    async def run():
+        with tempfile.TemporaryDirectory() as directory:
+            service = _service(directory)
+            src = os.path.join(directory, 'track.webm')
+            open(src, 'wb').close()
+            assert await service.probe(src) == {'format': 'matroska', 'codec': 'opus'}
+
+            dst = os.path.join(directory, 'track.mp3')
+            assert await service.transcode_mp3(src, dst) == dst
+            args = open(dst).read()
+            assert f"-f matroska -i {src}" in args
+            assert '-f aac' not in args
+            assert 'libmp3lame' in args
+
+            try:
+                await service.remux(os.path.join(directory, 'broken'), os.path.join(directory, 'out.ogg'))
+                raise AssertionError('FFmpegError expected')
+            except FFmpegError as e:
+                assert 'Invalid data' in str(e)
+            stats = service.stats()
+            assert stats['jobs'] == 2 and stats['failed'] == 1
+    asyncio.run(run())
+    print("✅ ffprobe и конвертация")
+
+
+def test_concurrency_is_bounded():
+    """Одновременно работает не больше workers процессов, остальные ждут в очереди"""
+    async def run():
+        with tempfile.TemporaryDirectory() as directory:
+            service = _service(directory, workers=2)
+            jobs = [asyncio.ensure_future(service.remux(os.path.join(directory, '0.5-slow'),
+                                                        os.path.join(directory, f"{i}.ogg")))
+                    for i in range(4)]
+            await asyncio.sleep(0.2)
+            assert service.running == 2
+            assert service.queued == 2
+            await asyncio.gather(*jobs)
+            stats = service.stats()
+            assert stats['running'] == 0 and stats['queued'] == 0 and stats['jobs'] == 4
+            assert stats['avg_time'] > 0
+    asyncio.run(run())
+    print("✅ Ограничение одновременных процессов")
+
+
+def test_timeout_kills_process():
+    """Зависший ffmpeg убивается по таймауту, слот освобождается"""
+    async def run():
+        with tempfile.TemporaryDirectory() as directory:
+            service = _service(directory)
+            try:
+                await service.remux(os.path.join(directory, '30-slow'), os.path.join(directory, 'out.ogg'), timeout=0.5)
+                raise AssertionError('FFmpegError expected')
+            except FFmpegError as e:
+                assert 'timed out' in str(e)
+            assert service.killed == 1
+            assert service.running == 0
+            # Таймаут — неудачное задание в метриках
+            assert service.jobs == 1 and service.failed == 1
+            # Слот свободен — следующее задание проходит
+            await asyncio.wait_for(service.run(['-i', 'ok', os.path.join(directory, 'ok.ogg')]), 10)
+            assert service.jobs == 2 and service.failed == 1
+    asyncio.run(run())
+    print("✅ Таймаут убивает ffmpeg")
+
+
+def test_missing_binary():
+    """Нет ffmpeg — FFmpegError, а не FileNotFoundError; ffprobe без бинарника дает пустой ответ"""
+    async def scenario():
+        with tempfile.TemporaryDirectory() as tmp:
+            service = FFmpegService(ffmpeg=os.path.join(tmp, 'no-ffmpeg'), ffprobe=os.path.join(tmp, 'no-ffprobe'))
+            assert await service.probe(os.path.join(tmp, 'a.webm')) == {}
+            try:
+                await service.transcode_mp3(os.path.join(tmp, 'a.webm'), os.path.join(tmp, 'a.mp3'))
+                raise AssertionError('FFmpegError expected')
+            except FFmpegError as e:
+                assert 'no-ffmpeg' in str(e)
+            assert service.running == 0
+    asyncio.run(scenario())
+    print("✅ Нет бинарника ffmpeg")
+
+
+if __name__ == "__main__":
+    test_probe_and_transcode()
+    test_concurrency_is_bounded()
+    test_timeout_kills_process()
+    test_missing_binary()
+    print("🎯 Тест завершен!")
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Тест кэша file_id Telegram (file_id_cache.py)
+"""
+
+import os
+import sys
+import tempfile
+
+# Добавляем текущую директорию в путь
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from file_id_cache import FileIdCache
+
+
+def test_file_ids_persist():
+    """file_id запоминается по треку и формату, переживает перезапуск и удаляется по discard"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'file_ids.json')
+        cache = FileIdCache(path)
+        assert cache.get('track1', 'mp3-192k') is None
+
+        cache.set('track1', 'BQACAgIAAxkBAAI', '🎵 Song - Artist', 'mp3-192k')
+        assert cache.get('track1', 'mp3-192k')['file_id'] == 'BQACAgIAAxkBAAI'
+        assert cache.get('track1', 'passthrough') is None
+        cache.save()
+
+        reloaded = FileIdCache(path)
+        entry = reloaded.get('track1', 'mp3-192k')
+        assert entry['caption'] == '🎵 Song - Artist'
+
+        reloaded.discard('track1', 'mp3-192k')
+        reloaded.save()
+        assert FileIdCache(path).get('track1', 'mp3-192k') is None
+    print("✅ Сохранение file_id")
+
+
+def test_broken_file_is_ignored():
+    """Поврежденный файл не мешает запуску"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'file_ids.json')
+        with open(path, 'w') as f:
+            f.write('{not json')
+        cache = FileIdCache(path)
+        assert cache.entries == {}
+        cache.set('track1', 'id', 'caption', 'mp3-192k')
+        cache.save()
+        assert FileIdCache(path).get('track1', 'mp3-192k')['file_id'] == 'id'
+    print("✅ Поврежденный файл игнорируется")
+
+
+def test_flush_and_limit():
+    """flush пишет файл не чаще раза в flush_interval, сверх лимита забываются самые старые записи"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'file_ids.json')
+        cache = FileIdCache(path, max_entries=2, flush_interval=3600)
+        for i in range(3):
+            cache.set(f"track{i}", f"id{i}", 'caption', 'mp3-192k')
+            cache.entries[f"track{i}:mp3-192k"]['created'] = i
+        cache.flush()
+        assert not os.path.exists(path)
+
+        cache.set('track3', 'id3', 'caption', 'mp3-192k')
+        assert sorted(cache.entries) == ['track2:mp3-192k', 'track3:mp3-192k']
+        cache.flush_interval = 0
+        cache.flush()
+        assert FileIdCache(path).get('track3', 'mp3-192k')['file_id'] == 'id3'
+    print("✅ Отложенное сохранение и лимит file_id")
+
+
+if __name__ == "__main__":
+    test_file_ids_persist()
+    test_broken_file_is_ignored()
+    test_flush_and_limit()
+    print("🎯 Тест завершен!")
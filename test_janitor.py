@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Тест фоновой уборки диска (janitor.py)
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+# Добавляем текущую директорию в путь
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from janitor import Janitor
+from utils import job_workdir
+
+
+def _age(path, seconds):
+    past = time.time() - seconds
+    os.utime(path, (past, past))
+
+
+def test_removes_only_stale_entries():
+    """Старые папки и файлы удаляются, свежие и папки выполняющихся заданий остаются"""
+    async def run():
+        with tempfile.TemporaryDirectory() as root:
+            stale_dir = os.path.join(root, '0123456789ab-89abcdef')
+            os.makedirs(stale_dir)
+            _age(stale_dir, 7200)
+            stale_file = os.path.join(root, 'track.webm.part')
+            open(stale_file, 'wb').close()
+            _age(stale_file, 7200)
+            fresh_file = os.path.join(root, 'fresh.mp3')
+            open(fresh_file, 'wb').close()
+
+            janitor = Janitor(interval=600, max_age=3600, download_dir=root)
+            with job_workdir('running track', root=root) as active:
+                _age(active, 7200)
+                assert await janitor.run_once() == 2
+                assert os.path.isdir(active)
+            assert sorted(os.listdir(root)) == ['fresh.mp3']
+            assert janitor.runs == 1 and janitor.removed == 2
+    asyncio.run(run())
+    print("✅ Уборка устаревших папок и файлов")
+
+
+def test_background_loop():
+    """Фоновая задача запускается и останавливается"""
+    async def run():
+        with tempfile.TemporaryDirectory() as root:
+            janitor = Janitor(interval=0.01, max_age=3600, download_dir=root)
+            janitor.start()
+            await asyncio.sleep(0.1)
+            await janitor.stop()
+            assert janitor.runs >= 1
+    asyncio.run(run())
+    print("✅ Фоновый запуск уборки")
+
+
+if __name__ == "__main__":
+    test_removes_only_stale_entries()
+    test_background_loop()
+    print("🎯 Тест завершен!")
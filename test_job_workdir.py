@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Тест рабочих папок заданий (utils.job_workdir)
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+
+# Добавляем текущую директорию в путь
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from executors import run_io
+from utils import job_dir, job_workdir, remove_stale_workdirs
+
+
+def test_concurrent_jobs_are_isolated():
+    """Одновременные задания с одним ключом пишут в разные папки, папки удаляются"""
+    async def job(root):
+        with job_workdir('Queen - Bohemian Rhapsody', root=root) as path:
+            await asyncio.sleep(0.01)
+            # Папка видна и в задачах, и в потоках IO-пула (contextvars копируются)
+            in_task = await asyncio.ensure_future(asyncio.sleep(0, result=job_dir()))
+            in_thread = await run_io(job_dir)
+            assert in_task == in_thread == path
+            with open(os.path.join(job_dir(), 'track.mp3'), 'wb') as f:
+                f.write(b'x')
+            return path
+
+    async def run():
+        with tempfile.TemporaryDirectory() as root:
+            paths = await asyncio.gather(*(job(root) for _ in range(5)))
+            assert len(set(paths)) == 5
+            assert all(os.path.dirname(path) == root for path in paths)
+            assert os.listdir(root) == []
+    asyncio.run(run())
+    print("✅ Отдельные папки для одновременных заданий")
+
+
+def test_workdir_removed_on_error():
+    """Папка удаляется и при ошибке; оставшиеся от прошлого запуска убираются при старте"""
+    with tempfile.TemporaryDirectory() as root:
+        try:
+            with job_workdir('track', root=root) as path:
+                open(os.path.join(path, 'partial.webm'), 'wb').close()
+                raise RuntimeError('provider failed')
+        except RuntimeError:
+            pass
+        assert not os.path.exists(path)
+
+        os.makedirs(os.path.join(root, '0123456789ab-89abcdef'))
+        os.makedirs(os.path.join(root, 'not-a-job'))
+        open(os.path.join(root, 'keep.mp3'), 'wb').close()
+        assert remove_stale_workdirs(root) == 1
+        assert sorted(os.listdir(root)) == ['keep.mp3', 'not-a-job']
+    print("✅ Уборка рабочих папок")
+
+
+if __name__ == "__main__":
+    test_concurrent_jobs_are_isolated()
+    test_workdir_removed_on_error()
+    print("🎯 Тест завершен!")
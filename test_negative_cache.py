@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Тест кэша промахов провайдеров (negative_cache.py)
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+
+# Добавляем текущую директорию в путь
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from negative_cache import NegativeCache
+from pipeline import NO_RESULTS, run_pipeline, run_two_phase
+from providers import ProviderContext, ProviderSpec
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_ttl_and_persistence():
+    """Промах живет не дольше TTL и переживает перезапуск"""
+    clock = _Clock()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'misses.json')
+        cache = NegativeCache(path, ttl=100, capacity=1000, clock=clock)
+        cache.add('Zaycev', 'spotify:abc')
+        assert cache.has('zaycev', 'spotify:abc')
+        assert not cache.has('Myzuka', 'spotify:abc')
+        assert not cache.has('Zaycev', 'spotify:def')
+        cache.save()
+
+        reloaded = NegativeCache(path, ttl=100, capacity=1000, clock=clock)
+        assert reloaded.has('Zaycev', 'spotify:abc')
+
+        clock.now += 60     # сдвиг поколения: промах еще помнится
+        assert reloaded.has('Zaycev', 'spotify:abc')
+        clock.now += 60     # следующий сдвиг: промах забыт
+        assert not reloaded.has('Zaycev', 'spotify:abc')
+    print("✅ TTL и сохранение кэша промахов")
+
+
+def test_pipeline_skips_known_misses():
+    """Провайдер, ничего не нашедший для трека, при повторном запросе не вызывается"""
+    misses = NegativeCache(capacity=1000)
+    calls = []
+
+    async def empty(ctx):
+        calls.append('empty')
+        return NO_RESULTS
+
+    async def failed_download(ctx):
+        calls.append('failed')
+        return None
+
+    async def broken(ctx):
+        calls.append('broken')
+        raise RuntimeError('captcha')
+
+    async def search_nothing(ctx):
+        calls.append('search')
+        return NO_RESULTS
+
+    async def fetch(ctx, candidate):
+        return None
+
+    specs = [
+        ProviderSpec('empty', empty, order=10, tier=1),
+        ProviderSpec('broken', broken, order=20, tier=1),
+        ProviderSpec('failed', failed_download, order=25, tier=1),
+        ProviderSpec('searchable', empty, order=30, tier=1, search=search_nothing, fetch=fetch),
+    ]
+    track = {'id': 'abc', 'name': 'Song', 'artist': 'Artist'}
+    for _ in range(2):
+        ctx = ProviderContext('Artist_Song', track)
+        assert asyncio.run(run_two_phase(specs, ctx, lambda c: c, misses=misses)) is None
+    # Ошибка и неудачное скачивание — не промах: broken и failed вызываются снова;
+    # searchable после пустого поиска не запускается
+    assert calls == ['search', 'empty', 'broken', 'failed', 'broken', 'failed']
+
+    other = ProviderContext('Artist_Other', {'id': 'xyz', 'name': 'Other', 'artist': 'Artist'})
+    asyncio.run(run_pipeline(specs[:1], other, misses=misses))
+    assert calls[-1] == 'empty'
+    print("✅ Пайплайн пропускает известные промахи")
+
+
+if __name__ == "__main__":
+    test_ttl_and_persistence()
+    test_pipeline_skips_known_misses()
+    print("🎯 Тест завершен!")
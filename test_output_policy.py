@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Тест политики выходного формата (output_policy.py)
+"""
+
+import os
+import sys
+import tempfile
+
+# Добавляем текущую директорию в путь
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from output_policy import (
+    AUDIO_EXTENSIONS, REMUX, REMUX_TARGETS, SEND, SENDABLE_EXTENSIONS, TRANSCODE, TELEGRAM_MAX_FILE_SIZE,
+    apply_to_ydl_opts, plan_output,
+)
+from pipeline import MIN_AUDIO_SIZE, is_valid_audio_file
+from ydl_presets import ydl_preset
+
+
+def test_plan_output():
+    """mp3: всё в MP3; passthrough: отправка как есть, перепаковка или MP3 только при необходимости"""
+    assert plan_output('a.mp3', 5000, 'mp3') == (SEND, '.mp3')
+    assert plan_output('a.m4a', 5000, 'mp3') == (TRANSCODE, '.mp3')
+
+    assert plan_output('a.m4a', 5000, 'passthrough') == (SEND, '.m4a')
+    assert plan_output('a.opus', 5000, 'passthrough') == (SEND, '.opus')
+    assert plan_output('a.webm', 5000, 'passthrough') == (REMUX, '.ogg')
+    assert plan_output('a.aac', 5000, 'passthrough') == (REMUX, '.m4a')
+    assert plan_output('a.wav', 5000, 'passthrough') == (TRANSCODE, '.mp3')
+    assert plan_output('a.m4a', TELEGRAM_MAX_FILE_SIZE + 1, 'passthrough') == (TRANSCODE, '.mp3')
+    print("✅ План обработки файла")
+
+
+def test_ydl_opts_passthrough():
+    """При passthrough yt-dlp извлекает аудио без принудительного MP3"""
+    opts = ydl_preset('download-mp3-fixed')
+    assert apply_to_ydl_opts(opts, 'mp3') is opts
+
+    passthrough = apply_to_ydl_opts(opts, 'passthrough')
+    assert passthrough['postprocessors'][0]['key'] == 'FFmpegExtractAudio'
+    assert passthrough['postprocessors'][0]['preferredcodec'] == 'best'
+    assert 'FFmpegExtractAudio' not in passthrough.get('postprocessor_args', {})
+    # Исходные опции не меняются
+    assert opts['postprocessors'][0]['preferredcodec'] == 'mp3'
+    assert apply_to_ydl_opts(ydl_preset('search-flat'), 'passthrough') == ydl_preset('search-flat')
+    print("✅ Опции yt-dlp для passthrough")
+
+
+def test_passthrough_files_accepted():
+    """Всё, что дает passthrough (в том числе .opus), проходит проверку файла провайдера"""
+    assert set(SENDABLE_EXTENSIONS) | set(REMUX_TARGETS) <= set(AUDIO_EXTENSIONS)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'track.opus')
+        with open(path, 'wb') as f:
+            f.write(b'\0' * MIN_AUDIO_SIZE)
+        assert is_valid_audio_file(path)
+    print("✅ Файлы passthrough принимаются")
+
+
+if __name__ == "__main__":
+    test_plan_output()
+    test_ydl_opts_passthrough()
+    test_passthrough_files_accepted()
+    print("🎯 Тест завершен!")
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Тест движка гонки провайдеров (pipeline.py)
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+# Добавляем текущую директорию в путь
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from pipeline import race_providers, run_pipeline, run_tiers, run_two_phase
+from providers import ProviderSpec
+from utils import ImprovedSearchEngine, budget_timeout, request_budget
+
+
+def _make_audio(directory: str, name: str, size: int = 20000) -> str:
+    path = os.path.join(directory, name)
+    with open(path, 'wb') as f:
+        f.write(b'\0' * size)
+    return path
+
+
+def test_first_valid_file_wins_and_losers_are_cancelled():
+    """Побеждает первый валидный файл, медленные попытки отменяются"""
+    async def scenario():
+        cancelled = []
+        with tempfile.TemporaryDirectory() as tmp:
+            async def fast_broken():
+                return _make_audio(tmp, 'broken.mp3', size=100)
+
+            async def winner():
+                await asyncio.sleep(0.05)
+                return _make_audio(tmp, 'winner.mp3')
+
+            async def slow():
+                try:
+                    await asyncio.sleep(10)
+                except asyncio.CancelledError:
+                    cancelled.append('slow')
+                    raise
+
+            result = await race_providers([('broken', fast_broken), ('winner', winner), ('slow', slow)])
+            assert result is not None and result[0] == 'winner'
+            assert os.path.exists(result[1])
+            # Битый файл проигравшего удален
+            assert not os.path.exists(os.path.join(tmp, 'broken.mp3'))
+        return cancelled
+
+    cancelled = asyncio.run(scenario())
+    assert cancelled == ['slow']
+    print("✅ Гонка: победитель выбран, проигравшие отменены")
+
+
+def test_tiers_fall_through_and_timeout():
+    """Следующий тир запускается, только если в предыдущем нет победителя"""
+    async def scenario():
+        with tempfile.TemporaryDirectory() as tmp:
+            async def hangs():
+                await asyncio.sleep(10)
+
+            async def errors():
+                raise RuntimeError('site is down')
+
+            async def ok():
+                return _make_audio(tmp, 'ok.m4a')
+
+            return await run_tiers([[('hangs', hangs), ('errors', errors)], [('ok', ok)]], tier_timeout=0.1)
+
+    result = asyncio.run(scenario())
+    assert result is not None and result[0] == 'ok'
+    print("✅ Тиры: таймаут первого тира, победа во втором")
+
+
+class _Spec:
+    """Минимальная замена providers.ProviderSpec"""
+    def __init__(self, name, run, order, tier, timeout=None):
+        self.name, self.run, self.order, self.tier, self.timeout = name, run, order, tier, timeout
+
+
+def test_run_pipeline_order_and_timeout():
+    """Последовательный проход идет по order, зависший провайдер обрывается по таймауту"""
+    async def scenario():
+        calls = []
+        with tempfile.TemporaryDirectory() as tmp:
+            async def hangs(ctx):
+                calls.append('hangs')
+                await asyncio.sleep(10)
+
+            async def empty(ctx):
+                calls.append('empty')
+
+            async def ok(ctx):
+                calls.append('ok')
+                return _make_audio(tmp, f'{ctx}.mp3')
+
+            specs = [
+                _Spec('ok', ok, order=30, tier=1),
+                _Spec('hangs', hangs, order=10, tier=2, timeout=0.1),
+                _Spec('empty', empty, order=20, tier=1),
+            ]
+            result = await run_pipeline(specs, 'track')
+            return calls, result
+
+    calls, result = asyncio.run(scenario())
+    assert calls == ['hangs', 'empty', 'ok']
+    assert result is not None and result[0] == 'ok'
+    print("✅ Pipeline: порядок и таймаут провайдера")
+
+
+def test_run_pipeline_racing_groups_by_tier():
+    """В режиме гонки провайдеры одного тира стартуют вместе, тиры идут по возрастанию"""
+    async def scenario():
+        started = []
+        with tempfile.TemporaryDirectory() as tmp:
+            def make(name, valid):
+                async def run(ctx):
+                    started.append(name)
+                    await asyncio.sleep(0.01)
+                    return _make_audio(tmp, f'{name}.mp3') if valid else None
+                return run
+
+            specs = [
+                _Spec('late', make('late', True), order=10, tier=2),
+                _Spec('a', make('a', False), order=20, tier=1),
+                _Spec('b', make('b', False), order=30, tier=1),
+            ]
+            result = await run_pipeline(specs, 'track', racing=True)
+            return started, result
+
+    started, result = asyncio.run(scenario())
+    assert started == ['a', 'b', 'late']
+    assert result is not None and result[0] == 'late'
+    print("✅ Pipeline: гонка по тирам")
+
+
+def test_request_budget_stops_pipeline():
+    """Бюджет запроса урезает таймауты провайдеров и останавливает пайплайн"""
+    async def scenario():
+        calls = []
+
+        async def slow(ctx):
+            calls.append('slow')
+            await asyncio.sleep(10)
+
+        async def never(ctx):
+            calls.append('never')
+
+        specs = [_Spec('slow', slow, order=10, tier=1, timeout=60), _Spec('never', never, order=20, tier=1)]
+        started = time.monotonic()
+        with request_budget(0.2):
+            assert budget_timeout(15).total <= 0.2
+            result = await run_pipeline(specs, None)
+        return calls, result, time.monotonic() - started
+
+    calls, result, elapsed = asyncio.run(scenario())
+    assert result is None
+    assert calls == ['slow']
+    assert elapsed < 1
+    # Вне request_budget таймауты не урезаются
+    assert budget_timeout(15).total == 15
+    print("✅ Бюджет запроса")
+
+
+def test_two_phase_downloads_only_best_candidate():
+    """Кандидаты всех провайдеров ранжируются вместе, скачивается только лучший"""
+    track_info = {'name': 'Blinding Lights', 'artist': 'The Weeknd', 'duration': 200}
+
+    async def scenario():
+        fetched, ran = [], []
+        with tempfile.TemporaryDirectory() as tmp:
+            def searcher(candidates):
+                async def search(ctx):
+                    return [dict(c) for c in candidates]
+                return search
+
+            async def fetch(ctx, candidate):
+                fetched.append(candidate['title'])
+                return _make_audio(tmp, 'best.mp3')
+
+            async def chain(ctx):
+                ran.append('chain')
+
+            specs = [
+                ProviderSpec('A', chain, order=10, tier=1, fetch=fetch, search=searcher([
+                    {'url': 'a1', 'title': 'Blinding Lights (Slowed + Reverb)', 'duration': 260},
+                    {'url': 'a2', 'title': 'Save Your Tears', 'duration': 200},
+                ])),
+                ProviderSpec('B', chain, order=20, tier=1, fetch=fetch, search=searcher([
+                    {'url': 'b1', 'title': 'Blinding Lights', 'artist': 'The Weeknd', 'duration': 201},
+                ])),
+                ProviderSpec('C', chain, order=30, tier=1),
+            ]
+            rank = lambda candidates: ImprovedSearchEngine.filter_original_versions(candidates, track_info)
+            result = await run_two_phase(specs, None, rank)
+            return fetched, ran, result
+
+    fetched, ran, result = asyncio.run(scenario())
+    assert fetched == ['Blinding Lights']
+    assert ran == []
+    assert result is not None and result[0] == 'B'
+    print("✅ Двухфазный режим: скачан только лучший кандидат")
+
+
+def test_two_phase_falls_back_to_chain():
+    """Без подходящих кандидатов запускается цепочка провайдеров без поиска"""
+    async def scenario():
+        with tempfile.TemporaryDirectory() as tmp:
+            async def no_candidates(ctx):
+                return []
+
+            async def never_fetch(ctx, candidate):
+                raise AssertionError('nothing to fetch')
+
+            async def chain(ctx):
+                return _make_audio(tmp, 'chain.mp3')
+
+            specs = [
+                ProviderSpec('Search', chain, order=10, tier=1, search=no_candidates, fetch=never_fetch),
+                ProviderSpec('Chain', chain, order=20, tier=1),
+            ]
+            return await run_two_phase(specs, None, lambda candidates: candidates)
+
+    result = asyncio.run(scenario())
+    # Провайдер с пустым поиском тоже остается в цепочке (у него могут быть свои варианты запроса)
+    assert result is not None and result[0] == 'Search'
+    print("✅ Двухфазный режим: переход к обычной цепочке")
+
+
+if __name__ == "__main__":
+    test_first_valid_file_wins_and_losers_are_cancelled()
+    test_tiers_fall_through_and_timeout()
+    test_run_pipeline_order_and_timeout()
+    test_run_pipeline_racing_groups_by_tier()
+    test_request_budget_stops_pipeline()
+    test_two_phase_downloads_only_best_candidate()
+    test_two_phase_falls_back_to_chain()
+    print("🎯 Тест завершен!")
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Тест статистики и адаптивного порядка провайдеров (provider_stats.py)
+"""
+
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import threading
+
+# Добавляем текущую директорию в путь
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from pipeline import run_pipeline
+from provider_stats import ProviderStats
+from providers import ProviderSpec
+
+
+async def _noop(ctx):
+    return None
+
+
+def _specs(*names):
+    return [ProviderSpec(name, _noop, order=(i + 1) * 10, tier=1) for i, name in enumerate(names)]
+
+
+def test_order_prefers_fast_reliable_providers():
+    """Надежный быстрый провайдер поднимается выше, неизвестные остаются на месте"""
+    stats = ProviderStats(rng=random.Random(1))
+    for _ in range(20):
+        stats.record('dead', False, 15.0)
+        stats.record('good', True, 3.0)
+    ordered = [spec.name for spec in stats.order(_specs('dead', 'new', 'good'))]
+    assert ordered == ['good', 'new', 'dead']
+    print("✅ Адаптивный порядок")
+
+
+def test_exploration_keeps_weak_providers_alive():
+    """Сэмплирование Томпсона иногда ставит слабого провайдера первым"""
+    stats = ProviderStats(rng=random.Random(7))
+    for _ in range(5):
+        stats.record('a', True, 5.0)
+        stats.record('a', False, 5.0)
+        stats.record('b', False, 5.0)
+    stats.record('b', True, 5.0)
+    firsts = {stats.order(_specs('a', 'b'))[0].name for _ in range(200)}
+    assert firsts == {'a', 'b'}
+    print("✅ Исследование слабых провайдеров")
+
+
+def test_persistence_and_pipeline_recording():
+    """Исходы попыток записываются пайплайном и переживают перезапуск"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'stats.json')
+        stats = ProviderStats(path)
+
+        async def broken(ctx):
+            raise RuntimeError('captcha')
+
+        async def ok(ctx):
+            file_path = os.path.join(tmp, 'ok.mp3')
+            with open(file_path, 'wb') as f:
+                f.write(b'\0' * 20000)
+            return file_path
+
+        specs = [ProviderSpec('broken', broken, order=10, tier=1), ProviderSpec('ok', ok, order=20, tier=1)]
+        result = asyncio.run(run_pipeline(specs, None, stats=stats))
+        assert result is not None and result[0] == 'ok'
+        stats.save()
+
+        reloaded = ProviderStats(path)
+        assert reloaded.success_rate('ok') == 1.0
+        assert reloaded.success_rate('broken') == 0.0
+    print("✅ Сохранение статистики")
+
+
+def test_concurrent_saves_keep_file_valid():
+    """Одновременные сохранения из разных потоков не портят файл и не оставляют временных файлов"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'stats.json')
+        stats = ProviderStats(path)
+
+        def worker(index):
+            for _ in range(20):
+                stats.record(f"provider{index}", True, 1.0)
+                stats.save()
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert os.listdir(tmp) == ['stats.json']
+        assert ProviderStats(path).success_rate('provider3') == 1.0
+    print("✅ Одновременные сохранения")
+
+
+def test_flush_is_debounced():
+    """flush пишет файл не чаще раза в flush_interval, save — сразу"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'stats.json')
+        stats = ProviderStats(path, flush_interval=3600)
+        stats.record('youtube', True, 2.0)
+        stats.flush()
+        assert not os.path.exists(path)
+        stats.save()
+        assert ProviderStats(path).get('youtube')['attempts'] == 1
+        stats.flush_interval = 0
+        stats.record('youtube', True, 2.0)
+        stats.flush()
+        assert ProviderStats(path).get('youtube')['attempts'] > 1
+    print("✅ Отложенное сохранение статистики")
+
+
+if __name__ == "__main__":
+    test_order_prefers_fast_reliable_providers()
+    test_exploration_keeps_weak_providers_alive()
+    test_persistence_and_pipeline_recording()
+    test_concurrent_saves_keep_file_valid()
+    test_flush_is_debounced()
+    print("🎯 Тест завершен!")
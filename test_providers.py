@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""
+Тест реестра провайдеров (providers.py)
+"""
+
+import asyncio
+import json
+import os
+import sys
+import tempfile
+
+# Добавляем текущую директорию в путь
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import providers
+from providers import (
+    REGISTRY, ProviderContext, configured_providers, load_provider_config, search_until_confident,
+)
+from pipeline import NO_RESULTS
+from ydl_presets import OUTPUT_PATHS
+
+
+def test_registry_covers_chain():
+    """Все провайдеры зарегистрированы один раз, порядок совпадает с прежней цепочкой"""
+    names = [spec.name for spec in REGISTRY]
+    assert len(names) == len(set(names))
+    for name in ("JioSaavn", "Enhanced SoundCloud", "Deezer", "YouTube", "RedMp3", "Last.fm", "Archive.org Variants"):
+        assert name in names, name
+    assert names[:3] == ["JioSaavn", "Enhanced SoundCloud", "SoundCloud Fallback"]
+    assert names.index("AlternativeYouTube") < names.index("YouTube Music") < names.index("YouTube")
+    assert all(spec.timeout for spec in REGISTRY)
+    print(f"✅ Реестр: {len(names)} провайдеров")
+
+
+def test_config_overrides():
+    """Переопределения из конфига: выключение, тир, таймаут, порядок"""
+    specs = configured_providers({
+        "pleernet": {"enabled": False},
+        "Deezer": {"tier": 1, "timeout": 5, "order": 1},
+        "NoSuchSite": {"enabled": False},
+    })
+    names = [spec.name for spec in specs]
+    assert "PleerNet" not in names
+    assert names[0] == "Deezer"
+    assert specs[0].tier == 1 and specs[0].timeout == 5
+    # Реестр не меняется
+    assert next(s for s in REGISTRY if s.name == "PleerNet").enabled
+    print("✅ Переопределения конфига")
+
+
+def test_unreached_providers_disabled():
+    """Провайдеры, до которых прежняя цепочка не доходила, выключены, но включаются конфигом"""
+    names = [spec.name for spec in configured_providers({})]
+    assert "YouTube" in names
+    assert not any(spec.tier >= 6 for spec in configured_providers({}))
+    assert "RedMp3" not in names and "Last.fm" not in names and "YouTube Variants" not in names
+    enabled = [spec.name for spec in configured_providers({"RedMp3": {"enabled": True}})]
+    assert "RedMp3" in enabled
+    print("✅ Недостижимые раньше провайдеры выключены")
+
+
+def test_load_config_from_env():
+    """PROVIDERS_CONFIG (JSON-файл) и PROVIDERS_DISABLED"""
+    with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as f:
+        json.dump({"Tidal": {"timeout": 10}}, f)
+    old = {key: os.environ.get(key) for key in ('PROVIDERS_CONFIG', 'PROVIDERS_DISABLED')}
+    try:
+        os.environ['PROVIDERS_CONFIG'] = f.name
+        os.environ['PROVIDERS_DISABLED'] = 'Pandora, Tidal'
+        config = load_provider_config()
+    finally:
+        os.remove(f.name)
+        for key, value in old.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+    assert config == {"Tidal": {"timeout": 10, "enabled": False}, "Pandora": {"enabled": False}}
+    print("✅ Загрузка конфига из окружения")
+
+
+def test_context_variants():
+    """Варианты запроса: нормализованы, без дубликатов и приписок вроде slowed/remix"""
+    ctx = ProviderContext("Artist_Song")
+    assert ctx.variants == ["Artist Song"]
+    assert ctx.search_query == "Artist Song"
+
+    track = {'name': 'Bohemian Rhapsody - Remastered 2011', 'artist': 'Queen', 'artists': ['Queen']}
+    ctx = ProviderContext("Queen_Bohemian_Rhapsody_-_Remastered_2011", track)
+    assert ctx.search_query == "Queen Bohemian Rhapsody"
+    assert len(ctx.variants) <= 4
+    assert len({v.casefold() for v in ctx.variants}) == len(ctx.variants)
+    assert not any(word in v.lower() for v in ctx.variants for word in ('slowed', 'remix', 'cover', 'sped up'))
+    print("✅ Варианты запроса")
+
+
+def test_search_stops_on_confident_match():
+    """Перебор вариантов останавливается на первом уверенном совпадении"""
+    track = {'name': 'Bohemian Rhapsody', 'artist': 'Queen', 'artists': ['Queen'], 'duration': 354}
+    ctx = ProviderContext("Bohemian_Rhapsody_live_at_Wembley", track)
+    searched = []
+
+    async def search_variant(variant):
+        searched.append(variant)
+        if len(searched) == 1:
+            return [{'url': 'a', 'title': 'Bohemian Rhapsody (Slowed)', 'artist': 'x', 'duration': 420}]
+        return [{'url': 'b', 'title': 'Queen - Bohemian Rhapsody (Official Video)', 'artist': 'Queen Official',
+                 'duration': 355, 'view_count': 10 ** 9}]
+
+    candidates = asyncio.run(search_until_confident(ctx, search_variant))
+    assert len(ctx.variants) > 2
+    assert len(searched) == 2
+    assert [c['url'] for c in candidates] == ['a', 'b']
+    print("✅ Ранняя остановка поиска")
+
+
+def test_search_reports_no_results_only_when_clean():
+    """NO_RESULTS — только если все варианты искались без ошибок; ошибки всех вариантов пробрасываются"""
+    ctx = ProviderContext("Queen_Bohemian_Rhapsody", {'name': 'Bohemian Rhapsody', 'artist': 'Queen'})
+    assert len(ctx.variants) > 1
+
+    async def nothing(variant):
+        return []
+
+    async def captcha(variant):
+        raise RuntimeError('captcha')
+
+    async def flaky(variant):
+        if variant == ctx.variants[0]:
+            raise RuntimeError('HTTP 503')
+        return []
+
+    assert asyncio.run(search_until_confident(ctx, nothing)) is NO_RESULTS
+    assert asyncio.run(search_until_confident(ctx, flaky)) == []
+    try:
+        asyncio.run(search_until_confident(ctx, captcha))
+        assert False, "ошибка поиска должна пробрасываться"
+    except RuntimeError:
+        pass
+    print("✅ Пустой поиск отличается от ошибки")
+
+
+def test_metadata_youtube_lookup_memoized():
+    """Одинаковый запрос каталогов ищется и скачивается на YouTube один раз"""
+    calls = []
+    tmp = tempfile.NamedTemporaryFile(suffix='.mp3', delete=False)
+    tmp.close()
+
+    async def fake_extract(opts, url, download=True):
+        calls.append((url, download))
+        await asyncio.sleep(0.01)
+        if download:
+            return {OUTPUT_PATHS: [tmp.name]}
+        return {'entries': [{'webpage_url': 'https://www.youtube.com/watch?v=x'}]}
+
+    async def lookup(session, query):
+        return "Queen - Bohemian Rhapsody"
+
+    async def other_lookup(session, query):
+        return "queen bohemian rhapsody"
+
+    original = providers.ydl_extract_info
+    providers.ydl_extract_info = fake_extract
+    providers.YOUTUBE_LOOKUP_CACHE.clear()
+    try:
+        ctx = ProviderContext("Queen_Bohemian_Rhapsody")
+        runs = [providers._metadata_provider(lookup), providers._metadata_provider(other_lookup)]
+
+        async def scenario():
+            return await asyncio.gather(*(run(ctx) for run in runs))
+
+        assert asyncio.run(scenario()) == [tmp.name, tmp.name]
+        assert calls == [("ytsearch1:Queen - Bohemian Rhapsody", False), ("https://www.youtube.com/watch?v=x", True)]
+
+        # Новый запрос: поиск берется из кэша, скачивание выполняется заново
+        assert asyncio.run(runs[0](ProviderContext("Queen_Bohemian_Rhapsody"))) == tmp.name
+        assert [call for call in calls if not call[1]] == [("ytsearch1:Queen - Bohemian Rhapsody", False)]
+    finally:
+        providers.ydl_extract_info = original
+        providers.YOUTUBE_LOOKUP_CACHE.clear()
+        os.remove(tmp.name)
+    print("✅ Общий поиск YouTube для каталогов")
+
+
+def test_candidate_info_concurrent():
+    """Кандидаты разбираются параллельно с ограничением; медленные и упавшие пропускаются"""
+    import time
+    import utils
+
+    state = {'active': 0, 'peak': 0}
+
+    async def fake_extract(opts, url, download=True):
+        state['active'] += 1
+        state['peak'] = max(state['peak'], state['active'])
+        try:
+            await asyncio.sleep(10 if url == 'slow' else 0.05)
+            if url == 'broken':
+                raise RuntimeError('404')
+            return {'title': url}
+        finally:
+            state['active'] -= 1
+
+    urls = ['a', 'slow', 'b', 'broken', 'c', 'd']
+    original = utils.ydl_extract_info
+    utils.ydl_extract_info = fake_extract
+    try:
+        started = time.monotonic()
+        infos = asyncio.run(utils.extract_candidates_info(urls, concurrency=3, timeout=0.3))
+        elapsed = time.monotonic() - started
+        partial = asyncio.run(utils.extract_candidates_info(urls, enough=2, concurrency=3, timeout=0.3))
+    finally:
+        utils.ydl_extract_info = original
+    assert [url for url, _ in infos] == ['a', 'b', 'c', 'd']
+    assert state['peak'] == 3 and state['active'] == 0
+    assert elapsed < 1.5
+    assert len(partial) == 2
+    print("✅ Параллельный разбор кандидатов")
+
+
+def test_soundcloud_candidates_from_flat_search():
+    """Кандидаты SoundCloud ранжируются по одному плоскому поиску, без разбора каждого URL"""
+    import utils
+
+    calls = []
+
+    async def fake_extract(opts, url, download=True):
+        calls.append((url, opts.get('extract_flat')))
+        return {'entries': [
+            {'url': 'https://soundcloud.com/queen/bohemian-rhapsody', 'title': 'Bohemian Rhapsody',
+             'uploader': 'Queen', 'duration': 355, 'view_count': 1000},
+            {'url': 'https://soundcloud.com/dj/bohemian-rhapsody-remix', 'title': 'Bohemian Rhapsody (Remix)',
+             'uploader': 'DJ', 'duration': 200, 'view_count': 10},
+        ]}
+
+    async def scenario():
+        async with utils.EnhancedSoundCloudProvider() as sc:
+            return await sc.search_candidates('queen bohemian rhapsody', limit=10)
+
+    original = utils.ydl_extract_info
+    utils.ydl_extract_info = fake_extract
+    try:
+        candidates = asyncio.run(scenario())
+    finally:
+        utils.ydl_extract_info = original
+    assert calls == [('scsearch10:queen bohemian rhapsody', True)]
+    assert candidates[0] == {'url': 'https://soundcloud.com/queen/bohemian-rhapsody', 'title': 'Bohemian Rhapsody',
+                             'artist': 'Queen', 'duration': 355, 'view_count': 1000}
+    track = {'name': 'Bohemian Rhapsody', 'artist': 'Queen', 'duration': 355}
+    ranked = utils.ImprovedSearchEngine.filter_original_versions(candidates, track)
+    assert ranked[0]['url'].endswith('/bohemian-rhapsody')
+    print("✅ Кандидаты SoundCloud из плоского поиска")
+
+
+class _FakeResponse:
+    def __init__(self, text):
+        self._text = text
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        pass
+
+    async def text(self):
+        return self._text
+
+
+class _FakeSession:
+    def __init__(self, text):
+        self._text = text
+
+    def get(self, url, **kwargs):
+        return _FakeResponse(self._text)
+
+
+def test_bandcamp_and_jiosaavn_rank_candidates():
+    """Bandcamp и JioSaavn скачивают лучшего по скору кандидата, а не первый результат"""
+    import utils
+
+    html = """
+    <li class="searchresult track"><div class="heading">
+      <a href="https://dj.bandcamp.com/track/bohemian-rhapsody-slowed?from=search">Bohemian Rhapsody (Slowed + Reverb)</a>
+    </div><div class="subhead">from Edits by DJ</div></li>
+    <li class="searchresult track"><div class="heading">
+      <a href="https://queen.bandcamp.com/track/bohemian-rhapsody?from=search">Bohemian Rhapsody</a>
+    </div><div class="subhead">from A Night at the Opera by Queen</div></li>
+    """
+    track = {'name': 'Bohemian Rhapsody', 'artist': 'Queen', 'duration': 355}
+
+    async def bandcamp():
+        provider = utils.BandcampProvider()
+        provider.session = _FakeSession(html)
+        return await provider.search_candidates('queen bohemian rhapsody')
+
+    candidates = asyncio.run(bandcamp())
+    assert candidates[1] == {'url': 'https://queen.bandcamp.com/track/bohemian-rhapsody',
+                             'title': 'Bohemian Rhapsody', 'artist': 'Queen'}
+    assert utils.ImprovedSearchEngine.filter_original_versions(candidates, track)[0] is candidates[1]
+
+    downloaded = []
+
+    async def saavn():
+        provider = utils.JioSaavnProvider()
+
+        async def search(query, limit=5):
+            return [{'id': '1', 'title': 'Bohemian Rhapsody (Remix)', 'artist': 'DJ', 'duration': 200},
+                    {'id': '2', 'title': 'Bohemian Rhapsody', 'artist': 'Queen', 'duration': 355}]
+
+        async def download_song(candidate):
+            downloaded.append(candidate['id'])
+            return '/tmp/song.mp3'
+
+        provider.search = search
+        provider.download_song = download_song
+        return await provider.download_best('queen bohemian rhapsody', track)
+
+    assert asyncio.run(saavn()) == '/tmp/song.mp3'
+    assert downloaded == ['2']
+    print("✅ Ранжирование кандидатов Bandcamp и JioSaavn")
+
+
+if __name__ == "__main__":
+    test_registry_covers_chain()
+    test_config_overrides()
+    test_unreached_providers_disabled()
+    test_load_config_from_env()
+    test_context_variants()
+    test_search_stops_on_confident_match()
+    test_search_reports_no_results_only_when_clean()
+    test_metadata_youtube_lookup_memoized()
+    test_candidate_info_concurrent()
+    test_soundcloud_candidates_from_flat_search()
+    test_bandcamp_and_jiosaavn_rank_candidates()
+    print("🎯 Тест завершен!")
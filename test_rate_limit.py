@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Тест ограничения частоты запросов по хостам (rate_limit.py)
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+# Добавляем текущую директорию в путь
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from rate_limit import HostRateLimiter, host_of, parse_rate
+
+
+def test_rules_and_hosts():
+    """Правила действуют на поддомены, поисковые префиксы yt-dlp распознаются"""
+    limiter = HostRateLimiter({'youtube.com': (2, 1.0)}, default=(5, 1.0))
+    assert limiter.rule_for('music.youtube.com') == ('youtube.com', (2, 1.0))
+    assert limiter.rule_for('www.deezer.com') == ('deezer.com', (5, 1.0))
+    assert host_of('ytsearch5:Queen Bohemian Rhapsody') == 'youtube.com'
+    assert host_of('https://soundcloud.com/artist/track') == 'soundcloud.com'
+    assert parse_rate('3/2') == (3, 2.0) and parse_rate('4') == (4, 1.0)
+    print("✅ Правила лимитов")
+
+
+def test_limits_per_host():
+    """Один хост ждет окна, другой хост не ждет"""
+    limiter = HostRateLimiter({'slow.example': (1, 0.3)}, default=(100, 1.0))
+
+    async def scenario():
+        start = time.monotonic()
+        await limiter.acquire('https://slow.example/a')
+        for _ in range(5):
+            await limiter.acquire('https://fast.example/x')
+        fast_elapsed = time.monotonic() - start
+        await limiter.acquire('https://api.slow.example/b')
+        return fast_elapsed, time.monotonic() - start
+
+    fast_elapsed, slow_elapsed = asyncio.run(scenario())
+    assert fast_elapsed < 0.1
+    assert slow_elapsed >= 0.3
+    print("✅ Лимиты по хостам")
+
+
+def test_separate_keys():
+    """Отдельные ключи (например, чаты) не делят окно между собой"""
+    limiter = HostRateLimiter({'api.telegram.org': (1, 1.0)})
+
+    async def scenario():
+        start = time.monotonic()
+        await limiter.acquire('api.telegram.org', key='telegram:1')
+        await limiter.acquire('api.telegram.org', key='telegram:2')
+        return time.monotonic() - start
+
+    assert asyncio.run(scenario()) < 0.1
+    print("✅ Отдельные окна по ключу")
+
+
+def test_idle_windows_evicted():
+    """Окна чатов без недавних запросов удаляются, активные остаются"""
+    limiter = HostRateLimiter({'api.telegram.org': (1, 0.05)}, max_windows=3)
+
+    async def scenario():
+        for chat_id in range(3):
+            await limiter.acquire('api.telegram.org', key=f'telegram:{chat_id}')
+        await asyncio.sleep(0.1)
+        await limiter.acquire('api.telegram.org', key='telegram:2')
+        await limiter.acquire('api.telegram.org', key='telegram:3')
+
+    asyncio.run(scenario())
+    assert set(limiter._throttlers) == {'telegram:2', 'telegram:3'}
+    print("✅ Простаивающие окна удаляются")
+
+
+if __name__ == "__main__":
+    test_rules_and_hosts()
+    test_limits_per_host()
+    test_separate_keys()
+    test_idle_windows_evicted()
+    print("🎯 Тест завершен!")
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Тест постоянного хранилища (storage.py) на SQLite
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+
+# Добавляем текущую директорию в путь
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from provider_stats import DECAY, ProviderStats
+from storage import SqliteStorage, _pg_placeholders, open_storage
+
+
+def test_resolutions():
+    """Новые поля дополняют запись, пустые не затирают известные; file_id можно стереть"""
+    async def run():
+        with tempfile.TemporaryDirectory() as directory:
+            storage = await SqliteStorage.connect(os.path.join(directory, 'state.db'))
+            assert await storage.get_resolution('track1', 'mp3-192k') is None
+
+            await storage.save_resolution('track1', 'mp3-192k', provider='youtube',
+                                          source_url='https://youtu.be/x', duration=215.0, score=120)
+            await storage.save_resolution('track1', 'mp3-192k', file_id='BQACAgIAAxkBAAI', caption='🎵 Song - Artist')
+            resolution = await storage.get_resolution('track1', 'mp3-192k')
+            assert resolution['provider'] == 'youtube'
+            assert resolution['source_url'] == 'https://youtu.be/x'
+            assert resolution['file_id'] == 'BQACAgIAAxkBAAI'
+            assert resolution['caption'] == '🎵 Song - Artist'
+            assert resolution['duration'] == 215.0 and resolution['score'] == 120
+            assert await storage.get_resolution('track1', 'passthrough') is None
+
+            await storage.forget_file_id('track1', 'mp3-192k')
+            resolution = await storage.get_resolution('track1', 'mp3-192k')
+            assert resolution['file_id'] is None and resolution['caption'] is None
+            assert resolution['provider'] == 'youtube'
+            await storage.close()
+    asyncio.run(run())
+    print("✅ Сохранение результатов поиска")
+
+
+def test_stats_and_jobs_survive_restart():
+    """Статистика провайдеров и история заданий переживают переподключение"""
+    async def run():
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'state.db')
+            storage = await open_storage(None, path)
+            await storage.seed_provider_stats({
+                'youtube': {'attempts': 3.0, 'successes': 2.0, 'avg_time': 4.5, 'last_success': 100.0},
+            })
+            await storage.seed_provider_stats({
+                'youtube': {'attempts': 9.0, 'successes': 9.0, 'avg_time': 1.0, 'last_success': 300.0},
+                'soundcloud': {'attempts': 1.0, 'successes': 0.0, 'avg_time': 9.0, 'last_success': 0.0},
+            })
+            await storage.record_job('track', 'sent', track_id='track1', chat_id=42, provider='youtube', elapsed=3.2)
+            await storage.record_job('collection', 'not_found', track_id='track2', chat_id=42)
+            await storage.close()
+
+            reopened = await open_storage(None, path)
+            assert reopened.backend == 'sqlite'
+            stats = await reopened.load_provider_stats()
+            # Повторный seed не перезаписывает уже накопленную статистику
+            assert stats['youtube'] == {'attempts': 3.0, 'successes': 2.0, 'avg_time': 4.5, 'last_success': 100.0}
+            assert set(stats) == {'youtube', 'soundcloud'}
+
+            jobs = await reopened.recent_jobs()
+            assert [job['track_id'] for job in jobs] == ['track2', 'track1']
+            assert jobs[1]['provider'] == 'youtube' and jobs[1]['chat_id'] == 42
+            await reopened.close()
+    asyncio.run(run())
+    print("✅ Статистика и история заданий")
+
+
+def test_provider_attempts_add_up():
+    """Попытки двух экземпляров бота складываются в общей статистике, а не затирают друг друга"""
+    async def run():
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'state.db')
+            first = await SqliteStorage.connect(path)
+            second = await SqliteStorage.connect(path)
+
+            local_a, local_b = ProviderStats(), ProviderStats()
+            local_a.record('youtube', True, 2.0)
+            local_b.record('youtube', False, 6.0)
+            local_b.record('soundcloud', True, 3.0)
+            await first.record_provider_attempts(local_a.drain_pending())
+            await second.record_provider_attempts(local_b.drain_pending())
+            assert local_a.drain_pending() == []
+
+            stats = await first.load_provider_stats()
+            assert abs(stats['youtube']['attempts'] - (DECAY + 1)) < 1e-9
+            assert abs(stats['youtube']['successes'] - DECAY) < 1e-9
+            assert stats['youtube']['last_success'] > 0
+            assert stats['soundcloud']['successes'] == 1.0
+
+            local_a.merge(stats)
+            assert local_a.get('youtube') == stats['youtube']
+            await first.close()
+            await second.close()
+    asyncio.run(run())
+    print("✅ Попытки разных экземпляров складываются")
+
+
+def test_postgres_placeholders():
+    """Плейсхолдеры "?" переводятся в нумерованные для asyncpg"""
+    assert _pg_placeholders('SELECT * FROM t WHERE a = ? AND b = ?') == 'SELECT * FROM t WHERE a = $1 AND b = $2'
+    print("✅ Плейсхолдеры PostgreSQL")
+
+
+if __name__ == "__main__":
+    test_resolutions()
+    test_stats_and_jobs_survive_restart()
+    test_provider_attempts_add_up()
+    test_postgres_placeholders()
+    print("🎯 Тест завершен!")
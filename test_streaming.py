@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Тест потокового скачивания в ffmpeg (streaming.py)
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+
+# Добавляем текущую директорию в путь
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from aiohttp import ClientSession, web
+
+from ffmpeg_service import FFMPEG
+from streaming import StreamError, stream_transcode, streamable_format
+
+PAYLOAD = os.urandom(512 * 1024)
+
+# Вместо ffmpeg: копирует stdin в выходной файл
+COPY_SCRIPT = "import shutil, sys; shutil.copyfileobj(sys.stdin.buffer, open(sys.argv[1], 'wb'))"
+
+
+def _copy_command(dest):
+    return [sys.executable, '-c', COPY_SCRIPT, dest]
+
+
+def _failing_command(dest):
+    return [sys.executable, '-c', "import sys; sys.stderr.write('Invalid data found'); sys.exit(1)", dest]
+
+
+def _run(command, first_byte_delay=0.0, running_before_bytes=None):
+    async def handler(request):
+        response = web.StreamResponse()
+        await response.prepare(request)
+        if first_byte_delay:
+            await asyncio.sleep(first_byte_delay)
+            running_before_bytes.append(FFMPEG.running)
+        for start in range(0, len(PAYLOAD), 64 * 1024):
+            await response.write(PAYLOAD[start:start + 64 * 1024])
+            await asyncio.sleep(0.005)
+        return response
+
+    async def scenario():
+        app = web.Application()
+        app.router.add_get('/track', handler)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        try:
+            with tempfile.TemporaryDirectory() as tmp:
+                dest = os.path.join(tmp, 'track.mp3')
+                error = None
+                try:
+                    async with ClientSession() as session:
+                        await stream_transcode(session, f"http://127.0.0.1:{port}/track", dest, command=command)
+                except StreamError as e:
+                    error = e
+                data = open(dest, 'rb').read() if os.path.exists(dest) else None
+                return data, error, os.listdir(tmp)
+        finally:
+            await runner.cleanup()
+
+    return asyncio.run(scenario())
+
+
+def test_bytes_are_piped_into_encoder():
+    """Байты из HTTP-ответа передаются в процесс кодирования, результат — итоговый файл"""
+    jobs = FFMPEG.jobs
+    data, error, files = _run(_copy_command)
+    assert error is None
+    # Потоковое кодирование учитывается в метриках сервиса ffmpeg
+    assert FFMPEG.jobs == jobs + 1
+    assert data == PAYLOAD
+    assert files == ['track.mp3']
+    print("✅ Загрузка идет прямо в кодировщик")
+
+
+def test_encoder_failure_leaves_nothing():
+    """Ошибка ffmpeg — исключение с его stderr, недописанный файл удаляется"""
+    jobs, failed = FFMPEG.jobs, FFMPEG.failed
+    data, error, files = _run(_failing_command)
+    assert isinstance(error, StreamError) and 'Invalid data found' in str(error)
+    assert FFMPEG.jobs == jobs + 1 and FFMPEG.failed == failed + 1
+    assert data is None and files == []
+    print("✅ Ошибка кодирования")
+
+
+def test_streamable_format():
+    """Потоком скачиваются только одиночные HTTP-форматы"""
+    http = {'url': 'https://cdn/x.webm', 'protocol': 'https', 'vcodec': 'none', 'ext': 'webm'}
+    assert streamable_format(http) is http
+    assert streamable_format(dict(http, protocol='m3u8_native')) is None
+    assert streamable_format({'requested_formats': [http, http]}) is None
+    assert streamable_format({'entries': [http]}) is None
+    assert streamable_format(dict(http, vcodec='avc1'), audio_only=True) is None
+    assert streamable_format(dict(http, vcodec='avc1')) is not None
+    print("✅ Выбор формата для потоковой загрузки")
+
+
+def test_slot_taken_once_bytes_flow():
+    """Пока сервер не прислал ни байта, слот ffmpeg не занят"""
+    running = []
+    data, error, _ = _run(_copy_command, first_byte_delay=0.3, running_before_bytes=running)
+    assert error is None and data == PAYLOAD
+    assert running == [0]
+    print("✅ Слот ffmpeg только после первых байт")
+
+
+if __name__ == "__main__":
+    test_bytes_are_piped_into_encoder()
+    test_encoder_failure_leaves_nothing()
+    test_slot_taken_once_bytes_flow()
+    test_streamable_format()
+    print("🎯 Тест завершен!")
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Тест пресетов yt-dlp и кэша YoutubeDL (ydl_presets.py)
+"""
+
+import os
+import sys
+import tempfile
+
+# Добавляем текущую директорию в путь
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from ydl_presets import (
+    OUTPUT_PATHS, YDL_PRESETS, cached_ydl, cached_ydl_count, extract_info, job_outtmpl, ydl_preset, with_user_agent,
+)
+from utils import _socket_timeout
+
+
+def test_presets_are_copies():
+    """Пресет выдается копией: изменения вызывающего не портят реестр"""
+    opts = ydl_preset('download-mp3', max_filesize=10)
+    opts['postprocessors'][0]['preferredquality'] = '64'
+    assert opts['max_filesize'] == 10
+    assert YDL_PRESETS['download-mp3']['postprocessors'][0]['preferredquality'] == '192'
+    assert 'max_filesize' not in YDL_PRESETS['download-mp3']
+
+    youtube = with_user_agent(ydl_preset('youtube'), 'test-agent')
+    assert youtube['http_headers']['User-Agent'] == 'test-agent'
+    assert youtube['http_headers']['DNT'] == '1'
+    assert YDL_PRESETS['youtube']['http_headers']['User-Agent'] != 'test-agent'
+
+    try:
+        ydl_preset('no-such-preset')
+        raise AssertionError('ValueError expected')
+    except ValueError:
+        pass
+    print("✅ Пресеты и переопределения")
+
+
+def test_ydl_instances_are_reused():
+    """Для одинаковых опций возвращается тот же YoutubeDL, progress hooks в ключ не входят"""
+    before = cached_ydl_count()
+    first = cached_ydl(ydl_preset('search-flat'))
+    second = cached_ydl(dict(ydl_preset('search-flat'), progress_hooks=[lambda d: None]))
+    other = cached_ydl(ydl_preset('search-flat', socket_timeout=5.0))
+    assert first is second
+    assert other is not first
+    assert cached_ydl_count() == before + 2
+    print("✅ Теплые экземпляры YoutubeDL")
+
+
+def test_socket_timeout_is_quantized():
+    """Таймаут сокета округляется, чтобы опции (и ключ кэша) повторялись"""
+    assert _socket_timeout(20.0, 300) == 20.0
+    assert _socket_timeout(20.0, 12.3) == 15.0
+    assert _socket_timeout(20.0, 11.9) == 15.0
+    assert _socket_timeout(20.0, 0.4) == 5.0
+    assert _socket_timeout(20.0, 19.5) == 20.0
+    print("✅ Округление таймаута сокета")
+
+
+def test_output_paths_from_post_hook():
+    """Каждая загрузка пишет в свой файл, путь возвращается в info['output_paths']"""
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, 'song.mp3')
+        with open(source, 'wb') as f:
+            f.write(os.urandom(5000))
+        url = 'file://' + source
+        opts = ydl_preset('download-passthrough', enable_file_urls=True)
+
+        first = extract_info(dict(opts, outtmpl=job_outtmpl(directory)), url, download=True)
+        count = cached_ydl_count()
+        second = extract_info(dict(opts, outtmpl=job_outtmpl(directory)), url, download=True)
+        # Шаблон имени не входит в ключ кэша: тот же YoutubeDL
+        assert cached_ydl_count() == count
+
+        first_path, = first[OUTPUT_PATHS]
+        second_path, = second[OUTPUT_PATHS]
+        assert first_path != second_path
+        assert os.path.dirname(first_path) == directory
+        assert os.path.getsize(first_path) == os.path.getsize(second_path) == 5000
+
+        info = extract_info(opts, url, download=False)
+        assert OUTPUT_PATHS not in info
+    print("✅ Пути файлов из post hook")
+
+
+if __name__ == "__main__":
+    test_presets_are_copies()
+    test_ydl_instances_are_reused()
+    test_socket_timeout_is_quantized()
+    test_output_paths_from_post_hook()
+    print("🎯 Тест завершен!")
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Тест пула процессов yt-dlp (ytdlp_pool.py)
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+# Добавляем текущую директорию в путь
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from ytdlp_pool import WorkerError, WorkerTimeout, YtdlpWorkerPool
+
+
+def echo_job(opts, url, download):
+    """Задание для теста: выполняется в процессе пула"""
+    if url == 'hang':
+        time.sleep(60)
+    if url == 'fail':
+        raise ValueError('no video formats found')
+    print('noise on stdout must not break the protocol')
+    return {'pid': os.getpid(), 'url': url, 'download': download, 'opts': opts}
+
+
+def test_jobs_run_in_warm_workers():
+    """Задания выполняются в отдельном процессе, процесс переиспользуется"""
+    pool = YtdlpWorkerPool(size=1, job_timeout=30, handler='test_ytdlp_pool:echo_job')
+
+    async def scenario():
+        first = await pool.run({'format': 'bestaudio'}, 'ytsearch1:song', False)
+        second = await pool.run({}, 'https://example.com/x', True)
+        await pool.close()
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first['pid'] != os.getpid()
+    assert first['pid'] == second['pid']
+    assert first['opts'] == {'format': 'bestaudio'} and second['download'] is True
+    print("✅ Теплые процессы")
+
+
+def test_hung_job_is_killed():
+    """Зависшее задание убивается по таймауту, ошибки возвращаются, пул продолжает работать"""
+    pool = YtdlpWorkerPool(size=1, job_timeout=30, handler='test_ytdlp_pool:echo_job')
+
+    async def scenario():
+        started = time.monotonic()
+        try:
+            await pool.run({}, 'hang', False, timeout=1)
+            raise AssertionError('timeout expected')
+        except WorkerTimeout:
+            pass
+        elapsed = time.monotonic() - started
+        try:
+            await pool.run({}, 'fail', False)
+            raise AssertionError('error expected')
+        except WorkerError as e:
+            assert e.error_type == 'ValueError'
+        result = await pool.run({}, 'after', False)
+        await pool.close()
+        return elapsed, result
+
+    elapsed, result = asyncio.run(scenario())
+    assert elapsed < 10
+    assert result['url'] == 'after'
+    assert pool.stats()['killed'] == 1
+    print("✅ Сторож убивает зависший процесс")
+
+
+def test_waiting_for_worker_counts_against_timeout():
+    """Ожидание свободного процесса входит в лимит времени задания"""
+    pool = YtdlpWorkerPool(size=1, job_timeout=30, handler='test_ytdlp_pool:echo_job')
+
+    async def scenario():
+        busy = asyncio.ensure_future(pool.run({}, 'hang', False, timeout=10))
+        await asyncio.sleep(0.5)
+        started = time.monotonic()
+        try:
+            await pool.run({}, 'queued', False, timeout=0.5)
+            raise AssertionError('timeout expected')
+        except WorkerTimeout:
+            pass
+        elapsed = time.monotonic() - started
+        busy.cancel()
+        try:
+            await busy
+        except asyncio.CancelledError:
+            pass
+        await pool.close()
+        return elapsed
+
+    assert asyncio.run(scenario()) < 2
+    print("✅ Очередь к процессам входит в таймаут")
+
+
+if __name__ == "__main__":
+    test_jobs_run_in_warm_workers()
+    test_hung_job_is_killed()
+    test_waiting_for_worker_counts_against_timeout()
+    print("🎯 Тест завершен!")
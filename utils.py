@@ -6,7 +6,7 @@ import aiohttp
 import spotipy
 from spotipy.oauth2 import SpotifyClientCredentials
 import os
-from typing import Tuple
+from typing import Set, Tuple
 import logging
 logger = logging.getLogger(__name__)
 from urllib.parse import quote
@@ -14,30 +14,387 @@ try:
     from rapidfuzz import fuzz
 except ImportError:
     import difflib
-    def fuzz(a, b):
-        return int(difflib.SequenceMatcher(None, a, b).ratio() * 100)
+
+    class fuzz:
+        """Минимальная замена rapidfuzz.fuzz на difflib"""
+
+        @staticmethod
+        def ratio(a, b):
+            return int(difflib.SequenceMatcher(None, a, b).ratio() * 100)
+
+        @staticmethod
+        def partial_ratio(a, b):
+            short, long = (a, b) if len(a) <= len(b) else (b, a)
+            if not short:
+                return 0
+            if short in long:
+                return 100
+            blocks = difflib.SequenceMatcher(None, short, long).get_matching_blocks()
+            return max(
+                fuzz.ratio(short, long[max(0, j - i):max(0, j - i) + len(short)])
+                for i, j, _ in blocks
+            )
 from unicodedata import normalize
 try:
     from unidecode import unidecode  # если есть
 except ImportError:
     unidecode = None
 from bs4 import BeautifulSoup
+import contextvars
+import hashlib
+import json
+import shutil
+import tempfile
+import threading
+import math
+import time
+import uuid
+from contextlib import contextmanager
 import yt_dlp  # нужно для корректного использования
+from rate_limit import RATE_LIMITER
+from executors import run_io
+from downloader import download_url
+from ytdlp_pool import YTDLP_POOL
+from ydl_presets import (
+    DOWNLOAD_DIR, LOWQ_USER_AGENTS, OUTPUT_PATHS, YdlOpts, extract_info, job_outtmpl, resolve_opts, ydl_preset, with_user_agent,
+)
+
+# Токен отмены текущей попытки провайдера. Выставляется движком гонки (pipeline.py)
+# для каждой задачи отдельно, чтобы проигравшие провайдеры прерывали загрузку.
+cancel_token_var: contextvars.ContextVar[Optional[threading.Event]] = contextvars.ContextVar(
+    'cancel_token', default=None
+)
+
+# Дедлайн текущего запроса (по time.monotonic()). Выставляется через request_budget
+# в MusicDownloader.search_and_download; все сетевые вызовы провайдеров получают
+# не больше оставшегося времени.
+request_deadline_var: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar(
+    'request_deadline', default=None
+)
+
+# Рабочая папка текущего задания (job_workdir): провайдеры пишут файлы только в нее
+job_dir_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar('job_dir', default=None)
+
+# Имя рабочей папки: <sha1 ключа, 12 символов>-<8 случайных символов>
+_JOB_DIR_NAME = re.compile(r'^[0-9a-f]{12}-[0-9a-f]{8}$')
+
+# Папки заданий, которые сейчас выполняются: уборщик (janitor.py) их не трогает
+_active_workdirs: Set[str] = set()
+
+# Таймаут сокета yt-dlp по умолчанию (как в самом yt-dlp)
+YTDLP_SOCKET_TIMEOUT = 20.0
+# Шаг округления таймаута сокета (секунды)
+SOCKET_TIMEOUT_STEP = 5
+
+
+@contextmanager
+def request_budget(seconds: Optional[float]):
+    """Ограничивает все вызовы провайдеров внутри блока общим бюджетом времени"""
+    token = request_deadline_var.set(time.monotonic() + seconds if seconds else None)
+    try:
+        yield
+    finally:
+        request_deadline_var.reset(token)
+
+
+@contextmanager
+def job_workdir(key: str, root: str = DOWNLOAD_DIR):
+    """Отдельная папка root/<хэш> на одно задание (трек): все провайдеры внутри блока
+    пишут только туда, и при выходе она удаляется вместе с содержимым — в том
+    числе с файлами проигравших в гонке провайдеров и при ошибке.
+
+    Случайный суффикс разводит одновременные задания с одинаковым ключом.
+    """
+    path = os.path.join(root, f"{hashlib.sha1(key.encode('utf-8')).hexdigest()[:12]}-{uuid.uuid4().hex[:8]}")
+    os.makedirs(path)
+    _active_workdirs.add(path)
+    token = job_dir_var.set(path)
+    try:
+        yield path
+    finally:
+        job_dir_var.reset(token)
+        shutil.rmtree(path, ignore_errors=True)
+        _active_workdirs.discard(path)
+
+
+def job_dir() -> str:
+    """Папка для файлов текущего задания (вне job_workdir — общая папка загрузок)"""
+    path = job_dir_var.get()
+    if path is None:
+        os.makedirs(DOWNLOAD_DIR, exist_ok=True)
+        return DOWNLOAD_DIR
+    return path
+
+
+def remove_stale_workdirs(root: str = DOWNLOAD_DIR, max_age: Optional[float] = None) -> int:
+    """Удаляет рабочие папки, оставшиеся от прошлого запуска (бот упал посреди задания).
+
+    max_age — удалять только папки старше max_age секунд (уборка на ходу);
+    папки выполняющихся заданий не удаляются никогда.
+    """
+    if not os.path.isdir(root):
+        return 0
+    removed = 0
+    now = time.time()
+    for entry in os.scandir(root):
+        if not entry.is_dir() or not _JOB_DIR_NAME.match(entry.name) or entry.path in _active_workdirs:
+            continue
+        if max_age is not None and now - entry.stat().st_mtime < max_age:
+            continue
+        shutil.rmtree(entry.path, ignore_errors=True)
+        removed += 1
+    return removed
+
+
+def budget_remaining() -> Optional[float]:
+    """Сколько секунд осталось у текущего запроса (None — без ограничения)"""
+    deadline = request_deadline_var.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def budget_timeout(seconds: float) -> aiohttp.ClientTimeout:
+    """Таймаут aiohttp-запроса, урезанный до оставшегося бюджета запроса"""
+    remaining = budget_remaining()
+    if remaining is not None:
+        # total=0 в aiohttp означает "без таймаута", поэтому не меньше 10 мс
+        seconds = max(0.01, min(seconds, remaining))
+    return aiohttp.ClientTimeout(total=seconds)
+
+
+def throttled_session(**kwargs) -> aiohttp.ClientSession:
+    """aiohttp-сессия, запросы которой ограничены лимитами хостов (rate_limit.py)"""
+    kwargs['trace_configs'] = list(kwargs.get('trace_configs') or []) + [RATE_LIMITER.trace_config()]
+    return aiohttp.ClientSession(**kwargs)
+
+
+def atomic_write_json(path: str, obj, **dump_kwargs):
+    """Атомарно записывает obj в JSON-файл path.
+
+    Данные пишутся в уникальный временный файл в той же папке, сбрасываются
+    на диск (fsync) и подменяют path через os.replace: читатель видит либо
+    старый, либо новый файл целиком, а одновременные записи не мешают друг
+    другу. Ошибки ввода-вывода (OSError) пробрасываются вызывающему.
+    """
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(obj, f, **dump_kwargs)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+class TTLCache:
+    """Небольшой кэш в памяти с временем жизни записей (None тоже кэшируется)"""
+
+    MISSING = object()
+
+    def __init__(self, ttl: float, max_size: int = 512, clock=time.monotonic):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.clock = clock
+        self._data: Dict = {}
+
+    def get(self, key, default=MISSING):
+        item = self._data.get(key)
+        if item is None:
+            return default
+        expires_at, value = item
+        if self.clock() >= expires_at:
+            del self._data[key]
+            return default
+        return value
+
+    def set(self, key, value):
+        if self.ttl <= 0:
+            return
+        if len(self._data) >= self.max_size and key not in self._data:
+            # Выбрасываем самую старую запись (dict хранит порядок вставки)
+            self._data.pop(next(iter(self._data)))
+        self._data[key] = (self.clock() + self.ttl, value)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+def _cancel_hook(token: Optional[threading.Event], deadline: Optional[float]):
+    """progress hook для yt-dlp: прерывает загрузку, если попытка отменена или бюджет исчерпан"""
+    def hook(status: Dict):
+        if token is not None and token.is_set():
+            raise yt_dlp.utils.DownloadCancelled('Provider attempt cancelled')
+        if deadline is not None and time.monotonic() > deadline:
+            raise yt_dlp.utils.DownloadCancelled('Request budget exhausted')
+    return hook
+
+
+async def ydl_extract_info(ydl_opts: YdlOpts, url: str, download: bool = True) -> Optional[Dict]:
+    """Выполняет yt-dlp extract_info, не блокируя event loop.
+
+    ydl_opts — имя пресета из ydl_presets или словарь опций. Если включен
+    пул процессов (ytdlp_pool.YTDLP_POOL), задание уходит в теплый процесс:
+    лимит времени — остаток бюджета, отмена задачи убивает процесс. Иначе
+    yt-dlp работает в IO-пуле потоков на закэшированном YoutubeDL, и загрузка
+    прерывается на ближайшем progress hook после отмены/исчерпания бюджета.
+    Таймаут сокета в обоих случаях не превышает оставшийся бюджет.
+    """
+    token = cancel_token_var.get()
+    deadline = request_deadline_var.get()
+    opts = resolve_opts(ydl_opts)
+    if download and not opts.get('outtmpl'):
+        # Свой шаблон имени на каждую загрузку; путь файла вернется в info['output_paths']
+        opts['outtmpl'] = job_outtmpl(job_dir())
+    if deadline is not None:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        opts['socket_timeout'] = _socket_timeout(opts.get('socket_timeout') or YTDLP_SOCKET_TIMEOUT, remaining)
+
+    # Слот у лимитера хоста вместо sleep_interval в настройках yt-dlp
+    await RATE_LIMITER.acquire(url)
+
+    if YTDLP_POOL is not None:
+        if token is not None and token.is_set():
+            return None
+        remaining = deadline - time.monotonic() if deadline is not None else None
+        if remaining is not None and remaining <= 0:
+            return None
+        # progress hook в другой процесс не передать: отмену и бюджет обеспечивает убийство процесса
+        pool_opts = {key: value for key, value in opts.items() if key != 'progress_hooks'}
+        return await YTDLP_POOL.run(pool_opts, url, download, timeout=remaining)
+
+    hooks = [_cancel_hook(token, deadline)] if token is not None or deadline is not None else []
+
+    def _run() -> Optional[Dict]:
+        if token is not None and token.is_set():
+            return None
+        if deadline is not None and time.monotonic() > deadline:
+            return None
+        return extract_info(opts, url, download, hooks)
+
+    return await run_io(_run)
+
+
+def _socket_timeout(default: float, remaining: float) -> float:
+    """Таймаут сокета не больше остатка бюджета, округленный вверх до SOCKET_TIMEOUT_STEP.
+
+    Без округления опции отличались бы на каждом вызове, и закэшированный
+    YoutubeDL (ydl_presets.cached_ydl) никогда бы не переиспользовался.
+    """
+    if remaining >= default:
+        return default
+    return float(min(default, SOCKET_TIMEOUT_STEP * max(1, math.ceil(remaining / SOCKET_TIMEOUT_STEP))))
+
+
+def entry_candidate(entry: Dict) -> Optional[Dict]:
+    """Кандидат из записи поиска yt-dlp"""
+    url = entry.get('webpage_url') or entry.get('url')
+    if not url:
+        return None
+    return {
+        'url': url,
+        'title': entry.get('title') or '',
+        'artist': entry.get('uploader') or entry.get('channel') or '',
+        'duration': entry.get('duration') or 0,
+        'view_count': entry.get('view_count') or 0,
+    }
+
+
+async def flat_search_candidates(ydl_opts: YdlOpts, search: str) -> List[Dict]:
+    """Кандидаты из одного плоского поиска yt-dlp ("scsearch10:...", "ytsearch5:...").
+
+    Плоский ответ уже содержит название, длительность и просмотры, поэтому
+    кандидатов можно ранжировать без extract_info по каждому URL; полная
+    информация нужна только победителю (ее получает скачивание).
+    """
+    opts = dict(resolve_opts(ydl_opts), extract_flat=True)
+    result = await ydl_extract_info(opts, search, download=False)
+    entries = [e for e in ((result or {}).get('entries') or []) if e]
+    return [c for c in (entry_candidate(e) for e in entries) if c]
+
+
+# Разбор кандидатов (extract_info без скачивания): сколько URL одновременно,
+# сколько ждать один URL и сколько кандидатов достаточно для выбора
+CANDIDATE_INFO_CONCURRENCY = int(os.getenv('CANDIDATE_INFO_CONCURRENCY', '5'))
+CANDIDATE_INFO_TIMEOUT = float(os.getenv('CANDIDATE_INFO_TIMEOUT', '15'))
+CANDIDATE_INFO_ENOUGH = int(os.getenv('CANDIDATE_INFO_ENOUGH', '5'))
+
+
+async def extract_candidates_info(urls: List[str], enough: Optional[int] = None,
+                                  concurrency: int = CANDIDATE_INFO_CONCURRENCY,
+                                  timeout: float = CANDIDATE_INFO_TIMEOUT,
+                                  ydl_opts: YdlOpts = 'search-flat') -> List[Tuple[str, Dict]]:
+    """Параллельно получает info для URL кандидатов.
+
+    Одновременно разбирается не больше concurrency URL, каждый ждем не
+    дольше timeout (и не дольше остатка бюджета). Медленные и упавшие URL
+    пропускаются; как только готово enough кандидатов, остальные задачи
+    отменяются. Возвращает пары (url, info) в исходном порядке urls.
+    """
+    urls = list(dict.fromkeys(u for u in urls if u))
+    if not urls:
+        return []
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def fetch(url: str) -> Optional[Dict]:
+        async with semaphore:
+            remaining = budget_remaining()
+            limit = timeout if remaining is None else max(0.01, min(timeout, remaining))
+            try:
+                return await asyncio.wait_for(ydl_extract_info(ydl_opts, url, download=False), limit)
+            except asyncio.TimeoutError:
+                logger.warning(f"Candidate info timed out after {limit:.1f}s: {url}")
+            except Exception as e:
+                logger.warning(f"Failed to get info for {url}: {e}")
+            return None
+
+    tasks = {asyncio.ensure_future(fetch(url)): url for url in urls}
+    results: Dict[str, Dict] = {}
+    pending = set(tasks)
+    try:
+        while pending and (enough is None or len(results) < enough):
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                info = task.result()
+                if info:
+                    results[tasks[task]] = info
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+    return [(url, results[url]) for url in urls if url in results]
+
+
+def find_downloaded_file(info: Optional[Dict]) -> Optional[str]:
+    """Файл, скачанный yt-dlp для info: путь из post hook, уже после постобработки"""
+    if not info:
+        return None
+    for path in info.get(OUTPUT_PATHS) or []:
+        if os.path.exists(path):
+            return path
+    return None
+
+# Лимит на скачивание одного файла (как total по умолчанию в aiohttp)
+DOWNLOAD_TIMEOUT = 300
+
 
 async def _download_file(session: aiohttp.ClientSession, url: str, dest_path: str) -> Optional[str]:
-    """Скачивает файл по URL в указанный путь"""
+    """Скачивает файл по URL в указанный путь (параллельными Range-отрезками, если сервер умеет)"""
     try:
-        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
-        async with session.get(url) as resp:
-            if resp.status != 200:
-                return None
-            with open(dest_path, 'wb') as f:
-                while True:
-                    chunk = await resp.content.read(8192)
-                    if not chunk:
-                        break
-                    f.write(chunk)
-        return dest_path
+        return await download_url(session, url, dest_path, timeout=budget_timeout(DOWNLOAD_TIMEOUT))
     except Exception:
         return None
 
@@ -64,7 +421,7 @@ class EnhancedSpotifyParser:
         """Разрешает короткие ссылки Spotify"""
         if 'spotify.link' in url or 'spoti.fi' in url:
             try:
-                async with aiohttp.ClientSession() as session:
+                async with throttled_session() as session:
                     async with session.get(url, allow_redirects=True) as response:
                         if response.status == 200:
                             return str(response.url)
@@ -117,7 +474,7 @@ class EnhancedSpotifyParser:
             return None
             
         try:
-            track = self.sp.track(track_id)
+            track = await run_io(self.sp.track, track_id)
             return {
                 'id': track['id'],
                 'name': track['name'],
@@ -144,16 +501,16 @@ class EnhancedSpotifyParser:
             return None
             
         try:
-            playlist = self.sp.playlist(playlist_id)
+            playlist = await run_io(self.sp.playlist, playlist_id)
             tracks = []
             
             # Получаем все треки из плейлиста
-            results = self.sp.playlist_tracks(playlist_id)
+            results = await run_io(self.sp.playlist_tracks, playlist_id)
             tracks.extend(results['items'])
             
             # Если есть следующая страница, загружаем её
             while results['next']:
-                results = self.sp.next(results)
+                results = await run_io(self.sp.next, results)
                 tracks.extend(results['items'])
             
             track_list = []
@@ -191,7 +548,7 @@ class EnhancedSpotifyParser:
             return None
             
         try:
-            album = self.sp.album(album_id)
+            album = await run_io(self.sp.album, album_id)
             tracks = []
             
             for track in album['tracks']['items']:
@@ -246,7 +603,7 @@ class MusicSearchEngine:
         self.session = None
     
     async def __aenter__(self):
-        self.session = aiohttp.ClientSession()
+        self.session = throttled_session()
         return self
     
     async def __aexit__(self, exc_type, exc_val, exc_tb):
@@ -258,34 +615,24 @@ class MusicSearchEngine:
         try:
             # Здесь можно добавить интеграцию с YouTube API
             # Пока используем yt-dlp для поиска
-            import yt_dlp
+            ydl_opts = 'search-flat'
             
-            ydl_opts = {
-                'quiet': True,
-                'no_warnings': True,
-                'extract_flat': True,
-            }
+            search_results = await ydl_extract_info(ydl_opts, f"ytsearch{max_results}:{query}", download=False)
             
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                search_results = ydl.extract_info(
-                    f"ytsearch{max_results}:{query}",
-                    download=False
-                )
-                
-                if not search_results or 'entries' not in search_results:
-                    return []
-                
-                results = []
-                for entry in search_results['entries']:
-                    if entry:
-                        results.append({
-                            'title': entry.get('title', ''),
-                            'url': entry.get('url', ''),
-                            'duration': entry.get('duration', 0),
-                            'view_count': entry.get('view_count', 0)
-                        })
-                
-                return results
+            if not search_results or 'entries' not in search_results:
+                return []
+            
+            results = []
+            for entry in search_results['entries']:
+                if entry:
+                    results.append({
+                        'title': entry.get('title', ''),
+                        'url': entry.get('url', ''),
+                        'duration': entry.get('duration', 0),
+                        'view_count': entry.get('view_count', 0)
+                    })
+            
+            return results
                 
         except Exception as e:
             logger.error(f"Error searching YouTube: {e}")
@@ -383,7 +730,7 @@ class JioSaavnProvider:
         self.session: Optional[aiohttp.ClientSession] = None
 
     async def __aenter__(self):
-        self.session = aiohttp.ClientSession()
+        self.session = throttled_session()
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
@@ -391,35 +738,32 @@ class JioSaavnProvider:
             await self.session.close()
 
     async def search(self, query: str, limit: int = 5) -> List[Dict]:
-        """Ищет треки в JioSaavn по запросу"""
-        try:
-            assert self.session is not None
-            params = {"query": query}
-            async with self.session.get(f"{self.BASE}/search/songs", params=params, timeout=30) as resp:
-                if resp.status != 200:
-                    return []
-                data = await resp.json()
-                results = data.get("data", []) or []
-                songs = results[:limit]
-                parsed: List[Dict] = []
-                for s in songs:
-                    parsed.append({
-                        "id": s.get("id"),
-                        "title": s.get("name") or s.get("title"),
-                        "primaryArtists": s.get("primaryArtists", ""),
-                        "image": s.get("image"),
-                        "album": s.get("album"),
-                        "duration": int(s.get("duration", 0)) if s.get("duration") else 0
-                    })
-                return parsed
-        except Exception:
-            return []
+        """Ищет треки в JioSaavn по запросу; ошибка HTTP или сети пробрасывается"""
+        assert self.session is not None
+        params = {"query": query}
+        async with self.session.get(f"{self.BASE}/search/songs", params=params, timeout=budget_timeout(30)) as resp:
+            resp.raise_for_status()
+            data = await resp.json()
+            results = data.get("data", []) or []
+            songs = results[:limit]
+            parsed: List[Dict] = []
+            for s in songs:
+                parsed.append({
+                    "id": s.get("id"),
+                    "title": s.get("name") or s.get("title"),
+                    "primaryArtists": s.get("primaryArtists", ""),
+                    "artist": s.get("primaryArtists", ""),
+                    "image": s.get("image"),
+                    "album": s.get("album"),
+                    "duration": int(s.get("duration", 0)) if s.get("duration") else 0
+                })
+            return parsed
 
     async def get_song(self, song_id: str) -> Optional[Dict]:
         try:
             assert self.session is not None
             params = {"id": song_id}
-            async with self.session.get(f"{self.BASE}/songs", params=params, timeout=30) as resp:
+            async with self.session.get(f"{self.BASE}/songs", params=params, timeout=budget_timeout(30)) as resp:
                 if resp.status != 200:
                     return None
                 data = await resp.json()
@@ -428,14 +772,20 @@ class JioSaavnProvider:
         except Exception:
             return None
 
-    async def download_best(self, query: str) -> Optional[str]:
-        """Ищет трек и скачивает лучшую доступную версию MP3. Возвращает путь к файлу."""
+    async def download_best(self, query: str, track_info: dict = None) -> Optional[str]:
+        """Ищет трек и скачивает лучшего по скору кандидата (оригинал, длительность, название).
+        Возвращает путь к файлу."""
         try:
-            results = await self.search(query, limit=5)
-            if not results:
+            ranked = ImprovedSearchEngine.filter_original_versions(await self.search(query, limit=5), track_info)
+            if not ranked:
                 return None
-            # Берем первый кандидат (можно улучшить по совпадению артиста/длительности)
-            candidate = results[0]
+            return await self.download_song(ranked[0])
+        except Exception:
+            return None
+
+    async def download_song(self, candidate: Dict) -> Optional[str]:
+        """Скачивает MP3 для кандидата из search(). Возвращает путь к файлу."""
+        try:
             song = await self.get_song(candidate["id"]) if candidate.get("id") else None
             if not song:
                 return None
@@ -466,8 +816,8 @@ class JioSaavnProvider:
             if not dl_url:
                 return None
             safe_name = clean_filename(f"{candidate['title']} - {candidate.get('primaryArtists','')}".strip())
-            dest = os.path.join("downloads", f"{safe_name}.mp3")
-            async with aiohttp.ClientSession() as s:
+            dest = os.path.join(job_dir(), f"{safe_name}.mp3")
+            async with throttled_session() as s:
                 path = await _download_file(s, dl_url, dest)
             return path
         except Exception:
@@ -483,7 +833,7 @@ class SoundCloudProvider:
         self.session: Optional[aiohttp.ClientSession] = None
 
     async def __aenter__(self):
-        self.session = aiohttp.ClientSession(headers={
+        self.session = throttled_session(headers={
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36"
         })
         return self
@@ -496,7 +846,7 @@ class SoundCloudProvider:
         try:
             assert self.session is not None
             params = {"q": query}
-            async with self.session.get(self.SEARCH_URL, params=params, timeout=30) as resp:
+            async with self.session.get(self.SEARCH_URL, params=params, timeout=budget_timeout(30)) as resp:
                 if resp.status != 200:
                     return []
                 html = await resp.text()
@@ -526,7 +876,7 @@ class AlternativeMusicProvider:
         self.session: Optional[aiohttp.ClientSession] = None
     
     async def __aenter__(self):
-        self.session = aiohttp.ClientSession(headers={
+        self.session = throttled_session(headers={
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         })
         return self
@@ -564,7 +914,7 @@ class AlternativeMusicProvider:
                 'limit': 1
             }
             
-            async with self.session.get(url, params=params, timeout=10) as resp:
+            async with self.session.get(url, params=params, timeout=budget_timeout(10)) as resp:
                 if resp.status == 200:
                     data = await resp.json()
                     tracks = data.get('results', {}).get('trackmatches', {}).get('track', [])
@@ -583,50 +933,22 @@ class AlternativeMusicProvider:
             enhanced_query = f"{artist} {track_name} official audio"
             
             # Используем yt-dlp с минимальными настройками
-            ydl_opts = {
-                'format': 'bestaudio/best',
-                'outtmpl': f'downloads/%(title)s.%(ext)s',
-                'postprocessors': [{
-                    'key': 'FFmpegExtractAudio',
-                    'preferredcodec': 'mp3',
-                    'preferredquality': '192',
-                }],
-                'noplaylist': True,
-                'quiet': True,
-                'no_warnings': True,
-                'max_filesize': 50 * 1024 * 1024,
-                'http_headers': {
-                    'User-Agent': 'Mozilla/5.0 (iPhone; CPU iPhone OS 14_0 like Mac OS X) AppleWebKit/605.1.15'
-                },
-                'extractor_args': {
-                    'youtube': {
-                        'player_client': ['ios', 'android_music'],
-                    }
-                },
-            }
-            
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                search_results = ydl.extract_info(
-                    f"ytsearch5:{enhanced_query}",
-                    download=False
-                )
-                
-                if search_results and 'entries' in search_results:
-                    entries = [e for e in search_results['entries'] if e]
-                    if entries:
-                        # Выбираем первое видео
-                        video = entries[0]
-                        video_url = video.get('webpage_url') or video.get('url')
-                        if video_url:
-                            # Скачиваем выбранное видео
-                            ydl.download([video_url])
-                            
-                            # Ищем скачанный файл
-                            title = clean_filename(video.get('title', 'Unknown'))
-                            for ext in ['mp3', 'webm', 'm4a']:
-                                file_path = f"downloads/{title}.{ext}"
-                                if os.path.exists(file_path):
-                                    return file_path
+            ydl_opts = 'youtube-ios'
+            
+            search_results = await ydl_extract_info(ydl_opts, f"ytsearch5:{enhanced_query}", download=False)
+            
+            if search_results and 'entries' in search_results:
+                entries = [e for e in search_results['entries'] if e]
+                if entries:
+                    # Выбираем первое видео
+                    video = entries[0]
+                    video_url = video.get('webpage_url') or video.get('url')
+                    if video_url:
+                        # Скачиваем выбранное видео
+                        info = await ydl_extract_info(ydl_opts, video_url, download=True)
+                        file_path = find_downloaded_file(info)
+                        if file_path:
+                            return file_path
         except Exception:
             pass
         return None
@@ -637,7 +959,7 @@ class AlternativeMusicProvider:
             # Попробуем поиск через DuckDuckGo (может найти прямые ссылки)
             search_url = f"https://html.duckduckgo.com/html/?q={query}+mp3+download"
             
-            async with self.session.get(search_url, timeout=10) as resp:
+            async with self.session.get(search_url, timeout=budget_timeout(10)) as resp:
                 if resp.status == 200:
                     html = await resp.text()
                     # Простой поиск ссылок на MP3
@@ -648,8 +970,8 @@ class AlternativeMusicProvider:
                         mp3_url = mp3_links[0]
                         if mp3_url.startswith('http'):
                             safe_name = clean_filename(query)
-                            dest = os.path.join("downloads", f"{safe_name}.mp3")
-                            async with aiohttp.ClientSession() as s:
+                            dest = os.path.join(job_dir(), f"{safe_name}.mp3")
+                            async with throttled_session() as s:
                                 path = await _download_file(s, mp3_url, dest)
                             return path
         except Exception:
@@ -664,7 +986,7 @@ class BandcampProvider:
         self.session: Optional[aiohttp.ClientSession] = None
     
     async def __aenter__(self):
-        self.session = aiohttp.ClientSession(headers={
+        self.session = throttled_session(headers={
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         })
         return self
@@ -673,48 +995,41 @@ class BandcampProvider:
         if self.session:
             await self.session.close()
     
-    async def search_and_download(self, query: str) -> Optional[str]:
-        """Ищет треки на Bandcamp и скачивает через yt-dlp"""
+    async def search_candidates(self, query: str, limit: int = 10) -> List[Dict]:
+        """Треки из поиска Bandcamp: {'url', 'title', 'artist'} без скачивания"""
+        params = {'q': query, 'item_type': 't'}
+        async with self.session.get("https://bandcamp.com/search", params=params, timeout=budget_timeout(15)) as resp:
+            resp.raise_for_status()
+            html = await resp.text()
+
+        candidates: List[Dict] = []
+        soup = BeautifulSoup(html, 'html.parser')
+        for result in soup.select('li.searchresult'):
+            link = result.select_one('.heading a')
+            url = (link.get('href') or '').split('?')[0] if link else ''
+            if '.bandcamp.com/track/' not in url:
+                continue
+            subhead = result.select_one('.subhead')
+            # Подзаголовок вида "from Альбом by Артист"
+            artist = subhead.get_text(' ', strip=True).rpartition('by ')[2] if subhead else ''
+            candidates.append({'url': url, 'title': link.get_text(strip=True), 'artist': artist})
+        if not candidates:
+            # Разметка поменялась — хотя бы ссылки, название из адреса трека
+            for url in re.findall(r'href="(https://[^"]+\.bandcamp\.com/track/[^"?]+)', html):
+                candidates.append({'url': url, 'title': url.rsplit('/', 1)[-1].replace('-', ' '), 'artist': ''})
+        return list({c['url']: c for c in candidates}.values())[:limit]
+
+    async def search_and_download(self, query: str, track_info: dict = None) -> Optional[str]:
+        """Ищет треки на Bandcamp и скачивает лучшего по скору кандидата через yt-dlp"""
         try:
-            # Поиск на Bandcamp
-            search_url = f"https://bandcamp.com/search?q={query}"
-            async with self.session.get(search_url, timeout=15) as resp:
-                if resp.status != 200:
-                    return None
-                html = await resp.text()
-            
-            # Парсим ссылки на треки
-            import re
-            track_links = re.findall(r'href="(https://[^"]+\.bandcamp\.com/track/[^"]+)"', html)
-            
-            if not track_links:
+            ranked = ImprovedSearchEngine.filter_original_versions(await self.search_candidates(query), track_info)
+            if not ranked:
                 return None
-            
-            # Пробуем скачать первый найденный трек
-            track_url = track_links[0]
-            
-            ydl_opts = {
-                'format': 'bestaudio/best',
-                'outtmpl': f'downloads/%(title)s.%(ext)s',
-                'postprocessors': [{
-                    'key': 'FFmpegExtractAudio',
-                    'preferredcodec': 'mp3',
-                    'preferredquality': '192',
-                }],
-                'noplaylist': True,
-                'quiet': True,
-                'no_warnings': True,
-                'max_filesize': 50 * 1024 * 1024,
-            }
-            
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(track_url, download=True)
-                if info:
-                    title = clean_filename(info.get('title', 'Unknown'))
-                    for ext in ['mp3', 'webm', 'm4a']:
-                        file_path = f"downloads/{title}.{ext}"
-                        if os.path.exists(file_path):
-                            return file_path
+            logger.info(f"Bandcamp: best candidate '{ranked[0]['title']}' {ranked[0]['url']}")
+            info = await ydl_extract_info('bandcamp', ranked[0]['url'], download=True)
+            file_path = find_downloaded_file(info)
+            if file_path:
+                return file_path
         except Exception as e:
             logger.error(f"BandcampProvider error: {e}")
         return None
@@ -727,7 +1042,7 @@ class ArchiveOrgProvider:
         self.session: Optional[aiohttp.ClientSession] = None
     
     async def __aenter__(self):
-        self.session = aiohttp.ClientSession(headers={
+        self.session = throttled_session(headers={
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         })
         return self
@@ -748,7 +1063,7 @@ class ArchiveOrgProvider:
                 'output': 'json'
             }
             
-            async with self.session.get(search_url, params=params, timeout=15) as resp:
+            async with self.session.get(search_url, params=params, timeout=budget_timeout(15)) as resp:
                 if resp.status != 200:
                     return None
                 data = await resp.json()
@@ -765,7 +1080,7 @@ class ArchiveOrgProvider:
             
             # Получаем прямую ссылку на MP3
             item_url = f"https://archive.org/details/{identifier}"
-            async with self.session.get(item_url, timeout=15) as resp:
+            async with self.session.get(item_url, timeout=budget_timeout(15)) as resp:
                 if resp.status != 200:
                     return None
                 html = await resp.text()
@@ -777,9 +1092,9 @@ class ArchiveOrgProvider:
             if mp3_links:
                 mp3_url = mp3_links[0]
                 title = clean_filename(item.get('title', query))
-                dest = os.path.join("downloads", f"{title}.mp3")
+                dest = os.path.join(job_dir(), f"{title}.mp3")
                 
-                async with aiohttp.ClientSession() as s:
+                async with throttled_session() as s:
                     path = await _download_file(s, mp3_url, dest)
                 return path
         except Exception as e:
@@ -794,7 +1109,7 @@ class FreeMusicArchiveProvider:
         self.session: Optional[aiohttp.ClientSession] = None
     
     async def __aenter__(self):
-        self.session = aiohttp.ClientSession(headers={
+        self.session = throttled_session(headers={
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         })
         return self
@@ -808,7 +1123,7 @@ class FreeMusicArchiveProvider:
         try:
             # Поиск в FMA
             search_url = f"https://freemusicarchive.org/search?adv=1&music-filter-genre=all&music-filter-artist={query}"
-            async with self.session.get(search_url, timeout=15) as resp:
+            async with self.session.get(search_url, timeout=budget_timeout(15)) as resp:
                 if resp.status != 200:
                     return None
                 html = await resp.text()
@@ -824,7 +1139,7 @@ class FreeMusicArchiveProvider:
             track_path = track_links[0]
             track_url = f"https://freemusicarchive.org{track_path}"
             
-            async with self.session.get(track_url, timeout=15) as resp:
+            async with self.session.get(track_url, timeout=budget_timeout(15)) as resp:
                 if resp.status != 200:
                     return None
                 html = await resp.text()
@@ -835,9 +1150,9 @@ class FreeMusicArchiveProvider:
             if mp3_links:
                 mp3_url = mp3_links[0]
                 title = clean_filename(query)
-                dest = os.path.join("downloads", f"{title}.mp3")
+                dest = os.path.join(job_dir(), f"{title}.mp3")
                 
-                async with aiohttp.ClientSession() as s:
+                async with throttled_session() as s:
                     path = await _download_file(s, mp3_url, dest)
                 return path
         except Exception as e:
@@ -852,7 +1167,7 @@ class JamendoProvider:
         self.session: Optional[aiohttp.ClientSession] = None
     
     async def __aenter__(self):
-        self.session = aiohttp.ClientSession(headers={
+        self.session = throttled_session(headers={
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         })
         return self
@@ -874,7 +1189,7 @@ class JamendoProvider:
                 'include': 'musicinfo'
             }
             
-            async with self.session.get(api_url, params=params, timeout=15) as resp:
+            async with self.session.get(api_url, params=params, timeout=budget_timeout(15)) as resp:
                 if resp.status != 200:
                     return None
                 data = await resp.json()
@@ -890,9 +1205,9 @@ class JamendoProvider:
                 return None
             
             title = clean_filename(f"{track.get('name', 'Unknown')} - {track.get('artist_name', 'Unknown')}")
-            dest = os.path.join("downloads", f"{title}.mp3")
+            dest = os.path.join(job_dir(), f"{title}.mp3")
             
-            async with aiohttp.ClientSession() as s:
+            async with throttled_session() as s:
                 path = await _download_file(s, audio_url, dest)
             return path
         except Exception as e:
@@ -907,7 +1222,7 @@ class MixcloudProvider:
         self.session: Optional[aiohttp.ClientSession] = None
     
     async def __aenter__(self):
-        self.session = aiohttp.ClientSession(headers={
+        self.session = throttled_session(headers={
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         })
         return self
@@ -921,7 +1236,7 @@ class MixcloudProvider:
         try:
             # Поиск на Mixcloud
             search_url = f"https://www.mixcloud.com/search/?q={query}"
-            async with self.session.get(search_url, timeout=15) as resp:
+            async with self.session.get(search_url, timeout=budget_timeout(15)) as resp:
                 if resp.status != 200:
                     return None
                 html = await resp.text()
@@ -938,28 +1253,12 @@ class MixcloudProvider:
             mix_url = f"https://www.mixcloud.com{mix_path}"
             
             # Скачиваем через yt-dlp
-            ydl_opts = {
-                'format': 'bestaudio/best',
-                'outtmpl': f'downloads/%(title)s.%(ext)s',
-                'postprocessors': [{
-                    'key': 'FFmpegExtractAudio',
-                    'preferredcodec': 'mp3',
-                    'preferredquality': '192',
-                }],
-                'noplaylist': True,
-                'quiet': True,
-                'no_warnings': True,
-                'max_filesize': 100 * 1024 * 1024,  # Mixcloud может быть больше
-            }
+            ydl_opts = 'mixcloud'
             
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(mix_url, download=True)
-                if info:
-                    title = clean_filename(info.get('title', 'Unknown'))
-                    for ext in ['mp3', 'webm', 'm4a']:
-                        file_path = f"downloads/{title}.{ext}"
-                        if os.path.exists(file_path):
-                            return file_path
+            info = await ydl_extract_info(ydl_opts, mix_url, download=True)
+            file_path = find_downloaded_file(info)
+            if file_path:
+                return file_path
         except Exception as e:
             logger.error(f"MixcloudProvider error: {e}")
         return None
@@ -972,7 +1271,7 @@ class VKMusicProvider:
         self.session: Optional[aiohttp.ClientSession] = None
     
     async def __aenter__(self):
-        self.session = aiohttp.ClientSession(headers={
+        self.session = throttled_session(headers={
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         })
         return self
@@ -988,7 +1287,7 @@ class VKMusicProvider:
             import re
             # Поиск в VK через поисковую систему
             search_url = f"https://vk.com/search?c[q]={quote(query, safe='')}&c[section]=audio"
-            async with self.session.get(search_url, timeout=15) as resp:
+            async with self.session.get(search_url, timeout=budget_timeout(15)) as resp:
                 if resp.status != 200:
                     return None
                 html = await resp.text()
@@ -1000,7 +1299,7 @@ class VKMusicProvider:
             candidates = []
             for path in audio_links[:5]:
                 url = f"https://vk.com{path}"
-                async with self.session.get(url, timeout=15) as page:
+                async with self.session.get(url, timeout=budget_timeout(15)) as page:
                     if page.status != 200:
                         continue
                     content = await page.text()
@@ -1025,27 +1324,11 @@ class VKMusicProvider:
                 return None
             audio_url = best['url']
             logger.info(f"[VK] Downloading best match: {audio_url} (score={best['score']})")
-            ydl_opts = {
-                'format': 'bestaudio/best',
-                'outtmpl': f'downloads/%(title)s.%(ext)s',
-                'postprocessors': [{
-                    'key': 'FFmpegExtractAudio',
-                    'preferredcodec': 'mp3',
-                    'preferredquality': '192',
-                }],
-                'noplaylist': True,
-                'quiet': True,
-                'no_warnings': True,
-                'max_filesize': 50 * 1024 * 1024,
-            }
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(audio_url, download=True)
-                if info:
-                    title = clean_filename(info.get('title', 'Unknown'))
-                    for ext in ['mp3', 'webm', 'm4a']:
-                        file_path = f"downloads/{title}.{ext}"
-                        if os.path.exists(file_path):
-                            return file_path
+            ydl_opts = 'direct-mp3'
+            info = await ydl_extract_info(ydl_opts, audio_url, download=True)
+            file_path = find_downloaded_file(info)
+            if file_path:
+                return file_path
         except Exception as e:
             logger.error(f"VKMusicProvider error: {e}")
         return None
@@ -1058,7 +1341,7 @@ class YandexMusicProvider:
         self.session: Optional[aiohttp.ClientSession] = None
     
     async def __aenter__(self):
-        self.session = aiohttp.ClientSession(headers={
+        self.session = throttled_session(headers={
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         })
         return self
@@ -1073,7 +1356,7 @@ class YandexMusicProvider:
             import yt_dlp
             import re
             search_url = f"https://music.yandex.ru/search?text={quote(query, safe='')}"
-            async with self.session.get(search_url, timeout=15) as resp:
+            async with self.session.get(search_url, timeout=budget_timeout(15)) as resp:
                 if resp.status != 200:
                     return None
                 html = await resp.text()
@@ -1085,7 +1368,7 @@ class YandexMusicProvider:
             candidates = []
             for path in track_links[:5]:
                 url = f"https://music.yandex.ru{path}"
-                async with self.session.get(url, timeout=15) as page:
+                async with self.session.get(url, timeout=budget_timeout(15)) as page:
                     if page.status != 200:
                         continue
                     content = await page.text()
@@ -1108,27 +1391,11 @@ class YandexMusicProvider:
                 return None
             track_url = best['url']
             logger.info(f"[Yandex] Downloading best match: {track_url} (score={best['score']})")
-            ydl_opts = {
-                'format': 'bestaudio/best',
-                'outtmpl': f'downloads/%(title)s.%(ext)s',
-                'postprocessors': [{
-                    'key': 'FFmpegExtractAudio',
-                    'preferredcodec': 'mp3',
-                    'preferredquality': '192',
-                }],
-                'noplaylist': True,
-                'quiet': True,
-                'no_warnings': True,
-                'max_filesize': 50 * 1024 * 1024,
-            }
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(track_url, download=True)
-                if info:
-                    title = clean_filename(info.get('title', 'Unknown'))
-                    for ext in ['mp3', 'webm', 'm4a']:
-                        file_path = f"downloads/{title}.{ext}"
-                        if os.path.exists(file_path):
-                            return file_path
+            ydl_opts = 'direct-mp3'
+            info = await ydl_extract_info(ydl_opts, track_url, download=True)
+            file_path = find_downloaded_file(info)
+            if file_path:
+                return file_path
         except Exception as e:
             logger.error(f"YandexMusicProvider error: {e}")
         return None
@@ -1141,7 +1408,7 @@ class DeezerProvider:
         self.session: Optional[aiohttp.ClientSession] = None
     
     async def __aenter__(self):
-        self.session = aiohttp.ClientSession(headers={
+        self.session = throttled_session(headers={
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         })
         return self
@@ -1156,7 +1423,7 @@ class DeezerProvider:
             import yt_dlp
             import re
             search_url = f"https://www.deezer.com/search/{quote(query, safe='')}"
-            async with self.session.get(search_url, timeout=15) as resp:
+            async with self.session.get(search_url, timeout=budget_timeout(15)) as resp:
                 if resp.status != 200:
                     return None
                 html = await resp.text()
@@ -1168,7 +1435,7 @@ class DeezerProvider:
             candidates = []
             for path in track_links[:5]:
                 url = f"https://www.deezer.com{path}"
-                async with self.session.get(url, timeout=15) as page:
+                async with self.session.get(url, timeout=budget_timeout(15)) as page:
                     if page.status != 200:
                         continue
                     content = await page.text()
@@ -1193,27 +1460,11 @@ class DeezerProvider:
                 return None
             track_url = best['url']
             logger.info(f"[Deezer] Downloading best match: {track_url} (score={best['score']})")
-            ydl_opts = {
-                'format': 'bestaudio/best',
-                'outtmpl': f'downloads/%(title)s.%(ext)s',
-                'postprocessors': [{
-                    'key': 'FFmpegExtractAudio',
-                    'preferredcodec': 'mp3',
-                    'preferredquality': '192',
-                }],
-                'noplaylist': True,
-                'quiet': True,
-                'no_warnings': True,
-                'max_filesize': 50 * 1024 * 1024,
-            }
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(track_url, download=True)
-                if info:
-                    title = clean_filename(info.get('title', 'Unknown'))
-                    for ext in ['mp3', 'webm', 'm4a']:
-                        file_path = f"downloads/{title}.{ext}"
-                        if os.path.exists(file_path):
-                            return file_path
+            ydl_opts = 'direct-mp3'
+            info = await ydl_extract_info(ydl_opts, track_url, download=True)
+            file_path = find_downloaded_file(info)
+            if file_path:
+                return file_path
         except Exception as e:
             logger.error(f"DeezerProvider error: {e}")
         return None
@@ -1222,88 +1473,45 @@ class DeezerProvider:
 class AlternativeYouTubeProvider:
     """Альтернативный YouTube провайдер с другими настройками обхода блокировок"""
     
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        pass
+    
     async def search_and_download(self, query: str) -> Optional[str]:
         """Ищет треки через альтернативные YouTube методы"""
         try:
             import random
-            import yt_dlp
+
+            # Альтернативные настройки для обхода блокировок: худшее качество, другие клиенты
+            ydl_opts = with_user_agent(ydl_preset('youtube-lowq'), random.choice(LOWQ_USER_AGENTS))
             
-            # Альтернативные настройки для обхода блокировок
-            alt_user_agents = [
-                'Mozilla/5.0 (iPad; CPU OS 16_0 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/16.0 Mobile/15E148 Safari/604.1',
-                'Mozilla/5.0 (Linux; Android 11; Pixel 5) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Mobile Safari/537.36',
-                'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:109.0) Gecko/20100101 Firefox/119.0',
-                'Mozilla/5.0 (Macintosh; Intel Mac OS X 10.15; rv:109.0) Gecko/20100101 Firefox/119.0'
+            # Пробуем разные поисковые запросы
+            search_queries = [
+                f"{query} official",
+                f"{query} audio",
+                f"{query} music",
+                f"{query} song"
             ]
             
-            ydl_opts = {
-                'format': 'worstaudio/worst',  # Берем худшее качество для обхода блокировок
-                'outtmpl': f'downloads/%(title)s.%(ext)s',
-                'postprocessors': [{
-                    'key': 'FFmpegExtractAudio',
-                    'preferredcodec': 'mp3',
-                    'preferredquality': '128',  # Низкое качество для обхода
-                }],
-                'noplaylist': True,
-                'quiet': True,
-                'no_warnings': True,
-                'max_filesize': 25 * 1024 * 1024,  # Меньший лимит
-                'http_headers': {
-                    'User-Agent': random.choice(alt_user_agents),
-                    'Accept': '*/*',
-                    'Accept-Language': 'en-US,en;q=0.5',
-                    'Accept-Encoding': 'gzip, deflate',
-                    'Connection': 'keep-alive',
-                },
-                'extractor_args': {
-                    'youtube': {
-                        'player_client': ['tv_embedded', 'tv', 'ios'],
-                        'skip': ['dash', 'hls'],
-                    }
-                },
-                'retries': 3,
-                'fragment_retries': 3,
-                'retry_sleep': 1,
-                'sleep_interval': 0.5,
-                'geo_bypass': True,
-                'geo_bypass_country': 'RU',  # Другая страна
-                'no_check_certificate': True,
-                'ignoreerrors': True,
-            }
-            
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                # Пробуем разные поисковые запросы
-                search_queries = [
-                    f"{query} official",
-                    f"{query} audio",
-                    f"{query} music",
-                    f"{query} song"
-                ]
-                
-                for search_query in search_queries:
-                    try:
-                        search_results = ydl.extract_info(
-                            f"ytsearch3:{search_query}",
-                            download=False
-                        )
-                        
-                        if search_results and 'entries' in search_results:
-                            entries = [e for e in search_results['entries'] if e]
-                            if entries:
-                                # Берем первое видео
-                                video = entries[0]
-                                video_url = video.get('webpage_url') or video.get('url')
-                                if video_url:
-                                    ydl.download([video_url])
-                                    
-                                    # Ищем скачанный файл
-                                    title = clean_filename(video.get('title', 'Unknown'))
-                                    for ext in ['mp3', 'webm', 'm4a']:
-                                        file_path = f"downloads/{title}.{ext}"
-                                        if os.path.exists(file_path):
-                                            return file_path
-                    except Exception:
-                        continue
+            for search_query in search_queries:
+                try:
+                    search_results = await ydl_extract_info(ydl_opts, f"ytsearch3:{search_query}", download=False)
+                    
+                    if search_results and 'entries' in search_results:
+                        entries = [e for e in search_results['entries'] if e]
+                        if entries:
+                            # Берем первое видео
+                            video = entries[0]
+                            video_url = video.get('webpage_url') or video.get('url')
+                            if video_url:
+                                info = await ydl_extract_info(ydl_opts, video_url, download=True)
+                                file_path = find_downloaded_file(info)
+                                if file_path:
+                                    return file_path
+                except Exception:
+                    continue
                         
         except Exception as e:
             logger.error(f"AlternativeYouTubeProvider error: {e}")
@@ -1319,31 +1527,29 @@ class YTMusicProvider:
         self.yt = YTMusic()
 
     def search(self, query: str, limit: int = 5) -> List[Dict]:
-        try:
-            results = self.yt.search(query, filter="songs", limit=limit) or []
-            parsed: List[Dict] = []
-            for r in results:
-                title = r.get("title")
-                artists = ", ".join([a.get("name") for a in (r.get("artists") or []) if a.get("name")])
-                dur = r.get("duration")  # формат mm:ss
-                seconds = 0
-                if isinstance(dur, str) and ":" in dur:
-                    try:
-                        m, s = dur.split(":")
-                        seconds = int(m) * 60 + int(s)
-                    except Exception:
-                        seconds = 0
-                video_id = r.get("videoId")
-                if video_id:
-                    parsed.append({
-                        "title": title,
-                        "artist": artists,
-                        "duration": seconds,
-                        "url": f"https://music.youtube.com/watch?v={video_id}",
-                    })
-            return parsed
-        except Exception:
-            return []
+        """Ищет песни; ошибка ytmusicapi пробрасывается"""
+        results = self.yt.search(query, filter="songs", limit=limit) or []
+        parsed: List[Dict] = []
+        for r in results:
+            title = r.get("title")
+            artists = ", ".join([a.get("name") for a in (r.get("artists") or []) if a.get("name")])
+            dur = r.get("duration")  # формат mm:ss
+            seconds = 0
+            if isinstance(dur, str) and ":" in dur:
+                try:
+                    m, s = dur.split(":")
+                    seconds = int(m) * 60 + int(s)
+                except Exception:
+                    seconds = 0
+            video_id = r.get("videoId")
+            if video_id:
+                parsed.append({
+                    "title": title,
+                    "artist": artists,
+                    "duration": seconds,
+                    "url": f"https://music.youtube.com/watch?v={video_id}",
+                })
+        return parsed
 
     async def download_best(self, query: str) -> Optional[str]:
         """Ищет трек и скачивает лучшую доступную версию MP3. Возвращает путь к файлу."""
@@ -1352,7 +1558,13 @@ class YTMusicProvider:
             if not results:
                 return None
             # Берем первый кандидат (можно улучшить по совпадению артиста/длительности)
-            candidate = results[0]
+            return await self.download_song(results[0])
+        except Exception:
+            return None
+
+    async def download_song(self, candidate: Dict) -> Optional[str]:
+        """Скачивает MP3 для кандидата из search(). Возвращает путь к файлу."""
+        try:
             song = await self.get_song(candidate["id"]) if candidate.get("id") else None
             if not song:
                 return None
@@ -1383,8 +1595,8 @@ class YTMusicProvider:
             if not dl_url:
                 return None
             safe_name = clean_filename(f"{candidate['title']} - {candidate.get('primaryArtists','')}".strip())
-            dest = os.path.join("downloads", f"{safe_name}.mp3")
-            async with aiohttp.ClientSession() as s:
+            dest = os.path.join(job_dir(), f"{safe_name}.mp3")
+            async with throttled_session() as s:
                 path = await _download_file(s, dl_url, dest)
             return path
         except Exception:
@@ -1396,7 +1608,7 @@ class AudiomackProvider:
     def __init__(self):
         self.session: Optional[aiohttp.ClientSession] = None
     async def __aenter__(self):
-        self.session = aiohttp.ClientSession(headers={
+        self.session = throttled_session(headers={
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         })
         return self
@@ -1406,7 +1618,7 @@ class AudiomackProvider:
     async def search_and_download(self, query: str) -> Optional[str]:
         try:
             search_url = f'https://audiomack.com/search?q={quote(query, safe="")}'
-            async with self.session.get(search_url, timeout=15) as resp:
+            async with self.session.get(search_url, timeout=budget_timeout(15)) as resp:
                 if resp.status != 200:
                     return None
                 html = await resp.text()
@@ -1419,28 +1631,11 @@ class AudiomackProvider:
                 url = f'https://audiomack.com{path}'
                 logger.info(f"[Audiomack] Trying download: {url}")
                 try:
-                    import yt_dlp
-                    ydl_opts = {
-                        'format': 'bestaudio/best',
-                        'outtmpl': f'downloads/%(title)s.%(ext)s',
-                        'postprocessors': [{
-                            'key': 'FFmpegExtractAudio',
-                            'preferredcodec': 'mp3',
-                            'preferredquality': '192',
-                        }],
-                        'noplaylist': True,
-                        'quiet': True,
-                        'no_warnings': True,
-                        'max_filesize': 50 * 1024 * 1024,
-                    }
-                    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                        info = ydl.extract_info(url, download=True)
-                        if info:
-                            title = clean_filename(info.get('title', 'Unknown'))
-                            for ext in ['mp3', 'webm', 'm4a']:
-                                file_path = f"downloads/{title}.{ext}"
-                                if os.path.exists(file_path):
-                                    return file_path
+                    ydl_opts = 'direct-mp3'
+                    info = await ydl_extract_info(ydl_opts, url, download=True)
+                    file_path = find_downloaded_file(info)
+                    if file_path:
+                        return file_path
                 except Exception as ex:
                     logger.error(f"Audiomack candidate failed: {ex}")
                     continue
@@ -1454,7 +1649,7 @@ class MusopenProvider:
     def __init__(self):
         self.session: Optional[aiohttp.ClientSession] = None
     async def __aenter__(self):
-        self.session = aiohttp.ClientSession(headers={
+        self.session = throttled_session(headers={
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         })
         return self
@@ -1464,7 +1659,7 @@ class MusopenProvider:
     async def search_and_download(self, query: str) -> Optional[str]:
         try:
             search_url = f'https://musopen.org/music/search/?q={quote(query, safe="")}'
-            async with self.session.get(search_url, timeout=20) as resp:
+            async with self.session.get(search_url, timeout=budget_timeout(20)) as resp:
                 if resp.status != 200:
                     return None
                 html = await resp.text()
@@ -1477,7 +1672,7 @@ class MusopenProvider:
                 url = f'https://musopen.org{path}'
                 logger.info(f"[Musopen] Trying: {url}")
                 try:
-                    async with self.session.get(url, timeout=15) as resp2:
+                    async with self.session.get(url, timeout=budget_timeout(15)) as resp2:
                         if resp2.status != 200:
                             continue
                         inner = await resp2.text()
@@ -1486,8 +1681,8 @@ class MusopenProvider:
                     if mp3_links:
                         audio_url = mp3_links[0]
                         filename = os.path.basename(audio_url).split("?")[0]
-                        dest = os.path.join("downloads", filename)
-                        async with aiohttp.ClientSession() as s:
+                        dest = os.path.join(job_dir(), filename)
+                        async with throttled_session() as s:
                             path = await _download_file(s, audio_url, dest)
                         if path:
                             logger.info(f"[Musopen] Success: {path}")
@@ -1504,7 +1699,7 @@ class PleerNetProvider:
     def __init__(self):
         self.session: Optional[aiohttp.ClientSession] = None
     async def __aenter__(self):
-        self.session = aiohttp.ClientSession(headers={
+        self.session = throttled_session(headers={
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         })
         return self
@@ -1515,7 +1710,7 @@ class PleerNetProvider:
         try:
             base_url = 'https://pleer.net'
             search_url = f'{base_url}/search?q={quote(query, safe="")}'
-            async with self.session.get(search_url, timeout=12) as resp:
+            async with self.session.get(search_url, timeout=budget_timeout(12)) as resp:
                 if resp.status != 200:
                     return None
                 html = await resp.text()
@@ -1527,8 +1722,8 @@ class PleerNetProvider:
             if not mp3_url.startswith('http'):
                 mp3_url = base_url + mp3_url
             safe_name = clean_filename(query)
-            dest = os.path.join("downloads", f"{safe_name}.mp3")
-            async with aiohttp.ClientSession() as s:
+            dest = os.path.join(job_dir(), f"{safe_name}.mp3")
+            async with throttled_session() as s:
                 path = await _download_file(s, mp3_url, dest)
             return path
         except Exception as e:
@@ -1540,7 +1735,7 @@ class MP3JuicesProvider:
     def __init__(self):
         self.session: Optional[aiohttp.ClientSession] = None
     async def __aenter__(self):
-        self.session = aiohttp.ClientSession(headers={
+        self.session = throttled_session(headers={
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         })
         return self
@@ -1550,7 +1745,7 @@ class MP3JuicesProvider:
     async def search_and_download(self, query: str) -> Optional[str]:
         try:
             search_url = f'https://www.mp3juices.cc/search/{quote(query, safe="")}'
-            async with self.session.get(search_url, timeout=15) as resp:
+            async with self.session.get(search_url, timeout=budget_timeout(15)) as resp:
                 if resp.status != 200:
                     return None
                 html = await resp.text()
@@ -1562,8 +1757,8 @@ class MP3JuicesProvider:
                 elif not link.startswith('http'):
                     link = 'https://' + link
                 safe_name = clean_filename(query)
-                dest = os.path.join("downloads", f"{safe_name}.mp3")
-                async with aiohttp.ClientSession() as s:
+                dest = os.path.join(job_dir(), f"{safe_name}.mp3")
+                async with throttled_session() as s:
                     path = await _download_file(s, link, dest)
                 if path:
                     return path
@@ -1577,7 +1772,7 @@ class ZaycevProvider:
     def __init__(self):
         self.session: Optional[aiohttp.ClientSession] = None
     async def __aenter__(self):
-        self.session = aiohttp.ClientSession(headers={
+        self.session = throttled_session(headers={
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         })
         return self
@@ -1587,7 +1782,7 @@ class ZaycevProvider:
     async def search_and_download(self, query: str) -> Optional[str]:
         try:
             search_url = f'https://zaycev.net/search.html?query_search={quote(query, safe="")}'
-            async with self.session.get(search_url, timeout=15) as resp:
+            async with self.session.get(search_url, timeout=budget_timeout(15)) as resp:
                 if resp.status != 200:
                     return None
                 html = await resp.text()
@@ -1599,8 +1794,8 @@ class ZaycevProvider:
                 elif not link.startswith('http'):
                     link = 'https://' + link
                 safe_name = clean_filename(query)
-                dest = os.path.join("downloads", f"{safe_name}.mp3")
-                async with aiohttp.ClientSession() as s:
+                dest = os.path.join(job_dir(), f"{safe_name}.mp3")
+                async with throttled_session() as s:
                     path = await _download_file(s, link, dest)
                 if path:
                     return path
@@ -1614,7 +1809,7 @@ class MyzukaProvider:
     def __init__(self):
         self.session: Optional[aiohttp.ClientSession] = None
     async def __aenter__(self):
-        self.session = aiohttp.ClientSession(headers={
+        self.session = throttled_session(headers={
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         })
         return self
@@ -1624,7 +1819,7 @@ class MyzukaProvider:
     async def search_and_download(self, query: str) -> Optional[str]:
         try:
             search_url = f'https://myzuka.fm/Search.aspx?Text={quote(query, safe="")}'
-            async with self.session.get(search_url, timeout=15) as resp:
+            async with self.session.get(search_url, timeout=budget_timeout(15)) as resp:
                 if resp.status != 200:
                     return None
                 html = await resp.text()
@@ -1634,7 +1829,7 @@ class MyzukaProvider:
                 return None
             # Берём первую детальную страницу и ищем кнопку mp3/stream
             detail_url = f'https://myzuka.fm{links[0]}'
-            async with self.session.get(detail_url, timeout=15) as resp:
+            async with self.session.get(detail_url, timeout=budget_timeout(15)) as resp:
                 if resp.status != 200:
                     return None
                 detail = await resp.text()
@@ -1643,8 +1838,8 @@ class MyzukaProvider:
                 return None
             mp3_url = mp3_matches[0]
             safe_name = clean_filename(query)
-            dest = os.path.join("downloads", f"{safe_name}.mp3")
-            async with aiohttp.ClientSession() as s:
+            dest = os.path.join(job_dir(), f"{safe_name}.mp3")
+            async with throttled_session() as s:
                 path = await _download_file(s, mp3_url, dest)
             return path
         except Exception as e:
@@ -1656,7 +1851,7 @@ class RuTrackProvider:
     def __init__(self):
         self.session: Optional[aiohttp.ClientSession] = None
     async def __aenter__(self):
-        self.session = aiohttp.ClientSession(headers={
+        self.session = throttled_session(headers={
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         })
         return self
@@ -1667,7 +1862,7 @@ class RuTrackProvider:
         # Внимание! Для rutracker нужны прокси/куки, но мы попробуем только парсинг публичного поиска! Торренты не качаем, а только даем ссылку.
         try:
             search_url = f'https://rutracker.org/forum/tracker.php?nm={quote(query, safe="")}'
-            async with self.session.get(search_url, timeout=15) as resp:
+            async with self.session.get(search_url, timeout=budget_timeout(15)) as resp:
                 if resp.status != 200:
                     return None
                 html = await resp.text()
@@ -1689,7 +1884,7 @@ class RedMp3Provider:
     def __init__(self):
         self.session: Optional[aiohttp.ClientSession] = None
     async def __aenter__(self):
-        self.session = aiohttp.ClientSession(headers={
+        self.session = throttled_session(headers={
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         })
         return self
@@ -1699,22 +1894,22 @@ class RedMp3Provider:
     async def search_and_download(self, query: str) -> Optional[str]:
         try:
             search_url = f'https://redmp3.cc/search/{quote(query, safe="")}/'
-            async with self.session.get(search_url, timeout=15) as resp:
+            async with self.session.get(search_url, timeout=budget_timeout(15)) as resp:
                 html = await resp.text()
             import re
             links = re.findall(r'<a href="(/\d+\-[a-zA-Z0-9\-]+\.html)"', html)
             if not links:
                 return None
             detail_url = 'https://redmp3.cc' + links[0]
-            async with self.session.get(detail_url, timeout=8) as resp:
+            async with self.session.get(detail_url, timeout=budget_timeout(8)) as resp:
                 det = await resp.text()
             mp3_links = re.findall(r'src="(https://files\.redmp3\.cc/[^\"]+\.mp3)"', det)
             if not mp3_links:
                 return None
             mp3_url = mp3_links[0]
             safe_name = clean_filename(query)
-            dest = os.path.join("downloads", f"{safe_name}.mp3")
-            async with aiohttp.ClientSession() as s:
+            dest = os.path.join(job_dir(), f"{safe_name}.mp3")
+            async with throttled_session() as s:
                 path = await _download_file(s, mp3_url, dest)
             return path
         except Exception as e:
@@ -1726,7 +1921,7 @@ class Mp3SkullsProvider:
     def __init__(self):
         self.session: Optional[aiohttp.ClientSession] = None
     async def __aenter__(self):
-        self.session = aiohttp.ClientSession(headers={
+        self.session = throttled_session(headers={
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         })
         return self
@@ -1736,7 +1931,7 @@ class Mp3SkullsProvider:
     async def search_and_download(self, query: str) -> Optional[str]:
         try:
             search_url = f'https://mp3skulls.info/mg/search.html?wm={quote(query, safe="")}'
-            async with self.session.get(search_url, timeout=12) as resp:
+            async with self.session.get(search_url, timeout=budget_timeout(12)) as resp:
                 html = await resp.text()
             import re
             mp3_links = re.findall(r'<a[^>]*href=["\']([^"\']+\.mp3[^"\']*)["\'][^>]*>', html)
@@ -1746,8 +1941,8 @@ class Mp3SkullsProvider:
                 elif not link.startswith('http'):
                     link = 'https://' + link
                 safe_name = clean_filename(query)
-                dest = os.path.join("downloads", f"{safe_name}.mp3")
-                async with aiohttp.ClientSession() as s:
+                dest = os.path.join(job_dir(), f"{safe_name}.mp3")
+                async with throttled_session() as s:
                     path = await _download_file(s, link, dest)
                 if path:
                     return path
@@ -1761,7 +1956,7 @@ class Music7sProvider:
     def __init__(self):
         self.session: Optional[aiohttp.ClientSession] = None
     async def __aenter__(self):
-        self.session = aiohttp.ClientSession(headers={
+        self.session = throttled_session(headers={
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         })
         return self
@@ -1771,7 +1966,7 @@ class Music7sProvider:
     async def search_and_download(self, query: str) -> Optional[str]:
         try:
             search_url = f'https://music7s.cc/search?q={quote(query, safe="")}'
-            async with self.session.get(search_url, timeout=13) as resp:
+            async with self.session.get(search_url, timeout=budget_timeout(13)) as resp:
                 html = await resp.text()
             import re
             mp3_links = re.findall(r'<a[^>]+href=["\']([^"\']+\.mp3[^"\']*)["\']', html)
@@ -1781,8 +1976,8 @@ class Music7sProvider:
                 elif not link.startswith('http'):
                     link = 'https://' + link
                 safe_name = clean_filename(query)
-                dest = os.path.join("downloads", f"{safe_name}.mp3")
-                async with aiohttp.ClientSession() as s:
+                dest = os.path.join(job_dir(), f"{safe_name}.mp3")
+                async with throttled_session() as s:
                     path = await _download_file(s, link, dest)
                 if path:
                     return path
@@ -1794,97 +1989,168 @@ class Music7sProvider:
 
 class ImprovedSearchEngine:
     """Улучшенный поисковый движок с приоритетом оригинальных версий"""
-    
+
+    # Слова-индикаторы неоригинальных версий
+    NON_ORIGINAL_KEYWORDS = [
+        'slowed', 'sped up', 'nightcore', 'remix', 'edit', 'mashup',
+        'cover', 'acoustic', 'live', 'instrumental', 'karaoke',
+        'guitar', 'piano', 'orchestral', 'orchestra', 'symphony',
+        'extended', 'club', 'radio', 'clean', 'explicit',
+        'reverb', 'echo', 'bass boosted', '8d', '3d', 'spatial',
+        'super slowed', 'ultra slowed', 'extreme slowed', 'heavily slowed',
+        'slowed down', 'slow version', 'slow edit', 'slow remix'
+    ]
+
+    # Слова-индикаторы оригинальных версий
+    ORIGINAL_KEYWORDS = [
+        'original', 'official', 'studio', 'album version',
+        'single', 'main', 'standard'
+    ]
+
+    # Скор, начиная с которого кандидат считается уверенным совпадением
+    # (при совпадении названия трека): дальше варианты запроса не перебираем
+    CONFIDENT_SCORE = 110
+
+    # Сколько вариантов запроса отдает build_query_variants по умолчанию
+    MAX_QUERY_VARIANTS = 4
+
+    @staticmethod
+    def name_match(candidate: Dict, track_info: dict = None) -> Optional[int]:
+        """Насколько название трека встречается в названии/артисте кандидата (0-100)"""
+        if not track_info or not track_info.get('name'):
+            return None
+        haystack = f"{candidate.get('artist') or ''} {candidate.get('title') or ''}".lower()
+        name = ImprovedSearchEngine.strip_decorations(track_info['name'])
+        return fuzz.partial_ratio(name.lower(), haystack)
+
+    @staticmethod
+    def score_candidate(candidate: Dict, track_info: dict = None) -> int:
+        """Скор кандидата: 100 базовых, штрафы за неоригинальные версии и чужую песню, бонусы за оригинал"""
+        title = (candidate.get('title') or '').lower()
+        score = 100  # Базовый скор
+
+        # Штрафуем за неоригинальные версии
+        for keyword in ImprovedSearchEngine.NON_ORIGINAL_KEYWORDS:
+            if keyword in title:
+                score -= 30
+
+        # Особо строгий штраф за slowed версии
+        if any(keyword in title for keyword in ['slowed', 'super slowed', 'ultra slowed', 'extreme slowed']):
+            score -= 50  # Очень большой штраф
+
+        # Бонус за оригинальные версии
+        for keyword in ImprovedSearchEngine.ORIGINAL_KEYWORDS:
+            if keyword in title:
+                score += 20
+
+        # Бонус за совпадение длительности (если известна)
+        if track_info and track_info.get('duration'):
+            candidate_duration = candidate.get('duration') or 0
+            target_duration = track_info['duration']
+            if candidate_duration > 0:
+                duration_diff = abs(candidate_duration - target_duration)
+                if duration_diff <= 5:  # Разница до 5 секунд
+                    score += 25
+                elif duration_diff <= 15:  # Разница до 15 секунд
+                    score += 10
+                else:
+                    score -= 15
+
+        # Штраф за другую песню: название трека должно встречаться в названии/артисте кандидата
+        name_match = ImprovedSearchEngine.name_match(candidate, track_info)
+        if name_match is not None:
+            if name_match < 60:
+                score -= 40
+            elif name_match >= 90:
+                score += 10
+
+        # Бонус за высокие просмотры (популярность)
+        view_count = candidate.get('view_count') or 0
+        if view_count > 1000000:
+            score += 15
+        elif view_count > 100000:
+            score += 10
+
+        return score
+
     @staticmethod
     def filter_original_versions(candidates: List[Dict], track_info: dict = None) -> List[Dict]:
         """Фильтрует кандидатов, отдавая приоритет оригинальным версиям"""
         if not candidates:
             return candidates
-            
-        # Слова-индикаторы неоригинальных версий
-        non_original_keywords = [
-            'slowed', 'sped up', 'nightcore', 'remix', 'edit', 'mashup',
-            'cover', 'acoustic', 'live', 'instrumental', 'karaoke',
-            'guitar', 'piano', 'orchestral', 'orchestra', 'symphony',
-            'extended', 'club', 'radio', 'clean', 'explicit',
-            'reverb', 'echo', 'bass boosted', '8d', '3d', 'spatial',
-            'super slowed', 'ultra slowed', 'extreme slowed', 'heavily slowed',
-            'slowed down', 'slow version', 'slow edit', 'slow remix'
-        ]
-        
-        # Слова-индикаторы оригинальных версий
-        original_keywords = [
-            'original', 'official', 'studio', 'album version',
-            'single', 'main', 'standard'
+
+        scored_candidates = [
+            (candidate, ImprovedSearchEngine.score_candidate(candidate, track_info))
+            for candidate in candidates
         ]
-        
-        scored_candidates = []
-        
-        for candidate in candidates:
-            title = candidate.get('title', '').lower()
-            score = 100  # Базовый скор
-            
-            # Штрафуем за неоригинальные версии
-            for keyword in non_original_keywords:
-                if keyword in title:
-                    score -= 30
-                    
-            # Особо строгий штраф за slowed версии
-            if any(keyword in title for keyword in ['slowed', 'super slowed', 'ultra slowed', 'extreme slowed']):
-                score -= 50  # Очень большой штраф
-                    
-            # Бонус за оригинальные версии
-            for keyword in original_keywords:
-                if keyword in title:
-                    score += 20
-                    
-            # Бонус за совпадение длительности (если известна)
-            if track_info and track_info.get('duration'):
-                candidate_duration = candidate.get('duration', 0)
-                target_duration = track_info['duration']
-                if candidate_duration > 0:
-                    duration_diff = abs(candidate_duration - target_duration)
-                    if duration_diff <= 5:  # Разница до 5 секунд
-                        score += 25
-                    elif duration_diff <= 15:  # Разница до 15 секунд
-                        score += 10
-                    else:
-                        score -= 15
-                        
-            # Бонус за высокие просмотры (популярность)
-            view_count = candidate.get('view_count', 0)
-            if view_count > 1000000:
-                score += 15
-            elif view_count > 100000:
-                score += 10
-                
-            scored_candidates.append((candidate, score))
-            
+
         # Сортируем по скору (убывание)
         scored_candidates.sort(key=lambda x: x[1], reverse=True)
-        
+
         # Возвращаем только кандидатов с положительным скором
         return [candidate for candidate, score in scored_candidates if score > 0]
 
     @staticmethod
-    def enhance_search_query(query: str, track_info: dict = None) -> List[str]:
-        """Создает улучшенные поисковые запросы с приоритетом оригинальных версий"""
-        queries = []
-        
-        # Основной запрос
-        queries.append(query)
-        
-        if track_info:
-            # Добавляем "official" для поиска оригинальных версий
-            artist = track_info.get('artist', '')
-            track_name = track_info.get('name', '')
-            
-            if artist and track_name:
-                queries.append(f'"{track_name}" "{artist}" official')
-                queries.append(f'"{track_name}" "{artist}" original')
-                queries.append(f'"{track_name}" "{artist}" studio version')
-                
-        return queries
+    def is_confident_match(candidate: Dict, track_info: dict = None) -> bool:
+        """Кандидат почти наверняка нужный трек (без track_info судить не по чему — считаем да)"""
+        if not track_info or not track_info.get('name'):
+            return True
+        if (ImprovedSearchEngine.name_match(candidate, track_info) or 0) < 90:
+            return False
+        return ImprovedSearchEngine.score_candidate(candidate, track_info) >= ImprovedSearchEngine.CONFIDENT_SCORE
+
+    @staticmethod
+    def normalize_query(text: str) -> str:
+        """Приводит запрос к виду для поиска: без '_' и лишней пунктуации, одиночные пробелы"""
+        text = normalize('NFC', text or '').replace('_', ' ')
+        text = re.sub(r'[,!?:;|"«»“”*<>\\/]+', ' ', text)
+        text = re.sub(r'\s+-\s+', ' ', text)
+        return ' '.join(text.split())
+
+    @staticmethod
+    def strip_decorations(name: str) -> str:
+        """Убирает из названия "(feat. ...)" и приписки вида " - Remastered 2011" """
+        name = re.sub(r'\s*[\(\[](?:feat\.?|ft\.?|with)\s[^\)\]]*[\)\]]', '', name, flags=re.IGNORECASE)
+        name = re.sub(r'\s+-\s+[^-]*\bremaster(?:ed)?\b.*$', '', name, flags=re.IGNORECASE)
+        name = re.sub(r'\s*[\(\[][^\)\]]*\bremaster(?:ed)?\b[^\)\]]*[\)\]]', '', name, flags=re.IGNORECASE)
+        return name.strip() or name
+
+    @staticmethod
+    def build_query_variants(query: str, track_info: dict = None, limit: int = MAX_QUERY_VARIANTS) -> List[str]:
+        """Единый генератор вариантов запроса для всех провайдеров.
+
+        Возвращает небольшой ранжированный список нормализованных запросов без
+        дубликатов: сначала "артист название" из track_info, затем сам запрос.
+        Приписки вроде slowed/remix/cover не добавляются — они ведут к чужим версиям.
+        """
+        variants: List[str] = []
+        if track_info and track_info.get('name'):
+            name = track_info['name']
+            base_name = ImprovedSearchEngine.strip_decorations(name)
+            artists = track_info.get('artists') or [track_info.get('artist') or '']
+            first_artist = artists[0] if artists else ''
+            variants += [
+                f"{first_artist} {base_name}",
+                f"{base_name} {track_info.get('artist') or first_artist}",
+                f"{first_artist} {name}",
+            ]
+        variants.append(query)
+        stripped = ImprovedSearchEngine.strip_decorations(query.replace('_', ' '))
+        variants.append(stripped)
+        words = ImprovedSearchEngine.normalize_query(stripped).split()
+        if len(words) > 4:
+            # Первые 3 слова — последний шанс для длинных названий
+            variants.append(' '.join(words[:3]))
+
+        result: List[str] = []
+        seen = set()
+        for variant in variants:
+            variant = ImprovedSearchEngine.normalize_query(variant)
+            key = variant.casefold()
+            if variant and key not in seen:
+                seen.add(key)
+                result.append(variant)
+        return result[:limit]
 
 
 class EnhancedSoundCloudProvider:
@@ -1894,7 +2160,7 @@ class EnhancedSoundCloudProvider:
         self.session: Optional[aiohttp.ClientSession] = None
         
     async def __aenter__(self):
-        self.session = aiohttp.ClientSession(headers={
+        self.session = throttled_session(headers={
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         })
         return self
@@ -1904,97 +2170,60 @@ class EnhancedSoundCloudProvider:
             await self.session.close()
     
     async def search_urls(self, query: str, limit: int = 10) -> List[str]:
-        """Ищет URL треков на SoundCloud"""
+        """Ищет URL треков на странице поиска SoundCloud (без метаданных, см. search_candidates).
+        Ошибка HTTP или сети пробрасывается."""
+        # Правильно кодируем Unicode символы для URL
+        encoded_query = quote(query, safe='', encoding='utf-8')
+        
+        # Веб-поиск (API требует client_id, которого у нас нет)
+        web_search_url = f"https://soundcloud.com/search/sounds?q={encoded_query}"
+        async with self.session.get(web_search_url, timeout=budget_timeout(15)) as resp:
+            resp.raise_for_status()
+            html = await resp.text()
+        
+        import re
+        # Ищем ссылки на треки в HTML
+        track_links = re.findall(r'href="(https://soundcloud\.com/[^"]+)"', html)
+        # Фильтруем только ссылки на треки (не на пользователей)
+        track_urls = [link for link in track_links if '/tracks/' in link]
+        
+        return track_urls[:limit]
+    
+    async def search_candidates(self, query: str, limit: int = 10) -> List[Dict]:
+        """Кандидаты для ранжирования: один плоский scsearch вместо extract_info по каждому URL.
+
+        Если плоский поиск ничего не дал, ищем URL на сайте и разбираем их параллельно.
+        Пустой список — только если оба поиска прошли и ничего не нашли.
+        """
+        flat_error = None
         try:
-            # Правильно кодируем Unicode символы для URL
-            encoded_query = quote(query, safe='', encoding='utf-8')
-            
-            # Используем API SoundCloud для поиска
-            search_url = f"https://api-v2.soundcloud.com/search/tracks?q={encoded_query}&limit={limit}&client_id=YOUR_CLIENT_ID"
-            
-            # Fallback на веб-поиск если API не работает
-            try:
-                async with self.session.get(search_url, timeout=10) as resp:
-                    if resp.status == 200:
-                        data = await resp.json()
-                        if 'collection' in data:
-                            return [track['permalink_url'] for track in data['collection'] if track.get('permalink_url')]
-            except Exception:
-                pass
-            
-            # Веб-поиск как fallback
-            web_search_url = f"https://soundcloud.com/search/sounds?q={encoded_query}"
-            async with self.session.get(web_search_url, timeout=15) as resp:
-                if resp.status != 200:
-                    return []
-                html = await resp.text()
-            
-            import re
-            # Ищем ссылки на треки в HTML
-            track_links = re.findall(r'href="(https://soundcloud\.com/[^"]+)"', html)
-            # Фильтруем только ссылки на треки (не на пользователей)
-            track_urls = [link for link in track_links if '/tracks/' in link]
-            
-            # Если веб-поиск не дал результатов, пробуем yt-dlp поиск
-            if not track_urls:
-                try:
-                    import yt_dlp
-                    ydl_opts = {
-                        'quiet': True,
-                        'no_warnings': True,
-                        'extract_flat': True,
-                    }
-                    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                        search_results = ydl.extract_info(f"scsearch{limit}:{query}", download=False)
-                        if search_results and 'entries' in search_results:
-                            entries = [e for e in search_results['entries'] if e]
-                            track_urls = [entry.get('webpage_url', '') for entry in entries if entry.get('webpage_url')]
-                except Exception as e:
-                    logger.warning(f"Enhanced SoundCloud yt-dlp search failed: {e}")
-            
-            return track_urls[:limit]
+            candidates = await flat_search_candidates('search-flat', f"scsearch{limit}:{query}")
+            if candidates:
+                return candidates[:limit]
         except Exception as e:
-            logger.error(f"EnhancedSoundCloud search error: {e}")
-            return []
-    
+            logger.warning(f"Enhanced SoundCloud flat search failed: {e}")
+            flat_error = e
+        urls = await self.search_urls(query, limit=limit)
+        if not urls and flat_error is not None:
+            raise flat_error
+        infos = await extract_candidates_info(urls, enough=CANDIDATE_INFO_ENOUGH)
+        candidates = [c for c in (entry_candidate(dict(info, webpage_url=url)) for url, info in infos) if c]
+        if urls and not candidates:
+            raise RuntimeError(f"none of {len(urls)} SoundCloud results could be read")
+        return candidates
+
     async def search_and_download_best(self, query: str, track_info: dict = None) -> Optional[str]:
         """Ищет лучшую версию трека на SoundCloud"""
         try:
             logger.info(f"Enhanced SoundCloud: Searching for '{query}'")
             
-            # Получаем кандидатов
-            candidates = await self.search_urls(query, limit=10)
-            logger.info(f"Enhanced SoundCloud: Found {len(candidates)} candidates")
+            # Получаем кандидатов вместе с названием, длительностью и просмотрами
+            candidate_info = await self.search_candidates(query, limit=10)
+            logger.info(f"Enhanced SoundCloud: Found {len(candidate_info)} candidates")
             
-            if not candidates:
+            if not candidate_info:
                 logger.info("Enhanced SoundCloud: No candidates found")
                 return None
-                
-            # Скачиваем информацию о каждом кандидате
-            candidate_info = []
-            for url in candidates:
-                try:
-                    import yt_dlp
-                    ydl_opts = {
-                        'quiet': True,
-                        'no_warnings': True,
-                        'extract_flat': True,
-                    }
-                    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                        info = ydl.extract_info(url, download=False)
-                        if info:
-                            candidate_info.append({
-                                'url': url,
-                                'title': info.get('title', ''),
-                                'duration': info.get('duration', 0),
-                                'view_count': info.get('view_count', 0)
-                            })
-                            logger.info(f"Enhanced SoundCloud: Candidate '{info.get('title', '')}'")
-                except Exception as e:
-                    logger.warning(f"Enhanced SoundCloud: Failed to get info for {url}: {e}")
-                    continue
-                    
-            logger.info(f"Enhanced SoundCloud: Analyzed {len(candidate_info)} candidates")
             
             # Фильтруем кандидатов
             filtered_candidates = ImprovedSearchEngine.filter_original_versions(candidate_info, track_info)
@@ -2019,126 +2248,14 @@ class EnhancedSoundCloudProvider:
     async def _download_candidate(self, url: str) -> Optional[str]:
         """Скачивает трек по URL"""
         try:
-            import shutil
-            import glob
-            import time
-            # Полная очистка папки downloads перед скачиванием
-            if os.path.exists("downloads"):
-                for f in glob.glob("downloads/*"):
-                    try:
-                        os.remove(f)
-                    except Exception as e:
-                        logger.warning(f"Enhanced SoundCloud: Could not remove {f}: {e}")
-            os.makedirs("downloads", exist_ok=True)
-            logger.info(f"Enhanced SoundCloud: Downloads directory ready and cleaned")
-            logger.info(f"Enhanced SoundCloud: downloads dir after clean: {glob.glob('downloads/*')}")
-
-            # Список before_files до скачивания
-            before_files = set(glob.glob("downloads/*"))
-            logger.info(f"Enhanced SoundCloud: Files before download: {before_files}")
-
-            # --- Ваш код скачивания (yt-dlp или иной способ) ---
-            import yt_dlp
-            ydl_opts = {
-                'format': 'bestaudio[ext=m4a]/bestaudio[ext=mp3]/bestaudio[ext=webm]/bestaudio/best',
-                'outtmpl': f'downloads/%(title)s.%(ext)s',
-                'postprocessors': [{
-                    'key': 'FFmpegExtractAudio',
-                    'preferredcodec': 'mp3',
-                    'preferredquality': '192',
-                }],
-                'noplaylist': True,
-                'quiet': True,
-                'no_warnings': True,
-                'windowsfilenames': True,
-                # Исправления для FFmpeg
-                'ffmpeg_location': None,  # Используем системный FFmpeg
-                'postprocessor_args': {
-                    'FFmpegExtractAudio': [
-                        '-acodec', 'mp3',
-                        '-ab', '192k',
-                        '-ar', '44100',
-                        '-ac', '2',
-                        '-avoid_negative_ts', 'make_zero',
-                        '-fflags', '+genpts',
-                        '-strict', '-2',  # Разрешаем экспериментальные кодеки
-                        '-max_muxing_queue_size', '1024'  # Увеличиваем буфер
-                    ]
-                },
-                'ignoreerrors': True,
-                'no_check_certificate': True,
-                'prefer_ffmpeg': True,
-                'keepvideo': False,
-            }
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=True)
-                # После скачивания — лог содержимого папки
-                logger.info(f"Enhanced SoundCloud: downloads dir after download: {glob.glob('downloads/*')}")
-                if info:
-                    title = clean_filename(info.get('title', 'track'))
-                    logger.info(f"Enhanced SoundCloud: Downloaded '{title}', looking for file...")
-                    for ext in ['mp3', 'webm', 'm4a', 'ogg', 'wav']:
-                        file_path = f"downloads/{title}.{ext}"
-                        if os.path.exists(file_path):
-                            logger.info(f"Enhanced SoundCloud: Found file {file_path}")
-                            return file_path
-                    aac_path = f"downloads/{title}.aac"
-                    if os.path.exists(aac_path):
-                        logger.info(f"Enhanced SoundCloud: Found AAC file {aac_path}, will convert to MP3")
-                        return aac_path
-
-            await asyncio.sleep(3)
-
-            # После скачивания — второй лог содержимого
-            after_files = set(glob.glob("downloads/*"))
-            logger.info(f"Enhanced SoundCloud: Files after download: {after_files}")
-            new_files = after_files - before_files
-            logger.info(f"Enhanced SoundCloud: New files found: {new_files}")
-
-            # Если появились "новые" файлы
-            if new_files:
-                new_files_list = list(new_files)
-                new_files_list.sort(key=lambda x: os.path.getctime(x), reverse=True)
-                for new_file in new_files_list:
-                    try:
-                        file_size = os.path.getsize(new_file)
-                        logger.info(f"Enhanced SoundCloud: Checking file {new_file} (size: {file_size} bytes)")
-                        if file_size > 1000:
-                            if new_file.lower().endswith('.mp3'):
-                                logger.info(f"Enhanced SoundCloud: Using MP3 file {new_file} (size: {file_size} bytes)")
-                                return new_file
-                            elif new_file.lower().endswith(('.webm', '.m4a', '.ogg', '.wav')):
-                                logger.info(f"Enhanced SoundCloud: Using audio file {new_file} (size: {file_size} bytes)")
-                                return new_file
-                            elif new_file.lower().endswith('.aac'):
-                                logger.info(f"Enhanced SoundCloud: Using AAC file {new_file} (size: {file_size} bytes, will convert)")
-                                return new_file
-                    except Exception as e:
-                        logger.error(f"Enhanced SoundCloud: Error checking new file {new_file}: {e}")
-                        continue
-            # Нет новых файлов — fallback: выбрать самый последний подходящий аудиофайл (даже если он старый)
-            all_files = glob.glob("downloads/*")
-            all_files.sort(key=lambda x: os.path.getctime(x), reverse=True)
-            logger.info(f"Enhanced SoundCloud: fallback all files in downloads: {all_files}")
-            best = None
-            best_mtime = 0
-            current_time = time.time()
-            for file_path in all_files:
-                try:
-                    file_size = os.path.getsize(file_path)
-                    file_age = current_time - os.path.getctime(file_path)
-                    logger.info(f"Enhanced SoundCloud: Fallback file {file_path} (size: {file_size}, age: {file_age}s)")
-                    if file_size > 1000 and file_path.lower().endswith(('.mp3', '.webm', '.m4a', '.ogg', '.wav', '.aac')):
-                        if best is None or os.path.getctime(file_path) > best_mtime:
-                            best = file_path
-                            best_mtime = os.path.getctime(file_path)
-                except Exception as e:
-                    logger.error(f"Enhanced SoundCloud: Error in fallback check {file_path}: {e}")
-                    continue
-            if best:
-                logger.info(f"Enhanced SoundCloud: Fallback returning best available file: {best}")
-                return best
-            logger.warning("Enhanced SoundCloud: Nothing found after all checks!")
+            ydl_opts = 'soundcloud'
+            info = await ydl_extract_info(ydl_opts, url, download=True)
+            # Путь итогового файла сообщает сам yt-dlp (post hook) — без ожидания и поиска по папке
+            file_path = find_downloaded_file(info)
+            if file_path:
+                logger.info(f"Enhanced SoundCloud: Downloaded {file_path} ({os.path.getsize(file_path)} bytes)")
+                return file_path
+            logger.warning(f"Enhanced SoundCloud: yt-dlp reported no output file for {url}")
             return None
         except Exception as e:
             logger.error(f"Enhanced SoundCloud download error: {e}")
@@ -2150,7 +2267,7 @@ class Mp3DownloadProvider:
     def __init__(self):
         self.session: Optional[aiohttp.ClientSession] = None
     async def __aenter__(self):
-        self.session = aiohttp.ClientSession(headers={
+        self.session = throttled_session(headers={
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         })
         return self
@@ -2160,7 +2277,7 @@ class Mp3DownloadProvider:
     async def search_and_download(self, query: str) -> Optional[str]:
         try:
             search_url = f'https://mp3download.to/search/{quote(query, safe="")}'
-            async with self.session.get(search_url, timeout=15) as resp:
+            async with self.session.get(search_url, timeout=budget_timeout(15)) as resp:
                 html = await resp.text()
             import re
             # Ищем ссылки на треки
@@ -2169,7 +2286,7 @@ class Mp3DownloadProvider:
                 return None
             # Переходим на страницу трека
             track_url = f'https://mp3download.to{track_links[0]}'
-            async with self.session.get(track_url, timeout=10) as resp:
+            async with self.session.get(track_url, timeout=budget_timeout(10)) as resp:
                 track_html = await resp.text()
             # Ищем прямую ссылку на mp3
             mp3_links = re.findall(r'href="(https://[^"]+\.mp3[^"]*)"', track_html)
@@ -2177,8 +2294,8 @@ class Mp3DownloadProvider:
                 return None
             mp3_url = mp3_links[0]
             safe_name = clean_filename(query)
-            dest = os.path.join("downloads", f"{safe_name}.mp3")
-            async with aiohttp.ClientSession() as s:
+            dest = os.path.join(job_dir(), f"{safe_name}.mp3")
+            async with throttled_session() as s:
                 path = await _download_file(s, mp3_url, dest)
             return path
         except Exception as e:
@@ -2191,7 +2308,7 @@ class Beemp3sProvider:
     def __init__(self):
         self.session: Optional[aiohttp.ClientSession] = None
     async def __aenter__(self):
-        self.session = aiohttp.ClientSession(headers={
+        self.session = throttled_session(headers={
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         })
         return self
@@ -2201,7 +2318,7 @@ class Beemp3sProvider:
     async def search_and_download(self, query: str) -> Optional[str]:
         try:
             search_url = f'https://beemp3s.net/search/{quote(query, safe="")}'
-            async with self.session.get(search_url, timeout=12) as resp:
+            async with self.session.get(search_url, timeout=budget_timeout(12)) as resp:
                 html = await resp.text()
             import re
             mp3_links = re.findall(r'<a[^>]+href=["\']([^"\']+\.mp3[^"\']*)["\']', html)
@@ -2211,8 +2328,8 @@ class Beemp3sProvider:
                 elif not link.startswith('http'):
                     link = 'https://' + link
                 safe_name = clean_filename(query)
-                dest = os.path.join("downloads", f"{safe_name}.mp3")
-                async with aiohttp.ClientSession() as s:
+                dest = os.path.join(job_dir(), f"{safe_name}.mp3")
+                async with throttled_session() as s:
                     path = await _download_file(s, link, dest)
                 if path:
                     return path
@@ -2227,7 +2344,7 @@ class VkMusicFunProvider:
     def __init__(self):
         self.session: Optional[aiohttp.ClientSession] = None
     async def __aenter__(self):
-        self.session = aiohttp.ClientSession(headers={
+        self.session = throttled_session(headers={
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         })
         return self
@@ -2237,7 +2354,7 @@ class VkMusicFunProvider:
     async def search_and_download(self, query: str) -> Optional[str]:
         try:
             search_url = f'https://vkmusic.fun/search?q={quote(query, safe="")}'
-            async with self.session.get(search_url, timeout=15) as resp:
+            async with self.session.get(search_url, timeout=budget_timeout(15)) as resp:
                 html = await resp.text()
             import re
             # Ищем ссылки на треки
@@ -2246,7 +2363,7 @@ class VkMusicFunProvider:
                 return None
             # Переходим на страницу трека
             track_url = f'https://vkmusic.fun{track_links[0]}'
-            async with self.session.get(track_url, timeout=10) as resp:
+            async with self.session.get(track_url, timeout=budget_timeout(10)) as resp:
                 track_html = await resp.text()
             # Ищем прямую ссылку на mp3
             mp3_links = re.findall(r'href="(https://[^"]+\.mp3[^"]*)"', track_html)
@@ -2254,8 +2371,8 @@ class VkMusicFunProvider:
                 return None
             mp3_url = mp3_links[0]
             safe_name = clean_filename(query)
-            dest = os.path.join("downloads", f"{safe_name}.mp3")
-            async with aiohttp.ClientSession() as s:
+            dest = os.path.join(job_dir(), f"{safe_name}.mp3")
+            async with throttled_session() as s:
                 path = await _download_file(s, mp3_url, dest)
             return path
         except Exception as e:
@@ -0,0 +1,345 @@
+"""
+Пресеты настроек yt-dlp и кэш готовых экземпляров YoutubeDL.
+
+Раньше почти одинаковый словарь ydl_opts (MP3 192k, аргументы FFmpeg,
+заголовки) собирался заново в каждом провайдере, и под каждый вызов
+создавался новый YoutubeDL: проверка опций, загрузка экстракторов и
+постпроцессоров повторялись на каждом запросе. Теперь:
+    - все наборы опций описаны здесь, в YDL_PRESETS, и настраиваются в одном месте;
+    - ydl_preset(name, **overrides) возвращает независимую копию пресета;
+    - cached_ydl(opts) отдает готовый YoutubeDL для набора опций из кэша
+      текущего потока (экземпляр YoutubeDL не потокобезопасен), а в пуле
+      процессов (ytdlp_pool) — из кэша процесса.
+
+Чтобы кэш попадал, опции должны повторяться: ротация User-Agent выбирает
+из короткого фиксированного списка, а таймаут сокета округляется (utils).
+
+Шаблон имени файла (outtmpl) в ключ кэша не входит и задается на каждый
+вызов: у каждой загрузки свой уникальный шаблон (job_outtmpl), а путь
+итогового файла (после постобработки) приходит из post hook yt-dlp
+в info['output_paths'] — угадывать имя по названию и искать свежие файлы
+в downloads/ больше не нужно.
+"""
+
+import copy
+import json
+import logging
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Sequence, Union
+
+from output_policy import apply_to_ydl_opts
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+DOWNLOAD_DIR = 'downloads'
+
+# Опции, которые задаются на каждый вызов и не входят в ключ кэша
+PER_CALL_OPTS = ('progress_hooks', 'outtmpl')
+
+# Ключ info со списком итоговых файлов загрузки
+OUTPUT_PATHS = 'output_paths'
+
+# Имя пресета или готовый словарь опций
+YdlOpts = Union[str, Dict]
+
+# Сколько разных наборов опций держит один поток (или процесс пула)
+YDL_CACHE_SIZE = 32
+
+# Ротация User-Agent для обхода детекции YouTube
+YOUTUBE_USER_AGENTS = [
+    'Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.0 Mobile/15E148 Safari/604.1',
+    'Mozilla/5.0 (Linux; Android 13; SM-G991B) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Mobile Safari/537.36',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:109.0) Gecko/20100101 Firefox/121.0',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10.15; rv:109.0) Gecko/20100101 Firefox/121.0'
+]
+
+# Ключ Innertube API для перебора вариантов на YouTube Music; без него yt-dlp берет свой
+YOUTUBE_INNERTUBE_API_KEY = os.getenv('YOUTUBE_INNERTUBE_API_KEY')
+
+# User-Agent для запасного YouTube с низким качеством
+LOWQ_USER_AGENTS = [
+    'Mozilla/5.0 (iPad; CPU OS 16_0 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/16.0 Mobile/15E148 Safari/604.1',
+    'Mozilla/5.0 (Linux; Android 11; Pixel 5) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Mobile Safari/537.36',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:109.0) Gecko/20100101 Firefox/119.0',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10.15; rv:109.0) Gecko/20100101 Firefox/119.0'
+]
+
+_QUIET = {
+    'quiet': True,
+    'no_warnings': True,
+    'noprogress': True,
+}
+
+# Лучшее аудио с конвертацией в MP3 192kbps
+_DOWNLOAD_MP3 = dict(_QUIET, **{
+    'format': 'bestaudio/best',
+    'postprocessors': [{
+        'key': 'FFmpegExtractAudio',
+        'preferredcodec': 'mp3',
+        'preferredquality': '192',
+    }],
+    'prefer_ffmpeg': True,
+    'noplaylist': True,
+    'windowsfilenames': True,
+})
+
+# Исправления для проблемных входных форматов FFmpeg
+FFMPEG_FIX_OPTS = {
+    'ffmpeg_location': None,  # Используем системный FFmpeg
+    'postprocessor_args': {
+        'FFmpegExtractAudio': [
+            '-acodec', 'mp3',
+            '-ab', '192k',
+            '-ar', '44100',
+            '-ac', '2',
+            '-avoid_negative_ts', 'make_zero',
+            '-fflags', '+genpts',
+            '-strict', '-2',  # Разрешаем экспериментальные кодеки
+            '-max_muxing_queue_size', '1024'  # Увеличиваем буфер
+        ]
+    },
+    'ignoreerrors': True,  # Игнорируем ошибки постобработки
+    'no_check_certificate': True,  # Отключаем проверку сертификатов
+}
+
+# Без логина, cookies и лишних файлов рядом с аудио
+_ANONYMOUS = {
+    'cookiesfrombrowser': None,
+    'username': None,
+    'password': None,
+    'netrc': False,
+    'writethumbnail': False,
+    'writeinfojson': False,
+    'writesubtitles': False,
+    'writeautomaticsub': False,
+}
+
+YDL_PRESETS: Dict[str, Dict] = {
+    # Плоский поиск и метаданные без скачивания
+    'search-flat': dict(_QUIET, extract_flat=True),
+    'download-mp3': _DOWNLOAD_MP3,
+    'download-mp3-fixed': dict(_DOWNLOAD_MP3, **FFMPEG_FIX_OPTS),
+    # Исходный поток без перекодирования
+    'download-passthrough': dict(_QUIET, **{
+        'format': 'bestaudio/best',
+        'noplaylist': True,
+        'ignoreerrors': True,
+        'no_check_certificate': True,
+    }),
+    'soundcloud': dict(_DOWNLOAD_MP3, **FFMPEG_FIX_OPTS, **{
+        'format': 'bestaudio[ext=m4a]/bestaudio[ext=mp3]/bestaudio[ext=webm]/bestaudio/best',
+        'keepvideo': False,
+    }),
+    'mixcloud': dict(_DOWNLOAD_MP3, max_filesize=100 * MB),  # Миксы длиннее обычных треков
+    'bandcamp': dict(_DOWNLOAD_MP3, max_filesize=50 * MB),
+    # Сайты с прямыми страницами треков (VK, Яндекс, Deezer, Audiomack)
+    'direct-mp3': dict(_DOWNLOAD_MP3, max_filesize=50 * MB),
+    # YouTube с максимальным обходом блокировок
+    'youtube': dict(_DOWNLOAD_MP3, **FFMPEG_FIX_OPTS, **_ANONYMOUS, **{
+        'max_filesize': 50 * MB,
+        'http_headers': {
+            'User-Agent': YOUTUBE_USER_AGENTS[0],
+            'Accept-Language': 'en-US,en;q=0.9,ru;q=0.8',
+            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+            'Accept-Encoding': 'gzip, deflate, br',
+            'DNT': '1',
+            'Connection': 'keep-alive',
+            'Upgrade-Insecure-Requests': '1',
+            'Sec-Fetch-Dest': 'document',
+            'Sec-Fetch-Mode': 'navigate',
+            'Sec-Fetch-Site': 'none',
+        },
+        'extractor_args': {
+            'youtube': {
+                'player_client': ['ios', 'android_music', 'android', 'web'],
+                'skip': ['dash', 'hls'],
+                'player_skip': ['webpage'],
+                'comment_sort': ['top'],
+                'innertube_host': 'music.youtube.com',
+            }
+        },
+        'retries': 3,
+        'fragment_retries': 3,
+        'retry_sleep': 2,
+        'geo_bypass': True,
+        'geo_bypass_country': 'US',
+        'extract_flat': False,
+        'proxy': None,
+    }),
+    # Мобильные клиенты YouTube с минимальными настройками
+    'youtube-ios': dict(_DOWNLOAD_MP3, **{
+        'max_filesize': 50 * MB,
+        'http_headers': {
+            'User-Agent': 'Mozilla/5.0 (iPhone; CPU iPhone OS 14_0 like Mac OS X) AppleWebKit/605.1.15'
+        },
+        'extractor_args': {
+            'youtube': {
+                'player_client': ['ios', 'android_music'],
+            }
+        },
+    }),
+    # Худшее качество и другие клиенты/страна — последний шанс обойти блокировку
+    'youtube-lowq': dict(_DOWNLOAD_MP3, **{
+        'format': 'worstaudio/worst',
+        'postprocessors': [{
+            'key': 'FFmpegExtractAudio',
+            'preferredcodec': 'mp3',
+            'preferredquality': '128',
+        }],
+        'max_filesize': 25 * MB,
+        'http_headers': {
+            'User-Agent': LOWQ_USER_AGENTS[0],
+            'Accept': '*/*',
+            'Accept-Language': 'en-US,en;q=0.5',
+            'Accept-Encoding': 'gzip, deflate',
+            'Connection': 'keep-alive',
+        },
+        'extractor_args': {
+            'youtube': {
+                'player_client': ['tv_embedded', 'tv', 'ios'],
+                'skip': ['dash', 'hls'],
+            }
+        },
+        'retries': 3,
+        'fragment_retries': 3,
+        'retry_sleep': 1,
+        'geo_bypass': True,
+        'geo_bypass_country': 'RU',
+        'no_check_certificate': True,
+        'ignoreerrors': True,
+    }),
+    # Перебор вариантов запроса на YouTube
+    'youtube-variants': dict(_DOWNLOAD_MP3, **{
+        'extractor_args': {
+            'youtube': dict({
+                'player_client': ['android', 'web'],
+                'innertube_host': 'music.youtube.com',
+                'client_version': '17.31.35',
+            }, **({'api_key': YOUTUBE_INNERTUBE_API_KEY} if YOUTUBE_INNERTUBE_API_KEY else {}))
+        },
+        'http_headers': {
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+        },
+        'retries': 3,
+        'username': None,
+        'password': None,
+        'netrc': False,
+    }),
+}
+
+
+def ydl_preset(name: str, **overrides) -> Dict:
+    """Копия пресета name с переопределенными ключами (исходный пресет не меняется).
+
+    Политика выходного формата (output_policy, AUDIO_OUTPUT) применяется здесь,
+    поэтому при passthrough все пресеты скачивают аудио без перекодирования в MP3.
+    """
+    try:
+        opts = copy.deepcopy(YDL_PRESETS[name])
+    except KeyError:
+        raise ValueError(f"Unknown yt-dlp preset: {name}") from None
+    opts.update(overrides)
+    return apply_to_ydl_opts(opts)
+
+
+def with_user_agent(opts: Dict, user_agent: str) -> Dict:
+    """Копия опций с другим User-Agent (остальные заголовки сохраняются)"""
+    result = dict(opts)
+    result['http_headers'] = dict(opts.get('http_headers') or {}, **{'User-Agent': user_agent})
+    return result
+
+
+def resolve_opts(opts: YdlOpts) -> Dict:
+    """Имя пресета или готовый словарь -> копия словаря опций"""
+    return ydl_preset(opts) if isinstance(opts, str) else dict(opts)
+
+
+def job_outtmpl(directory: str = DOWNLOAD_DIR) -> str:
+    """Уникальный шаблон имени для одной загрузки: параллельные задания не пишут в один файл"""
+    return os.path.join(directory, f"%(id)s-{uuid.uuid4().hex[:12]}.%(ext)s")
+
+
+def _cache_opts(opts: Dict) -> Dict:
+    return {k: v for k, v in opts.items() if k not in PER_CALL_OPTS}
+
+
+def opts_key(opts: Dict) -> str:
+    """Ключ кэша: JSON опций без PER_CALL_OPTS (progress_hooks, outtmpl)"""
+    return json.dumps(_cache_opts(opts), sort_keys=True, default=str)
+
+
+_local = threading.local()
+
+
+def _cache() -> 'OrderedDict[str, Any]':
+    cache = getattr(_local, 'ydl_cache', None)
+    if cache is None:
+        cache = _local.ydl_cache = OrderedDict()
+    return cache
+
+
+def cached_ydl(opts: Dict):
+    """YoutubeDL для набора опций из кэша текущего потока (LRU на YDL_CACHE_SIZE наборов)"""
+    import yt_dlp
+
+    cache = _cache()
+    key = opts_key(opts)
+    ydl = cache.get(key)
+    if ydl is not None:
+        cache.move_to_end(key)
+        return ydl
+    ydl = yt_dlp.YoutubeDL(_cache_opts(opts))
+    cache[key] = ydl
+    while len(cache) > YDL_CACHE_SIZE:
+        _, old = cache.popitem(last=False)
+        try:
+            old.close()
+        except Exception as e:
+            logger.debug(f"Closing cached YoutubeDL failed: {e}")
+    return ydl
+
+
+def cached_ydl_count() -> int:
+    """Сколько экземпляров YoutubeDL держит текущий поток"""
+    return len(_cache())
+
+
+def extract_info(opts: Dict, url: str, download: bool,
+                 hooks: Optional[Sequence[Callable]] = None) -> Optional[Dict]:
+    """extract_info на закэшированном YoutubeDL.
+
+    progress hooks и шаблон имени (opts['outtmpl']) действуют только на этот
+    вызов. При download=True пути итоговых файлов собирает post hook
+    (вызывается после всей постобработки) и кладет в info['output_paths'].
+    """
+    ydl = cached_ydl(opts)
+    added: List[Callable] = list(opts.get('progress_hooks') or []) + list(hooks or [])
+    for hook in added:
+        ydl.add_progress_hook(hook)
+    outputs: List[str] = []
+    collect = outputs.append
+    ydl.add_post_hook(collect)
+    outtmpl = ydl.params['outtmpl']
+    previous = outtmpl.get('default')
+    outtmpl['default'] = opts.get('outtmpl') or os.path.join(DOWNLOAD_DIR, '%(title)s.%(ext)s')
+    try:
+        info = ydl.extract_info(url, download=download)
+    finally:
+        outtmpl['default'] = previous
+        ydl._post_hooks.remove(collect)
+        for hook in added:
+            try:
+                ydl._progress_hooks.remove(hook)
+            except ValueError:
+                pass
+    if info is not None and download:
+        info[OUTPUT_PATHS] = outputs
+    return info
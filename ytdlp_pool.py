@@ -0,0 +1,268 @@
+"""
+Пул долгоживущих процессов для yt-dlp.
+
+Разбор страниц и настройка экстракторов yt-dlp нагружают процессор и держат
+GIL, поэтому задания extract/download выполняются в отдельных процессах
+(python -m ytdlp_pool):
+    - каждый процесс держит "теплые" экземпляры YoutubeDL по набору опций
+      (экстракторы и проверка опций не повторяются от задания к заданию);
+    - у каждого задания жесткий лимит времени: зависший процесс убивается
+      и заменяется новым, бот при этом не страдает;
+    - отмена задания (проигрыш в гонке, таймаут провайдера) тоже убивает
+      процесс — загрузка прерывается сразу, а не на следующем progress hook;
+    - результат структурированный: {'ok', 'info', 'error', 'error_type', 'elapsed'}.
+
+Обмен с процессом — pickle-сообщения с 4-байтовой длиной через stdin/stdout;
+всё, что yt-dlp печатает сам, уходит в stderr.
+"""
+
+import asyncio
+import importlib
+import logging
+import os
+import pickle
+import struct
+import sys
+import time
+from typing import Dict, List, Optional, Set
+
+from executors import IO_WORKERS
+
+logger = logging.getLogger(__name__)
+
+# Сколько процессов держать и предельное время одного задания (секунды).
+# Задания в основном ждут сеть, поэтому процессов столько же, сколько потоков
+# в IO-пуле, где yt-dlp работал раньше; при старте поднимается не больше
+# PRESTART_WORKERS, остальные — по мере надобности
+WORKERS = int(os.getenv('YTDLP_WORKERS', str(IO_WORKERS)))
+PRESTART_WORKERS = int(os.getenv('YTDLP_PRESTART_WORKERS', str(min(WORKERS, os.cpu_count() or 2))))
+JOB_TIMEOUT = float(os.getenv('YTDLP_JOB_TIMEOUT', '300'))
+
+# После стольких заданий процесс перезапускается (защита от утечек памяти в экстракторах)
+MAX_JOBS_PER_WORKER = 200
+
+# Задание по умолчанию ("модуль:функция", импортируется в процессе)
+DEFAULT_HANDLER = 'ytdlp_pool:ytdlp_job'
+
+_HEADER = struct.Struct('>I')
+
+
+class WorkerTimeout(Exception):
+    """Задание не уложилось в лимит времени, процесс убит"""
+
+
+class WorkerError(Exception):
+    """Задание завершилось ошибкой внутри процесса (или процесс упал)"""
+
+    def __init__(self, message: str, error_type: str = ''):
+        super().__init__(message)
+        self.error_type = error_type
+
+
+# ---------------------------------------------------------------------------
+# Сторона процесса
+# ---------------------------------------------------------------------------
+
+def ytdlp_job(opts: Dict, url: str, download: bool) -> Optional[Dict]:
+    """Задание по умолчанию: extract_info на закэшированном YoutubeDL (ydl_presets.extract_info)"""
+    import yt_dlp
+    from ydl_presets import extract_info
+
+    info = extract_info(opts, url, download)
+    # sanitize_info убирает из результата то, что нельзя передать между процессами
+    return yt_dlp.YoutubeDL.sanitize_info(info) if info is not None else None
+
+
+def _worker_main(handler_path: str):
+    module_name, func_name = handler_path.split(':')
+    handler = getattr(importlib.import_module(module_name), func_name)
+
+    # stdout занят протоколом: печать yt-dlp и print() перенаправляем в stderr
+    proto_out = os.fdopen(os.dup(1), 'wb')
+    os.dup2(2, 1)
+    sys.stdout = sys.stderr
+    proto_in = sys.stdin.buffer
+
+    while True:
+        header = proto_in.read(_HEADER.size)
+        if len(header) < _HEADER.size:
+            break
+        job = pickle.loads(proto_in.read(_HEADER.unpack(header)[0]))
+        started = time.monotonic()
+        try:
+            result = {'ok': True, 'info': handler(*job), 'error': None, 'error_type': None}
+        except BaseException as e:  # yt-dlp может бросить и SystemExit
+            result = {'ok': False, 'info': None, 'error': str(e), 'error_type': type(e).__name__}
+        result['elapsed'] = time.monotonic() - started
+        try:
+            data = pickle.dumps(result)
+        except Exception as e:
+            data = pickle.dumps({'ok': False, 'info': None, 'error': f"Result is not picklable: {e}",
+                                 'error_type': type(e).__name__, 'elapsed': result['elapsed']})
+        proto_out.write(_HEADER.pack(len(data)) + data)
+        proto_out.flush()
+
+
+# ---------------------------------------------------------------------------
+# Сторона бота
+# ---------------------------------------------------------------------------
+
+class _Worker:
+    def __init__(self, process: asyncio.subprocess.Process):
+        self.process = process
+        self.jobs = 0
+
+    @classmethod
+    async def spawn(cls, handler: str) -> '_Worker':
+        env = dict(os.environ)
+        # Процесс должен импортировать модули бота независимо от текущей директории
+        module_dir = os.path.dirname(os.path.abspath(__file__))
+        env['PYTHONPATH'] = os.pathsep.join(filter(None, [module_dir, env.get('PYTHONPATH')]))
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, '-m', 'ytdlp_pool', handler,
+            stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, env=env,
+        )
+        return cls(process)
+
+    async def call(self, data: bytes) -> Dict:
+        self.process.stdin.write(_HEADER.pack(len(data)) + data)
+        await self.process.stdin.drain()
+        self.jobs += 1
+        header = await self.process.stdout.readexactly(_HEADER.size)
+        return pickle.loads(await self.process.stdout.readexactly(_HEADER.unpack(header)[0]))
+
+    def kill(self):
+        if self.process.returncode is None:
+            try:
+                self.process.kill()
+            except ProcessLookupError:
+                pass
+
+    def stop(self):
+        """Мягкая остановка свободного процесса: закрытый stdin завершает цикл"""
+        if self.process.stdin and not self.process.stdin.is_closing():
+            self.process.stdin.close()
+
+
+class YtdlpWorkerPool:
+    """Пул процессов yt-dlp с очередью заданий и сторожем времени"""
+
+    def __init__(self, size: int = WORKERS, job_timeout: float = JOB_TIMEOUT,
+                 handler: str = DEFAULT_HANDLER, max_jobs: int = MAX_JOBS_PER_WORKER):
+        self.size = max(1, size)
+        self.job_timeout = job_timeout
+        self.handler = handler
+        self.max_jobs = max_jobs
+        self._idle: List[_Worker] = []
+        # Завершаемые процессы, которых еще нужно дождаться (иначе останутся зомби)
+        self._exiting: Set[asyncio.Task] = set()
+        self._loop = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.busy = 0
+        self.killed = 0
+
+    def _bind_loop(self):
+        # Процессы и семафор привязаны к event loop; при новом loop начинаем заново
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            for worker in self._idle:
+                worker.kill()
+            self._idle.clear()
+            self._exiting.clear()
+            self._loop = loop
+            self._slots = asyncio.Semaphore(self.size)
+
+    async def start(self, count: int = PRESTART_WORKERS):
+        """Заранее поднимает count процессов, чтобы первые задания не ждали запуска"""
+        self._bind_loop()
+        while len(self._idle) < min(count, self.size):
+            self._idle.append(await _Worker.spawn(self.handler))
+
+    def _retire(self, worker: _Worker, kill: bool):
+        """Останавливает процесс и ждет его завершения в фоне"""
+        if kill:
+            worker.kill()
+        else:
+            worker.stop()
+        task = asyncio.ensure_future(worker.process.wait())
+        self._exiting.add(task)
+        task.add_done_callback(self._exiting.discard)
+
+    async def close(self):
+        """Останавливает свободные процессы и дожидается всех завершаемых"""
+        for worker in self._idle:
+            self._retire(worker, kill=False)
+        self._idle.clear()
+        if self._exiting:
+            await asyncio.wait(set(self._exiting), timeout=5)
+
+    async def run(self, opts: Dict, url: str, download: bool, timeout: Optional[float] = None) -> Optional[Dict]:
+        """Выполняет задание в свободном процессе и возвращает info (как extract_info)"""
+        result = await self.submit(opts, url, download, timeout)
+        if not result['ok']:
+            raise WorkerError(result['error'], result['error_type'])
+        return result['info']
+
+    async def submit(self, opts: Dict, url: str, download: bool, timeout: Optional[float] = None) -> Dict:
+        """Структурированный результат задания; таймаут и отмена убивают процесс.
+
+        timeout покрывает всё задание: ожидание свободного процесса, запуск
+        нового и само выполнение.
+        """
+        self._bind_loop()
+        timeout = min(timeout, self.job_timeout) if timeout else self.job_timeout
+        deadline = time.monotonic() + timeout
+        # Опции с функциями (progress_hooks, logger) передать нельзя — ошибка до занятия процесса
+        data = pickle.dumps((opts, url, download))
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout)
+        except asyncio.TimeoutError:
+            raise WorkerTimeout(f"no free yt-dlp worker within {timeout:.1f}s")
+        try:
+            worker = self._take_idle()
+            if worker is None:
+                try:
+                    worker = await asyncio.wait_for(_Worker.spawn(self.handler), max(deadline - time.monotonic(), 0.01))
+                except asyncio.TimeoutError:
+                    raise WorkerTimeout(f"yt-dlp worker did not start within {timeout:.1f}s")
+            self.busy += 1
+            healthy = False
+            try:
+                result = await asyncio.wait_for(worker.call(data), max(deadline - time.monotonic(), 0.01))
+                healthy = True
+                return result
+            except asyncio.TimeoutError:
+                logger.warning(f"yt-dlp worker {worker.process.pid}: job exceeded {timeout:.1f}s, killing ({url})")
+                raise WorkerTimeout(f"yt-dlp job timed out after {timeout:.1f}s")
+            except (EOFError, asyncio.IncompleteReadError, ConnectionError) as e:
+                raise WorkerError(f"yt-dlp worker died: {e!r}", type(e).__name__)
+            finally:
+                self.busy -= 1
+                if healthy and worker.jobs < self.max_jobs:
+                    self._idle.append(worker)
+                elif healthy:
+                    self._retire(worker, kill=False)
+                else:
+                    # Таймаут, отмена или падение: процесс мог остаться посреди загрузки
+                    self.killed += 1
+                    self._retire(worker, kill=True)
+        finally:
+            self._slots.release()
+
+    def _take_idle(self) -> Optional[_Worker]:
+        while self._idle:
+            worker = self._idle.pop()
+            if worker.process.returncode is None:
+                return worker
+            logger.warning(f"yt-dlp worker {worker.process.pid} exited with code {worker.process.returncode}")
+        return None
+
+    def stats(self) -> Dict[str, int]:
+        return {'size': self.size, 'busy': self.busy, 'idle': len(self._idle), 'killed': self.killed}
+
+
+YTDLP_POOL: Optional[YtdlpWorkerPool] = YtdlpWorkerPool() if WORKERS > 0 else None
+
+
+if __name__ == '__main__':
+    _worker_main(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_HANDLER)